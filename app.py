@@ -1,9 +1,15 @@
-from flask import Flask, render_template, request, jsonify, session, send_from_directory, send_file
+import time
+# start of the app import, for the startup times reported by /api/ready
+_IMPORT_STARTED = time.time()
+from flask import Flask, Response, render_template, request, jsonify, session, send_from_directory, send_file
 from pathlib import Path
 import json
+import logging
 import os
 import pickle
-import networkx as nx
+import sys
+import tempfile
+import threading
 
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
@@ -14,69 +20,244 @@ BASE_DIR = os.path.dirname(__file__)
 DATA_DIR = os.path.join(BASE_DIR, 'datos')
 STATS_FILE = os.path.join(DATA_DIR, 'grafo_stats.json')
 PKL_FILE = os.path.join(DATA_DIR, 'grafo_plantaciones.pkl')
+# memory-mapped CSR snapshot of PKL_FILE, (re)built from it on load when missing or
+# stale (or by hand: python -m codigo.graph_snapshot datos/grafo_plantaciones.pkl)
+SNAPSHOT_FILE = os.path.join(DATA_DIR, 'grafo_plantaciones.csrg')
+# decode the whole snapshot into plain dicts right after opening it (0 leaves
+# rows to decode on first touch: less memory, slower first traversals)
+SNAPSHOT_MATERIALIZE = os.environ.get('SNAPSHOT_MATERIALIZE', '1') != '0'
 GRAPH_HTML_DIR = os.path.join('static', 'graphs')
 GRAPH_GENERAL_HTML = os.path.join(GRAPH_HTML_DIR, 'grafo_general.html')
-GRAPH_HIGHLIGHT_HTML = os.path.join(GRAPH_HTML_DIR, 'grafo_resaltado.html')
+# per-species highlight pages, bounded LRU (see codigo/highlight_cache.py)
+GRAPH_HIGHLIGHT_DIR = os.path.join(GRAPH_HTML_DIR, 'resaltado')
+HIGHLIGHT_CACHE_FILES = int(os.environ.get('HIGHLIGHT_CACHE_FILES', '64'))
+# background jobs (graph generation); status files let any worker answer polls
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOBS_STATUS_DIR = os.environ.get('JOBS_STATUS_DIR', os.path.join(tempfile.gettempdir(), 'mi-flask-app-jobs'))
+# /api/analysis/batch
+ANALYSIS_BATCH_WORKERS = int(os.environ.get('ANALYSIS_BATCH_WORKERS', '4'))
+ANALYSIS_BATCH_MAX = int(os.environ.get('ANALYSIS_BATCH_MAX', '500'))
+# per-process cache of /api/analysis and /api/bfs_execute responses
+# (codigo/response_cache.py); keys include the graph/dataset version
+RESPONSE_CACHE_ENTRIES = int(os.environ.get('RESPONSE_CACHE_ENTRIES', '1024'))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', str(32 * 2**20)))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', '300'))
+# directory or glob of exports (one per year / ARFFS) built in parallel and
+# merged into one dataset; when unset the first CSV_CANDIDATES file is used
+PLANTACIONES_SOURCES = os.environ.get('PLANTACIONES_SOURCES', '')
+# opt-in profiling (codigo/profiling.py): with PROFILING=1 a request to one of
+# PROFILE_ROUTES carrying an X-Profile header ('cprofile' or 'sample') is
+# profiled, and a PROFILE_SAMPLE_RATE fraction of them is sampled; logged-in
+# users list and download profiles from /api/profiles
+PROFILING = os.environ.get('PROFILING', '0') == '1'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_ROUTES = os.environ.get(
+    'PROFILE_ROUTES', '/api/analysis,/api/analysis/batch,/api/bfs_execute,/api/generate_general_graph,/api/graph').split(',')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'mi-flask-app-profiles'))
+PROFILE_MAX = int(os.environ.get('PROFILE_MAX', '50'))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.005'))
+# request fields kept in a profile's tags; bodies are never stored whole
+PROFILE_PARAMS = ('tipo', 'modo', 'especie', 'departamento', 'startNode', 'targetNode', 'species',
+                  'limit', 'offset', 'by', 'top', 'orden', 'q', 'generate_highlight')
+# dropped even if listed above
+PROFILE_SECRET_KEYS = ('password', 'passwd', 'secret', 'token', 'credential', 'auth', 'username')
+CSV_CANDIDATES = [
+    os.path.join(DATA_DIR, 'plantaciones-2021-1.csv'),
+    os.path.join(DATA_DIR, 'plantaciones 2021.csv'),
+    os.path.join(DATA_DIR, 'plantaciones-2021.csv'),
+    os.path.join(DATA_DIR, 'plantaciones.csv'),
+    # read through a cached converted copy (codigo/ingest.py)
+    os.path.join(DATA_DIR, 'plantaciones-2021-1.xlsx'),
+]
 
 
 # Cache loaded graph
 _GRAPH_CACHE = None
+# Bumped every time a graph is (re)loaded; derived caches are keyed by it
+_GRAPH_VERSION = 0
+# Normalized identifier -> candidate node ids, built lazily per loaded graph
+_NODE_INDEX = None
+# name -> (graph version, value) for other structures derived from the graph
+_DERIVED = {}
+_GRAPH_LOCK = threading.RLock()
+_HIGHLIGHTS = None
+_JOBS = None
+# ((mtime_ns, size), parsed grafo_stats.json)
+_STATS_CACHE = None
+_ANALYSIS_POOL = None
+_ANALYSIS_POOL_PID = None
+_METRICS = None
+_PROFILER = None
+_RESPONSES = None
+# state of the last warm_caches() run, reported by /api/ready
+_WARMUP = {'mode': None, 'started': None, 'finished': None, 'steps': {}}
+_WARMUP_LOCK = threading.Lock()
+_WARMUP_THREAD = None
 
 
-def load_graph():
-    global _GRAPH_CACHE
-    if _GRAPH_CACHE is not None:
-        return _GRAPH_CACHE
+def _snapshot_is_current():
     if not os.path.exists(PKL_FILE):
-        _GRAPH_CACHE = nx.Graph()
-        return _GRAPH_CACHE
+        return os.path.exists(SNAPSHOT_FILE)
+    from codigo.graph_snapshot import is_current
+    return is_current(SNAPSHOT_FILE, PKL_FILE)
+
+
+def _read_graph():
+    import networkx as nx
+    try:
+        if not _snapshot_is_current() and os.path.exists(PKL_FILE):
+            # written atomically, so workers racing to build it are harmless
+            from codigo.graph_snapshot import convert
+            app.logger.info('Construyendo snapshot %s desde %s', SNAPSHOT_FILE, PKL_FILE)
+            with get_metrics().fase('graph.snapshot_build'):
+                convert(PKL_FILE, SNAPSHOT_FILE)
+        if os.path.exists(SNAPSHOT_FILE):
+            from codigo.graph_snapshot import open_snapshot
+            return open_snapshot(SNAPSHOT_FILE, materialize=SNAPSHOT_MATERIALIZE)
+    except Exception:
+        app.logger.exception('No se pudo construir/abrir el snapshot %s; se usa el pickle', SNAPSHOT_FILE)
+    if not os.path.exists(PKL_FILE):
+        app.logger.warning('No existe %s; se usa un grafo vacío', PKL_FILE)
+        return nx.Graph()
     try:
         with open(PKL_FILE, 'rb') as f:
             g = pickle.load(f)
         # Si no es un NetworkX Graph, intentar construir uno
         if not isinstance(g, nx.Graph):
             g = nx.Graph(g)
-        _GRAPH_CACHE = g
+        return g
     except Exception:
-        _GRAPH_CACHE = nx.Graph()
+        app.logger.exception('No se pudo cargar %s; se usa un grafo vacío', PKL_FILE)
+        return nx.Graph()
+
+
+def load_graph():
+    global _GRAPH_CACHE, _GRAPH_VERSION, _NODE_INDEX
+    if _GRAPH_CACHE is not None:
+        return _GRAPH_CACHE
+    with _GRAPH_LOCK:
+        if _GRAPH_CACHE is not None:
+            return _GRAPH_CACHE
+        with get_metrics().fase('graph.load'):
+            g = _read_graph()
+        _NODE_INDEX = None
+        _DERIVED.clear()
+        _GRAPH_VERSION += 1
+        _GRAPH_CACHE = g
     return _GRAPH_CACHE
 
 
-def resolve_node_identifier(g, identifier):
+def invalidate_graph_cache():
+    """Drop the loaded graph and everything derived from it."""
+    global _GRAPH_CACHE, _NODE_INDEX
+    with _GRAPH_LOCK:
+        _GRAPH_CACHE = None
+        _NODE_INDEX = None
+        _DERIVED.clear()
+    # entries are keyed by graph version and would just age out; free them now
+    if _RESPONSES is not None:
+        _RESPONSES.clear()
 
-    if identifier is None:
-        return None, []
-    sid = str(identifier).strip()
-    if sid in g:
-        return sid, []
-    sid_lower = sid.lower()
-    candidates = []
+
+def graph_version():
+    load_graph()
+    return _GRAPH_VERSION
+
+
+def graph_derived(name, build):
+    """Return build(g) for the loaded graph, computed once per graph version."""
+    metrics = get_metrics()
+    g = load_graph()
+    hit = _DERIVED.get(name)
+    if hit is not None and hit[0] == _GRAPH_VERSION:
+        metrics.inc('cache_requests_total', cache=f'derived.{name}', result='hit')
+        return hit[1]
+    with _GRAPH_LOCK:
+        g = load_graph()
+        hit = _DERIVED.get(name)
+        if hit is not None and hit[0] == _GRAPH_VERSION:
+            metrics.inc('cache_requests_total', cache=f'derived.{name}', result='hit')
+            return hit[1]
+        metrics.inc('cache_requests_total', cache=f'derived.{name}', result='miss')
+        with metrics.fase(f'derived.{name}'):
+            value = build(g)
+        _DERIVED[name] = (_GRAPH_VERSION, value)
+        return value
+
+
+def find_plantaciones_csv():
+    if PLANTACIONES_SOURCES:
+        from codigo.ingest import expand_sources
+        if expand_sources(PLANTACIONES_SOURCES):
+            return PLANTACIONES_SOURCES
+        app.logger.warning('PLANTACIONES_SOURCES=%s no tiene archivos; se usa CSV_CANDIDATES', PLANTACIONES_SOURCES)
+    for c in CSV_CANDIDATES:
+        if os.path.exists(c):
+            return c
+    return None
+
+
+def load_dataset(csv_path, progress=None):
+    # shared, versioned (G_viz, G_logico) built once per CSV content
+    from codigo.dataset_store import get_dataset
+    return get_dataset(csv_path, progress)
+
+
+def _normalize_identifier(value):
+    return str(value).strip().lower()
+
+
+def build_identifier_index(g):
+    """Map every normalized label/attribute value/node id to its node ids.
+
+    A node is a candidate for a key when its id or any of its attribute values
+    (label, nombre, titulo, ...) normalizes to that key. Candidates keep node
+    order so ambiguity reports match a full scan.
+    """
+    index = {}
     for n, attrs in g.nodes(data=True):
-        # check label first
-        label = None
-        if isinstance(attrs, dict):
-            label = attrs.get('label') or attrs.get('nombre') or attrs.get('titulo')
-        if isinstance(label, str) and label.strip().lower() == sid_lower:
-            candidates.append(str(n))
-            continue
-        # check all attribute values
+        keys = set()
         if isinstance(attrs, dict):
-            for k, v in attrs.items():
+            for v in attrs.values():
                 if v is None:
                     continue
                 try:
-                    if isinstance(v, str) and v.strip().lower() == sid_lower:
-                        candidates.append(str(n)); break
-                    if not isinstance(v, str) and str(v).strip().lower() == sid_lower:
-                        candidates.append(str(n)); break
+                    keys.add(_normalize_identifier(v))
                 except Exception:
                     continue
-        # check node id string equality case-insensitive
         try:
-            if str(n).strip().lower() == sid_lower:
-                candidates.append(str(n))
+            keys.add(_normalize_identifier(n))
         except Exception:
             pass
+        sn = str(n)
+        for k in keys:
+            index.setdefault(k, []).append(sn)
+    return index
+
+
+def get_identifier_index(g):
+    global _NODE_INDEX
+    cached = _NODE_INDEX
+    if cached is not None and cached[0] is g:
+        return cached[1]
+    with _GRAPH_LOCK:
+        if _NODE_INDEX is not None and _NODE_INDEX[0] is g:
+            return _NODE_INDEX[1]
+        index = build_identifier_index(g)
+        # only the shared graph's index is cached; ad-hoc graphs get a fresh one
+        if g is _GRAPH_CACHE:
+            _NODE_INDEX = (g, index)
+        return index
+
+
+def resolve_node_identifier(g, identifier):
+
+    if identifier is None:
+        return None, []
+    sid = str(identifier).strip()
+    if sid in g:
+        return sid, []
+    candidates = get_identifier_index(g).get(sid.lower(), [])
     # deduplicate preserving order
     uniq = []
     seen = set()
@@ -88,6 +269,101 @@ def resolve_node_identifier(g, identifier):
     return None, uniq
 
 
+def _warm_steps(html=False):
+    """(name, fn) in the order warm_caches() runs them."""
+    from codigo.graph_filters import FilterIndex
+    from codigo.layout import force_layout
+    from codigo.search_index import build_graph_search_index
+    from codigo.shortest_paths import ShortestPathEngine
+    from codigo.union_find import ComponentIndex
+
+    def indexes():
+        get_identifier_index(load_graph())
+        graph_derived('search_index', build_graph_search_index)
+        graph_derived('filters', FilterIndex)
+        graph_derived('paths', ShortestPathEngine)
+        graph_derived('components', ComponentIndex)
+
+    # what /api/ready waits for first, then the /api/graph layout and payload
+    steps = [('graph', load_graph), ('indexes', indexes)]
+    if os.path.exists(STATS_FILE):
+        steps.append(('stats', load_stats))
+    csv_path = find_plantaciones_csv()
+    if csv_path:
+        steps.append(('dataset', lambda: load_dataset(csv_path)))
+    steps.append(('layout', lambda: graph_derived('layout', force_layout)))
+    steps.append(('graph_payload', lambda: graph_derived('graph_payload', build_graph_payload)))
+    if csv_path and html:
+        steps.append(('general_graph_html', _warm_general_graph))
+    return steps
+
+
+def _warm_general_graph():
+    # through the job runner, so a concurrent /api/generate_general_graph
+    # joins this run instead of rendering the page a second time
+    job, _ = submit_general_graph_job()
+    while not job.finished:
+        time.sleep(0.05)
+    if job.error:
+        raise RuntimeError(job.error)
+
+
+def warm_caches(html=False, keep_going=False):
+    """Load the graph, the plantaciones dataset and their indexes.
+
+    Used by gunicorn.conf.py before forking workers (or once per worker when
+    preloading is disabled) and by start_warmup(). `html` also renders the
+    general graph page; `keep_going` logs a failed step and goes on instead
+    of raising. Each step's state is kept for /api/ready. Returns seconds
+    spent per completed step.
+    """
+    steps = _warm_steps(html)
+    with _WARMUP_LOCK:
+        _WARMUP['started'] = time.time()
+        _WARMUP['finished'] = None
+        _WARMUP['steps'] = {name: {'state': 'pending', 'seconds': None} for name, _ in steps}
+    metrics = get_metrics()
+    timings = {}
+    for name, fn in steps:
+        info = _WARMUP['steps'][name]
+        info['state'] = 'running'
+        t0 = time.perf_counter()
+        try:
+            with metrics.fase(f'warmup.{name}'):
+                fn()
+        except Exception as e:
+            info.update(state='error', error=str(e), seconds=round(time.perf_counter() - t0, 4))
+            if not keep_going:
+                raise
+            app.logger.exception('Falló la precarga de %s', name)
+            continue
+        timings[name] = time.perf_counter() - t0
+        info.update(state='done', seconds=round(timings[name], 4),
+                    done_after_seconds=round(time.time() - _IMPORT_STARTED, 3))
+    _WARMUP['finished'] = time.time()
+    return timings
+
+
+def _background_warmup(html):
+    timings = warm_caches(html=html, keep_going=True)
+    app.logger.info('Precarga en segundo plano lista en %.2fs (%s), %.2fs desde el import',
+                    sum(timings.values()), ', '.join(f'{k}={v:.2f}s' for k, v in timings.items()),
+                    _WARMUP['finished'] - _IMPORT_STARTED)
+
+
+def start_warmup(html=True):
+    """Run warm_caches() in a daemon thread; requests are served meanwhile
+    (the first ones pay for whatever is not warm yet). Progress: /api/ready."""
+    global _WARMUP_THREAD
+    with _WARMUP_LOCK:
+        if _WARMUP_THREAD is not None and _WARMUP_THREAD.is_alive():
+            return _WARMUP_THREAD
+        _WARMUP['mode'] = 'background'
+        _WARMUP_THREAD = threading.Thread(target=_background_warmup, args=(html,), name='warmup', daemon=True)
+    _WARMUP_THREAD.start()
+    return _WARMUP_THREAD
+
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -121,19 +397,345 @@ def api_logout():
     return jsonify({'success': True})
 
 
+def load_stats():
+    """grafo_stats.json, parsed once and re-read only when the file changes."""
+    global _STATS_CACHE
+    st = os.stat(STATS_FILE)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _STATS_CACHE
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(STATS_FILE, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    _STATS_CACHE = (key, data)
+    return data
+
+
 @app.route('/api/stats', methods=['GET'])
 def api_stats():
     try:
-        with open(STATS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return jsonify(data)
+        return jsonify(load_stats())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/graph', methods=['GET'])
-def api_graph():
-    g = load_graph()
+@app.route('/api/aggregates', methods=['GET'])
+def api_aggregates():
+    """Counts and summed superficie per dimension, from the cached dataset.
+
+    Query params: by (comma list of dimensions), top, orden (conteo|superficie)
+    and any dimension name as a filter, e.g. ?by=especie&departamento=LORETO.
+    """
+    from codigo.aggregates import DIMENSIONES
+    by = [b.strip() for b in request.args.get('by', 'especie').split(',') if b.strip()]
+    unknown = [b for b in by if b not in DIMENSIONES]
+    if unknown:
+        return jsonify({'success': False, 'error': f"Dimensión desconocida: {', '.join(unknown)}",
+                        'dimensiones': list(DIMENSIONES)}), 400
+    try:
+        top = int(request.args.get('top', 10))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'top debe ser un entero'}), 400
+    orden = request.args.get('orden', 'conteo')
+    filtros = {dim: request.args.get(dim) for dim in DIMENSIONES if request.args.get(dim)}
+    csv_path = find_plantaciones_csv()
+    if not csv_path:
+        return jsonify({'success': False, 'error': 'CSV no encontrado'}), 400
+    try:
+        dataset = load_dataset(csv_path)
+        cube = dataset.extras['aggregates']
+        t0 = time.perf_counter()
+        out = {b: cube.query(b, top=top if top > 0 else None, filtros=filtros, orden=orden) for b in by}
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'data_version': dataset.version,
+        'aggregates': out,
+        'took_ms': round((time.perf_counter() - t0) * 1000, 3),
+    })
+
+
+@app.route('/api/ingest', methods=['POST'])
+def api_ingest():
+    """Append new plantation records to the CSV and the cached graphs.
+
+    Accepts a multipart 'file' (CSV with the same ';' format) or JSON
+    {"records": [{...}, ...]}. Records whose ID_PLANTACION already exists
+    are skipped; the rest are ingested without rebuilding the dataset.
+    """
+    if not session.get('user'):
+        return jsonify({'success': False, 'error': 'No autenticado'}), 401
+    import pandas as pd
+    from codigo.dataset_store import DATASET_STORE
+    csv_path = find_plantaciones_csv()
+    if not csv_path:
+        return jsonify({'success': False, 'error': 'CSV no encontrado'}), 400
+    try:
+        if 'file' in request.files:
+            df = pd.read_csv(request.files['file'].stream, sep=';', encoding='utf-8-sig')
+        else:
+            records = (request.get_json(silent=True) or {}).get('records')
+            if not isinstance(records, list) or not records:
+                return jsonify({'success': False, 'error': 'Envíe un archivo CSV o una lista records'}), 400
+            df = pd.DataFrame.from_records(records)
+        t0 = time.perf_counter()
+        dataset = DATASET_STORE.append(csv_path, df)
+    except (ValueError, KeyError, pd.errors.ParserError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    resumen = dataset.extras.get('last_append', {})
+    return jsonify({
+        'success': True,
+        'rows_added': resumen.get('rows', 0),
+        'duplicates': resumen.get('duplicates', 0),
+        'data_version': dataset.version,
+        'periodos': dataset.periodos,
+        'took_ms': round((time.perf_counter() - t0) * 1000, 3),
+    })
+
+
+@app.route('/api/cache_stats', methods=['GET'])
+def api_cache_stats():
+    from codigo.dataset_store import DATASET_STORE
+    return jsonify({
+        'dataset': DATASET_STORE.stats(),
+        'highlights': get_highlight_cache().stats(),
+        'jobs': get_job_runner().stats(),
+        'paths': _DERIVED['paths'][1].stats() if 'paths' in _DERIVED else None,
+        'responses': get_response_cache().stats(),
+    })
+
+
+def _collect_metrics(registry):
+    # gauges, read when a worker writes its metrics file
+    from codigo.dataset_store import DATASET_STORE
+    from codigo.procmem import memory_usage
+    g = _GRAPH_CACHE
+    if g is not None:
+        registry.set('graph_nodes', g.number_of_nodes(), graph='grafo')
+        registry.set('graph_edges', g.number_of_edges(), graph='grafo')
+    for ds in DATASET_STORE.datasets():
+        nombre = os.path.basename(ds.path)
+        registry.set('graph_nodes', ds.G_viz.number_of_nodes(), graph='viz', dataset=nombre)
+        registry.set('graph_edges', ds.G_viz.number_of_edges(), graph='viz', dataset=nombre)
+        registry.set('dataset_rows', len(ds.G_logico), dataset=nombre)
+        registry.set('dataset_version', ds.version, dataset=nombre)
+    for kind, value in memory_usage().items():
+        if kind != 'pid' and value is not None:
+            registry.set('process_memory_bytes', value, kind=kind)
+
+
+def get_metrics():
+    global _METRICS
+    if _METRICS is None:
+        from codigo import metrics
+        with _GRAPH_LOCK:
+            if _METRICS is None:
+                metrics.REGISTRY.add_collector(_collect_metrics)
+                _METRICS = metrics
+    return _METRICS
+
+
+@app.before_request
+def _metrics_start():
+    request.environ['metrics.t0'] = time.perf_counter()
+
+
+@app.after_request
+def _metrics_observe(response):
+    t0 = request.environ.pop('metrics.t0', None)
+    if t0 is not None:
+        metrics = get_metrics()
+        # the rule, not the path, so /graphs/<path:filename> is one series
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - t0,
+                        route=route, method=request.method, status=response.status_code)
+        metrics.flush()
+    return response
+
+
+def get_profiler():
+    global _PROFILER
+    if _PROFILER is None:
+        from codigo.profiling import Profiler
+        with _GRAPH_LOCK:
+            if _PROFILER is None:
+                _PROFILER = Profiler(PROFILE_DIR, PROFILE_MAX, PROFILE_SAMPLE_INTERVAL, PROFILE_SAMPLE_RATE)
+    return _PROFILER
+
+
+def _profile_params():
+    """PROFILE_PARAMS values of the query string and JSON body (a batch
+    only records how many items it had)."""
+    fuentes = [request.args.to_dict()]
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        fuentes.append(body)
+        items = body.get('items')
+    else:
+        items = body
+    params = {}
+    for fuente in fuentes:
+        for k, v in fuente.items():
+            if k not in PROFILE_PARAMS or any(s in k.lower() for s in PROFILE_SECRET_KEYS):
+                continue
+            if isinstance(v, (str, int, float, bool)):
+                params[k] = str(v)[:200]
+    if isinstance(items, list):
+        params['items'] = len(items)
+    return params
+
+
+@app.before_request
+def _profile_start():
+    if not PROFILING:
+        return
+    route = request.url_rule.rule if request.url_rule is not None else None
+    if route not in PROFILE_ROUTES:
+        return
+    profiler = get_profiler()
+    mode = profiler.choose(request.headers.get('X-Profile'))
+    if mode is not None:
+        request.environ['profile.capture'] = profiler.start(mode, route=route, method=request.method,
+                                                            path=request.path, trigger='header' if request.headers.get('X-Profile') else 'sample')
+
+
+@app.after_request
+def _profile_stop(response):
+    capture = request.environ.pop('profile.capture', None)
+    if capture is not None:
+        meta = get_profiler().stop(capture, status=response.status_code, params=_profile_params())
+        if meta is not None:
+            response.headers['X-Profile-Id'] = meta['id']
+    return response
+
+
+@app.teardown_request
+def _profile_abort(exc):
+    # after_request did not run (e.g. another hook raised): stop without saving
+    capture = request.environ.pop('profile.capture', None)
+    if capture is not None:
+        get_profiler().stop(capture, save=False)
+
+
+@app.route('/api/profiles', methods=['GET'])
+def api_profiles():
+    if not PROFILING:
+        return jsonify({'success': False, 'error': 'Profiling desactivado (PROFILING=1)'}), 404
+    if not session.get('user'):
+        return jsonify({'success': False, 'error': 'No autenticado'}), 401
+    profiler = get_profiler()
+    return jsonify({'success': True, 'stats': profiler.stats(), 'profiles': profiler.list()})
+
+
+@app.route('/api/profiles/<profile_id>/<fmt>', methods=['GET'])
+def api_profile_file(profile_id, fmt):
+    from codigo.profiling import FORMATS
+    if not PROFILING:
+        return jsonify({'success': False, 'error': 'Profiling desactivado (PROFILING=1)'}), 404
+    if not session.get('user'):
+        return jsonify({'success': False, 'error': 'No autenticado'}), 401
+    path = get_profiler().path_for(profile_id, fmt)
+    if path is None:
+        return jsonify({'success': False, 'error': 'Perfil no encontrado'}), 404
+    return send_file(path, mimetype=FORMATS[fmt], as_attachment=fmt != 'json', download_name=path.name)
+
+
+@app.route('/api/ready', methods=['GET'])
+def api_ready():
+    """What is warm in this process; 200 once the graph, its query indexes
+    and the dataset are loaded, 503 before."""
+    # not imported yet means no dataset loaded; the probe itself stays cheap
+    dataset_store = sys.modules.get('codigo.dataset_store')
+    version = _GRAPH_VERSION if _GRAPH_CACHE is not None else None
+    warm = {'graph': _GRAPH_CACHE is not None, 'identifier_index': _NODE_INDEX is not None}
+    for name in ('search_index', 'filters', 'paths', 'components', 'layout', 'graph_payload'):
+        hit = _DERIVED.get(name)
+        warm[name] = hit is not None and hit[0] == version
+    warm['stats'] = _STATS_CACHE is not None
+    warm['dataset'] = dataset_store is not None and bool(dataset_store.DATASET_STORE.datasets())
+    warm['general_graph_html'] = os.path.exists(os.path.join(BASE_DIR, GRAPH_GENERAL_HTML))
+    required = ['graph', 'identifier_index', 'search_index', 'filters', 'components']
+    if find_plantaciones_csv():
+        required.append('dataset')
+    ready = all(warm[k] for k in required)
+    with _WARMUP_LOCK:
+        warmup = dict(_WARMUP, steps={k: dict(v) for k, v in _WARMUP['steps'].items()})
+    return jsonify({
+        'ready': ready,
+        'warm': warm,
+        'warmup': warmup,
+        'startup': {
+            'import_seconds': round(_IMPORT_SECONDS, 4),
+            'uptime_seconds': round(time.time() - _IMPORT_STARTED, 3),
+            'warm_after_seconds': round(warmup['finished'] - _IMPORT_STARTED, 3) if warmup['finished'] else None,
+            'pid': os.getpid(),
+        },
+        # heavy libraries this process has imported so far
+        'modules': {m: m in sys.modules for m in ('networkx', 'numpy', 'pandas', 'pyvis', 'scipy')},
+    }), 200 if ready else 503
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text format, merged over all gunicorn workers (codigo/metrics.py)."""
+    return Response(get_metrics().render_all(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def get_highlight_cache():
+    global _HIGHLIGHTS
+    if _HIGHLIGHTS is None:
+        from codigo.highlight_cache import HighlightCache
+        with _GRAPH_LOCK:
+            if _HIGHLIGHTS is None:
+                _HIGHLIGHTS = HighlightCache(Path(BASE_DIR) / GRAPH_HIGHLIGHT_DIR, HIGHLIGHT_CACHE_FILES)
+    return _HIGHLIGHTS
+
+
+def get_response_cache():
+    global _RESPONSES
+    if _RESPONSES is None:
+        from codigo.response_cache import ResponseCache
+        with _GRAPH_LOCK:
+            if _RESPONSES is None:
+                _RESPONSES = ResponseCache(RESPONSE_CACHE_ENTRIES, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL)
+    return _RESPONSES
+
+
+def cached_json(key, compute, valid=None, adapt=None):
+    """JSON response for `key` from the response cache; compute() returns the
+    serialized body, or (body, extra) when `valid` or `adapt` need more than
+    the body. `adapt(value)` returns the body to send, for request details
+    the key deliberately leaves out."""
+    value, result = get_response_cache().get_or_compute(
+        key, compute, size=lambda v: len(v[0] if isinstance(v, tuple) else v), valid=valid)
+    get_metrics().inc('cache_requests_total', cache='responses', result='miss' if result == 'miss' else 'hit')
+    if adapt is not None:
+        body = adapt(value)
+    else:
+        body = value[0] if isinstance(value, tuple) else value
+    response = app.response_class(body, mimetype='application/json')
+    response.headers['X-Cache'] = result.upper()
+    return response
+
+
+def get_job_runner():
+    global _JOBS
+    if _JOBS is None:
+        from codigo.jobs import JobRunner
+        with _GRAPH_LOCK:
+            if _JOBS is None:
+                _JOBS = JobRunner(max_workers=JOB_WORKERS, status_dir=JOBS_STATUS_DIR)
+    return _JOBS
+
+
+def build_graph_payload(g):
+    """Serialize the graph for /api/graph once; reused until the graph changes."""
+    from codigo.compressed_payload import CompressedPayload
+    from codigo.layout import force_layout
+    positions = graph_derived('layout', force_layout)
     nodes = []
     edges = []
     for n, attrs in g.nodes(data=True):
@@ -146,11 +748,40 @@ def api_graph():
         }
         # attach all attributes under 'attrs' so frontend can access departamento, provincia, etc.
         node = {'data': node_data, 'attrs': {k: v for k, v in attrs.items()}}
+        pos = positions.get(str(n))
+        if pos is not None:
+            # precomputed so the client can use Cytoscape's 'preset' layout
+            node['position'] = {'x': pos[0], 'y': pos[1]}
         nodes.append(node)
     for u, v, attrs in g.edges(data=True):
         eid = attrs.get('id', f"e_{u}_{v}")
         edges.append({'data': {'source': str(u), 'target': str(v), 'id': str(eid)}})
-    return jsonify({'nodes': nodes, 'edges': edges})
+    raw = app.json.dumps({'nodes': nodes, 'edges': edges}, separators=(',', ':')).encode('utf-8')
+    return CompressedPayload(raw)
+
+
+def send_payload(payload, cache_control='public, no-cache'):
+    """Serve a CompressedPayload honouring Accept-Encoding and If-None-Match."""
+    encoding = payload.choose_encoding(request.accept_encodings)
+    headers = {
+        'ETag': f'"{payload.etags[encoding]}"',
+        'Cache-Control': cache_control,
+        'Vary': 'Accept-Encoding',
+    }
+    if payload.matches(request.if_none_match):
+        return Response(status=304, headers=headers)
+    body = payload.bodies[encoding]
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    resp = Response(body, mimetype=payload.mimetype, headers=headers)
+    resp.direct_passthrough = True
+    return resp
+
+
+@app.route('/api/graph', methods=['GET'])
+def api_graph():
+    # no-cache: browsers keep the body but revalidate, getting a 304 until the graph changes
+    return send_payload(graph_derived('graph_payload', build_graph_payload))
 
 
 @app.route('/graphs/<path:filename>')
@@ -163,31 +794,67 @@ def serve_graph_html(filename):
     return send_from_directory(safe_dir, filename)
 
 
+def generate_general_graph(job=None):
+    """Parse the CSV, build the graphs and render the general pyvis page.
+
+    Runs inside a background job; `job` receives the parse/build/render phases.
+    """
+    from codigo.complex_grafo import export_pyvis
+    csv_path = find_plantaciones_csv()
+    if not csv_path:
+        raise FileNotFoundError('CSV de plantaciones no encontrado en datos/')
+    dataset = load_dataset(csv_path, job.set_phase if job else None)
+    if job and job.phase is None:
+        # dataset was already cached
+        job.skip_phase('parse')
+        job.skip_phase('build')
+    out = Path(BASE_DIR) / GRAPH_GENERAL_HTML
+    rendered = dataset.extras.get('general_graph_html') != str(out) or not out.exists()
+    if rendered:
+        if job:
+            job.set_phase('render')
+        export_pyvis(dataset.G_viz, out)
+        dataset.extras['general_graph_html'] = str(out)
+    elif job:
+        job.skip_phase('render')
+    return {'path': f'/static/graphs/{out.name}', 'dataset_version': dataset.version, 'rendered': rendered}
+
+
+def submit_general_graph_job(profile_mode=None):
+    csv_path = find_plantaciones_csv()
+    key = os.path.abspath(csv_path) if csv_path else ''
+    fn = generate_general_graph
+    if profile_mode:
+        # the work happens in the job thread, not in the request
+        fn = get_profiler().wrap(fn, profile_mode, route='job:general_graph', trigger='request')
+    return get_job_runner().submit('general_graph', key, fn, phases=('parse', 'build', 'render'))
+
+
 @app.route('/api/generate_general_graph', methods=['POST'])
 def api_generate_general_graph():
-    # generate graph HTML using Complejidad logic
+    # generation runs in the background; poll status_url for progress
     try:
-        from codigo.complex_grafo import build_visual_and_logical_graphs, export_pyvis
-        csv_candidates = [
-            os.path.join(DATA_DIR, 'plantaciones-2021-1.csv'),
-            os.path.join(DATA_DIR, 'plantaciones 2021.csv'),
-            os.path.join(DATA_DIR, 'plantaciones-2021.csv'),
-            os.path.join(DATA_DIR, 'plantaciones.csv')
-        ]
-        csv_path = None
-        for c in csv_candidates:
-            if os.path.exists(c):
-                csv_path = c; break
-        if not csv_path:
-            return jsonify({'success': False, 'error': 'CSV de plantaciones no encontrado en datos/'}), 400
-        G_viz, G_logico = build_visual_and_logical_graphs(Path(csv_path))
-        out = Path(BASE_DIR) / GRAPH_GENERAL_HTML
-        export_pyvis(G_viz, out)
-        return jsonify({'success': True, 'path': f'/static/graphs/{out.name}'})
+        capture = request.environ.get('profile.capture')
+        job, created = submit_general_graph_job(capture.mode if capture is not None else None)
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': f'/api/jobs/{job.id}',
+            'deduplicated': not created,
+            'job': job.to_dict(),
+        }), 202
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def api_job_status(job_id):
+    job = get_job_runner().get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'job no encontrado'}), 404
+    return jsonify({'success': True, 'job': job})
+
+
 @app.route('/api/graphs_list', methods=['GET'])
 def api_graphs_list():
     """Return list of generated graph HTML files in static/graphs."""
@@ -205,28 +872,41 @@ def api_species_search():
     if not query:
         return jsonify({'success': False, 'error': 'query required'}), 400
     try:
-        from codigo.complex_grafo import build_visual_and_logical_graphs
-        # load graphs
-        # prefer project data CSV
-        csv_candidates = [
-            os.path.join(DATA_DIR, 'plantaciones-2021-1.csv'),
-            os.path.join(DATA_DIR, 'plantaciones 2021.csv')
-        ]
-        csv_path = None
-        for c in csv_candidates:
-            if os.path.exists(c):
-                csv_path = c; break
+        # load graphs (cached per CSV version)
+        csv_path = find_plantaciones_csv()
         if not csv_path:
             return jsonify({'success': False, 'error': 'CSV no encontrado'}), 400
-        G_viz, G_logico = build_visual_and_logical_graphs(Path(csv_path))
-        # collect unique species in G_viz matching query (substring, case-insensitive)
-        q = query.strip().upper()
-        matches = [n for n, attrs in G_viz.nodes(data=True) if attrs.get('tipo','').lower() == 'especie' and q in str(n).upper()]
+        dataset = load_dataset(csv_path)
+        # species of G_viz containing the query (accent/case-insensitive),
+        # through a trigram index built once per dataset version
+        index = dataset.extras.get('species_index')
+        if index is None:
+            from codigo.search_index import build_species_index
+            index = dataset.extras['species_index'] = build_species_index(dataset.G_viz)
+        matches = [e['node'] for e in index.coincidencias(query)]
         return jsonify({'success': True, 'matches': matches})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/autocomplete', methods=['GET'])
+def api_autocomplete():
+    q = request.args.get('q', '')
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), 50))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit/offset deben ser enteros'}), 400
+    tipos = [t.strip() for t in request.args.get('tipo', '').split(',') if t.strip()]
+    from codigo.search_index import build_graph_search_index
+    index = graph_derived('search_index', build_graph_search_index)
+    t0 = time.perf_counter()
+    res = index.buscar(q, limit=limit, offset=offset, tipos=tipos or None)
+    took = (time.perf_counter() - t0) * 1000
+    return jsonify({'success': True, 'query': q, 'total': res['total'], 'total_exact': res['total_exact'],
+                    'offset': offset, 'results': res['results'], 'took_ms': round(took, 3)})
+
+
 @app.route('/api/bfs_execute', methods=['POST'])
 def api_bfs_execute():
     data = request.get_json() or {}
@@ -235,91 +915,125 @@ def api_bfs_execute():
     if not species:
         return jsonify({'success': False, 'error': 'species required'}), 400
     try:
-        from codigo.complex_grafo import build_visual_and_logical_graphs, ejecutar_bfs_en_grafos, export_pyvis
-        csv_candidates = [
-            os.path.join(DATA_DIR, 'plantaciones-2021-1.csv'),
-            os.path.join(DATA_DIR, 'plantaciones 2021.csv')
-        ]
-        csv_path = None
-        for c in csv_candidates:
-            if os.path.exists(c):
-                csv_path = c; break
+        from codigo.complex_grafo import normalize_string
+        csv_path = find_plantaciones_csv()
         if not csv_path:
             return jsonify({'success': False, 'error': 'CSV no encontrado'}), 400
-        G_viz, G_logico = build_visual_and_logical_graphs(Path(csv_path))
-        nodos_resaltar, bordes_resaltar = ejecutar_bfs_en_grafos(G_viz, G_logico, species)
-        # Print matches to server console for the user's review
-        print('\n--- BFS ejecutado para especie:', species, '---')
-        if nodos_resaltar:
-            print('Nodos a resaltar (incluye la especie y distritos encontrados):')
-            for n in sorted(map(str, nodos_resaltar)):
-                print(' -', n)
-        else:
-            print('No se encontraron nodos para la especie solicitada.')
+        with get_metrics().fase('bfs_execute.load_dataset'):
+            dataset = load_dataset(csv_path)
+        # a cached highlight_path is only reused while its page is still on disk
+        return cached_json(('bfs_execute', dataset.version, normalize_string(species), generate_highlight),
+                           lambda: _bfs_execute_body(dataset, species, generate_highlight),
+                           valid=lambda v: v[1] is None or v[1].exists())
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        # Collect plantaciones details from logical graph
-        try:
+
+def _bfs_execute_body(dataset, species, generate_highlight):
+    """(JSON body, highlight page path or None) of a /api/bfs_execute call."""
+    from codigo.complex_grafo import COLOR_HIGHLIGHT, ejecutar_bfs_en_grafos, normalize_string
+    metrics = get_metrics()
+    G_viz, G_logico = dataset
+    nodos_resaltar, bordes_resaltar = ejecutar_bfs_en_grafos(G_viz, G_logico, species)
+    # sorting the matches only pays off when someone reads the debug log
+    if app.logger.isEnabledFor(logging.DEBUG):
+        app.logger.debug('BFS para especie %r: %d nodos a resaltar %s', species, len(nodos_resaltar),
+                         sorted(map(str, nodos_resaltar)))
+
+    # Collect plantaciones details from logical graph
+    try:
+        with metrics.fase('bfs_execute.bfs_por_especie'):
             plantas = G_logico.bfs_por_especie(species)
-            plantaciones = []
-            for p in plantas:
-                plantaciones.append({
-                    'id': getattr(p, 'id', None),
-                    'especie': getattr(p, 'especie', None),
-                    'titular': getattr(p, 'titular', None),
-                    'distrito': getattr(p, 'distrito', None),
-                    'superficie': getattr(p, 'superficie', None)
-                })
-        except Exception:
-            plantaciones = []
+        plantaciones = []
+        for p in plantas:
+            plantaciones.append({
+                'id': getattr(p, 'id', None),
+                'especie': getattr(p, 'especie', None),
+                'titular': getattr(p, 'titular', None),
+                'distrito': getattr(p, 'distrito', None),
+                'superficie': getattr(p, 'superficie', None)
+            })
+    except Exception:
+        plantaciones = []
 
-        result = {
-            'nodos_resaltar': list(nodos_resaltar),
-            'num_bordes': len(bordes_resaltar),
-            'bordes': [list(map(str, b)) for b in bordes_resaltar],
-            'plantaciones': plantaciones
-        }
+    result = {
+        'nodos_resaltar': list(nodos_resaltar),
+        'num_bordes': len(bordes_resaltar),
+        'bordes': [list(map(str, b)) for b in bordes_resaltar],
+        'plantaciones': plantaciones
+    }
 
-        # If frontend requested generation, do it immediately
-        if generate_highlight:
-            out = Path(BASE_DIR) / GRAPH_HIGHLIGHT_HTML
-            export_pyvis(G_viz, out, nodos_resaltar=nodos_resaltar, bordes_resaltar=bordes_resaltar)
-            result['highlight_path'] = f'/static/graphs/{out.name}'
-            print(f'Grafo resaltado generado: {out}')
-            return jsonify({'success': True, 'result': result})
+    # The base network is rendered once per dataset; each species page only
+    # adds an overlay script and is reused until evicted from the LRU.
+    out = None
+    if generate_highlight:
+        with metrics.fase('bfs_execute.highlight'):
+            out = get_highlight_cache().render(dataset, normalize_string(species), nodos_resaltar,
+                                               bordes_resaltar, COLOR_HIGHLIGHT)
+        result['highlight_path'] = f'/static/graphs/{out.parent.name}/{out.name}'
+        app.logger.debug('Grafo resaltado: %s', out)
 
-        return jsonify({'success': True, 'result': result})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    with metrics.fase('bfs_execute.serialize'):
+        return jsonify({'success': True, 'result': result}).get_data(), out
 
 
-@app.route('/api/analysis', methods=['GET', 'POST'])
-def api_analysis():
-    # Allow GET for quick human-friendly info (avoids 405 when user opens the URL in browser)
-    if request.method == 'GET':
-        return jsonify({
-            'success': True,
-            'info': 'Este endpoint acepta POST con JSON. Ejemplo: {"tipo":"bfs","startNode":"<id>","limit":100}. Use POST para ejecutar análisis.'
-        })
+def _resolve_endpoint(full, identifier, nombre, resolved, response):
+    """Map startNode/targetNode to a node id of the loaded graph."""
+    ident = str(identifier)
+    if resolved is not None and ident in resolved:
+        node, candidates = resolved[ident]
+    else:
+        with get_metrics().fase('analysis.resolve'):
+            node, candidates = resolve_node_identifier(full, ident)
+    if node is None:
+        if candidates:
+            raise ValueError(f"{nombre} no encontrado. Coincidencias posibles: {candidates}")
+        raise ValueError(f'{nombre} no existe en el grafo')
+    if node != ident:
+        response['note'] += f"Se mapeó {nombre} a '{node}' según coincidencia por etiqueta/atributo. "
+    return node
 
-    data = request.get_json() or {}
+
+def _analysis_filters(data):
+    """especie/departamento of an analysis spec, as run_analysis echoes them."""
+    return {'especie': data.get('especie', 'Todas'), 'departamento': data.get('departamento', 'Todos')}
+
+
+def _normalize_filter(value):
+    # the response cache keys on this, so 'Pino', 'pino ' and 'PINO' share one entry
+    from codigo.complex_grafo import normalize_string
+    return normalize_string(value) if isinstance(value, str) else value
+
+
+def resolve_identifiers(full, identifiers):
+    """Resolve many identifiers in one pass: {identifier: (node or None, candidates)}."""
+    return {str(i): resolve_node_identifier(full, i) for i in set(map(str, identifiers))}
+
+
+def run_analysis(data, resolved=None):
+    """Run one analysis spec (the /api/analysis JSON body) and return its result.
+
+    `resolved` optionally carries identifiers already resolved by
+    resolve_identifiers(). Invalid specs raise ValueError.
+    """
+    import networkx as nx
     tipo = data.get('tipo')
-    especie = data.get('especie', 'Todas')
-    departamento = data.get('departamento', 'Todos')
+    filtros = _analysis_filters(data)
+    especie, departamento = filtros['especie'], filtros['departamento']
     start = data.get('startNode')
     target = data.get('targetNode')
     limit = int(data.get('limit', 100)) if data.get('limit') else 100
 
     # Lectura segura de stats (si existe)
     try:
-        with open(STATS_FILE, 'r', encoding='utf-8') as f:
-            stats = json.load(f)
+        stats = load_stats()
     except Exception:
         stats = {}
 
     # Preparar respuesta base
     response = {
         'tipo': tipo,
-        'filtros': {'especie': especie, 'departamento': departamento},
+        'filtros': filtros,
         'metrics': {
             'num_nodos': stats.get('num_nodos'),
             'num_aristas': stats.get('num_aristas')
@@ -328,109 +1042,236 @@ def api_analysis():
         'note': ''
     }
 
-    g = load_graph()
+    full = load_graph()
 
-    try:
-        if tipo in ('bfs', 'dfs'):
-            if not start:
-                raise ValueError('Se requiere startNode para BFS/DFS')
-            start = str(start)
-            if start not in g:
-                # try to resolve by label/attributes
-                resolved, candidates = resolve_node_identifier(g, start)
-                if resolved:
-                    start = resolved
-                    response['note'] += f"Se mapeó startNode a '{start}' según coincidencia por etiqueta/atributo. "
-                elif candidates:
-                    # ambiguous
-                    raise ValueError(f"startNode no encontrado. Coincidencias posibles: {candidates}")
-                else:
-                    raise ValueError('startNode no existe en el grafo')
-            visited = []
-            if tipo == 'bfs':
-                for n in nx.bfs_tree(g, start):
-                    visited.append(n)
-                    if len(visited) >= limit:
-                        break
-            else:
-                for n in nx.dfs_preorder_nodes(g, start):
-                    visited.append(n)
-                    if len(visited) >= limit:
-                        break
-            response['output'] = {'visited_count': len(visited), 'visited': list(map(str, visited))}
-
-        elif tipo == 'dijkstra':
+    # especie/departamento restrict the analysis to the matching plantaciones
+    # and their neighbours; the view shares the loaded graph's storage
+    from codigo.graph_filters import FilterIndex
+    fase = get_metrics().fase
+    with fase('analysis.filter'):
+        g, region = graph_derived('filters', FilterIndex).view(especie, departamento)
+    if region is not None:
+        if not region:
+            raise ValueError('Ningún nodo coincide con los filtros de especie/departamento')
+        response['metrics']['nodos_filtrados'] = len(region)
+
+    if tipo in ('bfs', 'dfs'):
+        if not start:
+            raise ValueError('Se requiere startNode para BFS/DFS')
+        start = _resolve_endpoint(full, start, 'startNode', resolved, response)
+        if start not in g:
+            raise ValueError('startNode queda fuera de los filtros de especie/departamento')
+        visited = []
+        with fase(f'analysis.{tipo}'):
+            recorrido = nx.bfs_tree(g, start) if tipo == 'bfs' else nx.dfs_preorder_nodes(g, start)
+            for n in recorrido:
+                visited.append(n)
+                if len(visited) >= limit:
+                    break
+        response['output'] = {'visited_count': len(visited), 'visited': list(map(str, visited))}
+
+    elif tipo == 'dijkstra':
+        if not start or not target:
+            raise ValueError('startNode y targetNode son requeridos para Dijkstra')
+        start = _resolve_endpoint(full, start, 'startNode', resolved, response)
+        target = _resolve_endpoint(full, target, 'targetNode', resolved, response)
+        for nombre, nodo in (('startNode', start), ('targetNode', target)):
+            if nodo not in g:
+                raise ValueError(f'{nombre} queda fuera de los filtros de especie/departamento')
+        # different components in the full graph: no search needed
+        from codigo.union_find import ComponentIndex
+        from codigo.shortest_paths import ShortestPathEngine
+        with fase('analysis.dijkstra'):
+            if not graph_derived('components', ComponentIndex).connected(start, target):
+                raise nx.NetworkXNoPath(f"No path between {start} and {target}.")
+            # one search for path and distance, cached per graph version and region
+            dist, path = graph_derived('paths', ShortestPathEngine).shortest_path(start, target, region)
+        response['output'] = {'distance': dist, 'path': list(map(str, path))}
+
+    elif tipo in ('unionfind', 'components'):
+        # modo: 'summary' (default), 'connected' (startNode, targetNode) or
+        # 'members' (startNode, offset, limit)
+        from codigo.union_find import ComponentIndex
+        with fase('analysis.components'):
+            comps = graph_derived('components', ComponentIndex) if region is None else ComponentIndex(g)
+        modo = data.get('modo', 'summary')
+        if modo == 'summary':
+            sizes = comps.sizes()
+            response['output'] = {'components': comps.count, 'largest_component_size': comps.largest,
+                                  'sizes_sample': sizes[:10]}
+        elif modo == 'connected':
             if not start or not target:
-                raise ValueError('startNode y targetNode son requeridos para Dijkstra')
-            start = str(start); target = str(target)
-            # resolve start
+                raise ValueError('startNode y targetNode son requeridos para modo connected')
+            start = _resolve_endpoint(full, start, 'startNode', resolved, response)
+            target = _resolve_endpoint(full, target, 'targetNode', resolved, response)
+            conectados = start in g and target in g and comps.connected(start, target)
+            response['output'] = {'connected': conectados, 'startNode': str(start), 'targetNode': str(target)}
+            if conectados:
+                response['output']['component'] = comps.component_id(start)
+        elif modo == 'members':
+            if not start:
+                raise ValueError('Se requiere startNode para modo members')
+            start = _resolve_endpoint(full, start, 'startNode', resolved, response)
             if start not in g:
-                resolved_s, cand_s = resolve_node_identifier(g, start)
-                if resolved_s:
-                    start = resolved_s
-                    response['note'] += f"Se mapeó startNode a '{start}' según coincidencia por etiqueta/atributo. "
-                elif cand_s:
-                    raise ValueError(f"startNode no encontrado. Coincidencias posibles: {cand_s}")
-                else:
-                    raise ValueError('startNode no existe en el grafo')
-            # resolve target
-            if target not in g:
-                resolved_t, cand_t = resolve_node_identifier(g, target)
-                if resolved_t:
-                    target = resolved_t
-                    response['note'] += f"Se mapeó targetNode a '{target}' según coincidencia por etiqueta/atributo. "
-                elif cand_t:
-                    raise ValueError(f"targetNode no encontrado. Coincidencias posibles: {cand_t}")
-                else:
-                    raise ValueError('targetNode no existe en el grafo')
-            try:
-                path = nx.shortest_path(g, source=start, target=target, weight='weight')
-                dist = nx.shortest_path_length(g, source=start, target=target, weight='weight')
-            except Exception:
-                path = nx.shortest_path(g, source=start, target=target)
-                dist = len(path) - 1
-            response['output'] = {'distance': dist, 'path': list(map(str, path))}
-
-        elif tipo in ('unionfind', 'components'):
-            comps = list(nx.connected_components(g))
-            sizes = [len(c) for c in comps]
-            largest = max(sizes) if sizes else 0
-            response['output'] = {'components': len(comps), 'largest_component_size': largest, 'sizes_sample': sizes[:10]}
-
+                raise ValueError('startNode queda fuera de los filtros de especie/departamento')
+            offset = max(0, int(data.get('offset', 0) or 0))
+            members = comps.members(start, offset, limit)
+            response['output'] = {
+                'component': comps.component_id(start),
+                'size': comps.component_size(start),
+                'offset': offset,
+                'members': list(map(str, members)),
+            }
         else:
-            response['output'] = {'message': 'Tipo no reconocido; se devolvió un ejemplo.'}
+            raise ValueError(f'modo desconocido: {modo}')
+
+    else:
+        response['output'] = {'message': 'Tipo no reconocido; se devolvió un ejemplo.'}
+    return response
+
+
+@app.route('/api/analysis', methods=['GET', 'POST'])
+def api_analysis():
+    # Allow GET for quick human-friendly info (avoids 405 when user opens the URL in browser)
+    if request.method == 'GET':
+        return jsonify({
+            'success': True,
+            'info': 'Este endpoint acepta POST con JSON. Ejemplo: {"tipo":"bfs","startNode":"<id>","limit":100}. Use POST para ejecutar análisis.'
+        })
+
+    data = request.get_json() or {}
+    try:
+        key, resolved = analysis_cache_key(data)
+        filtros = _analysis_filters(data)
+
+        def compute():
+            return jsonify({'success': True, 'result': run_analysis(data, resolved)}).get_data(), filtros
+
+        def adapt(value):
+            # the key folds the filters' spelling; echo the caller's own
+            body, eco = value
+            if eco == filtros:
+                return body
+            payload = json.loads(body)
+            payload['result']['filtros'] = filtros
+            return jsonify(payload).get_data()
+
+        return cached_json(key, compute, adapt=adapt)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
-    return jsonify({'success': True, 'result': response})
 
+def _stats_version():
+    try:
+        st = os.stat(STATS_FILE)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
 
-if __name__ == '__main__':
-    # Al iniciar, intentar generar el grafo general HTML si hay CSV disponible
+
+def analysis_cache_key(data):
+    """(response cache key, resolved identifiers) of an analysis spec.
+
+    Only the fields the tipo uses are part of the key, with startNode and
+    targetNode as the node they resolve to, so equivalent spellings of a
+    query share one entry. The graph version and grafo_stats.json (echoed in
+    'metrics') are part of it too.
+    """
+    tipo = data.get('tipo')
+    modo = data.get('modo', 'summary') if tipo in ('unionfind', 'components') else None
+    campos = {
+        'bfs': ('startNode', 'limit'), 'dfs': ('startNode', 'limit'),
+        'dijkstra': ('startNode', 'targetNode'),
+    }.get(tipo, {'connected': ('startNode', 'targetNode'),
+                 'members': ('startNode', 'limit', 'offset')}.get(modo, ()))
+    full = load_graph()
+    endpoints = [data.get(k) for k in ('startNode', 'targetNode') if k in campos and data.get(k)]
+    resolved = resolve_identifiers(full, endpoints)
+    partes = []
+    for campo in campos:
+        valor = data.get(campo)
+        if campo in ('startNode', 'targetNode') and valor:
+            # the response notes when the identifier was mapped to another node
+            node = resolved[str(valor)][0]
+            valor = ('=', node) if node == str(valor) else ('~', node, str(valor) if node is None else None)
+        elif campo == 'limit':
+            valor = int(valor) if valor else 100
+        elif campo == 'offset':
+            valor = max(0, int(valor or 0))
+        partes.append((campo, valor))
+    key = ('analysis', graph_version(), _stats_version(), tipo, modo,
+           *(_normalize_filter(v) for v in _analysis_filters(data).values()), tuple(partes))
+    return key, resolved
+
+
+def get_analysis_pool():
+    global _ANALYSIS_POOL, _ANALYSIS_POOL_PID
+    # created lazily per process: threads do not survive gunicorn's fork
+    if _ANALYSIS_POOL is None or _ANALYSIS_POOL_PID != os.getpid():
+        from concurrent.futures import ThreadPoolExecutor
+        with _GRAPH_LOCK:
+            if _ANALYSIS_POOL is None or _ANALYSIS_POOL_PID != os.getpid():
+                _ANALYSIS_POOL = ThreadPoolExecutor(max_workers=ANALYSIS_BATCH_WORKERS, thread_name_prefix='analysis')
+                _ANALYSIS_POOL_PID = os.getpid()
+    return _ANALYSIS_POOL
+
+
+def _run_batch_item(index, spec, resolved):
+    t0 = time.perf_counter()
     try:
-        from codigo.complex_grafo import build_visual_and_logical_graphs, export_pyvis
-        csv_candidates = [
-            os.path.join(DATA_DIR, 'plantaciones-2021-1.csv'),
-            os.path.join(DATA_DIR, 'plantaciones 2021.csv'),
-            os.path.join(DATA_DIR, 'plantaciones-2021.csv'),
-            os.path.join(DATA_DIR, 'plantaciones.csv')
-        ]
-        csv_path = None
-        for c in csv_candidates:
-            if os.path.exists(c):
-                csv_path = c; break
-        if csv_path:
-            try:
-                print('Generando grafo general en HTML desde:', csv_path)
-                G_viz, G_logico = build_visual_and_logical_graphs(Path(csv_path))
-                out = Path(BASE_DIR) / GRAPH_GENERAL_HTML
-                export_pyvis(G_viz, out)
-                print('Grafo general generado en:', out)
-            except Exception as e:
-                print('No se pudo generar el grafo general al inicio:', e)
-    except Exception:
-        # ignore if complex_grafo not available
-        pass
+        if not isinstance(spec, dict):
+            raise ValueError('Cada elemento debe ser un objeto JSON')
+        out = {'index': index, 'success': True, 'result': run_analysis(spec, resolved)}
+    except Exception as e:
+        out = {'index': index, 'success': False, 'error': str(e)}
+    out['took_ms'] = round((time.perf_counter() - t0) * 1000, 3)
+    return out
 
-    app.run(host='127.0.0.1', port=5000, debug=True)
 
+@app.route('/api/analysis/batch', methods=['POST'])
+def api_analysis_batch():
+    """Run a list of /api/analysis specs in one request.
+
+    Body: {"items": [{"tipo": "dijkstra", "startNode": ..., "targetNode": ...}, ...]}
+    (a bare list is accepted too). Identifiers are resolved once for the
+    whole batch and items run on a bounded thread pool; results come back in
+    input order, each with its own success/error and timing.
+    """
+    data = request.get_json(silent=True)
+    items = data if isinstance(data, list) else (data or {}).get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'error': 'items (lista de análisis) es requerido'}), 400
+    if len(items) > ANALYSIS_BATCH_MAX:
+        return jsonify({'success': False, 'error': f'máximo {ANALYSIS_BATCH_MAX} análisis por lote'}), 400
+
+    t0 = time.perf_counter()
+    full = load_graph()
+    identifiers = [spec.get(k) for spec in items if isinstance(spec, dict)
+                   for k in ('startNode', 'targetNode') if spec.get(k)]
+    resolved = resolve_identifiers(full, identifiers)
+    resolve_ms = (time.perf_counter() - t0) * 1000
+    pool = get_analysis_pool()
+    futures = [pool.submit(_run_batch_item, i, spec, resolved) for i, spec in enumerate(items)]
+    results = [f.result() for f in futures]
+    return jsonify({
+        'success': True,
+        'count': len(results),
+        'errors': sum(1 for r in results if not r['success']),
+        'results': results,
+        'resolve_ms': round(resolve_ms, 3),
+        'took_ms': round((time.perf_counter() - t0) * 1000, 3),
+    })
+
+
+_IMPORT_SECONDS = time.time() - _IMPORT_STARTED
+
+
+if __name__ == '__main__':
+    # Precarga (grafo, índices, dataset y grafo general HTML) en segundo plano:
+    # el servidor acepta conexiones de inmediato. Con el reloader de debug solo
+    # en el proceso que sirve (WERKZEUG_RUN_MAIN), no en el que vigila archivos.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warmup()
+        print('Precarga en segundo plano; progreso en /api/ready')
+
+    app.run(host='127.0.0.1', port=5000, debug=True)
@@ -0,0 +1,83 @@
+"""Compare the vectorized CSV ingest against the original df.iterrows() loop.
+
+Usage: python bench/compare_ingest.py [csv_path] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import networkx as nx
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from codigo.complex_grafo import (  # noqa: E402
+    COLOR_DISTRITO, COLOR_ESPECIE, GrafoPlantaciones, Planta,
+    build_visual_and_logical_graphs, normalize_string,
+)
+
+DEFAULT_CSV = Path(__file__).resolve().parent.parent / 'datos' / 'plantaciones-2021-1.csv'
+
+
+def build_iterrows(csv_path):
+    # reference implementation: the row-by-row loop this repo used before
+    df = pd.read_csv(csv_path, sep=';', encoding='utf-8-sig')
+    G_viz = nx.Graph()
+    G_logico = GrafoPlantaciones()
+    df = df.copy()
+    df['ID_PLANTA'] = range(1, len(df) + 1)
+    for _, fila in df.iterrows():
+        distrito = normalize_string(fila['DISTRITO'])
+        especie = normalize_string(fila['ESPECIE'])
+        titular = normalize_string(fila['TITULAR'])
+        planta = Planta(id=fila['ID_PLANTA'], especie=especie, titular=titular, distrito=distrito, superficie=fila['SUPERFICIE_PLANTACION'])
+        G_logico.agregar_planta(planta)
+        if distrito not in G_viz:
+            G_viz.add_node(distrito, tipo='Ubicación', color={'background': COLOR_DISTRITO, 'border': '#0066aa'}, title=f'Distrito: {distrito}', group=1)
+        if especie not in G_viz:
+            G_viz.add_node(especie, tipo='Especie', color={'background': COLOR_ESPECIE, 'border': '#114411'}, title=f'Especie: {especie}', group=2)
+        G_viz.add_edge(distrito, especie, relacion='contiene')
+    return G_viz, G_logico
+
+
+def _plantas(G_logico):
+    return [(p.id, p.especie, p.titular, p.distrito, p.superficie) for p in G_logico.objetos.values()]
+
+
+def assert_identical(a, b):
+    (va, la), (vb, lb) = a, b
+    assert list(va.nodes(data=True)) == list(vb.nodes(data=True)), 'nodos distintos'
+    assert list(va.edges(data=True)) == list(vb.edges(data=True)), 'aristas distintas'
+    pa, pb = _plantas(la), _plantas(lb)
+    assert len(pa) == len(pb), 'numero de plantas distinto'
+    for x, y in zip(pa, pb):
+        assert x[:4] == y[:4] and (x[4] == y[4] or (x[4] != x[4] and y[4] != y[4])), f'planta distinta: {x} != {y}'
+
+
+def timed(fn, csv_path, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(csv_path)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('csv', nargs='?', default=str(DEFAULT_CSV))
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args()
+
+    t_loop, ref = timed(build_iterrows, args.csv, args.repeat)
+    t_vec, new = timed(build_visual_and_logical_graphs, args.csv, args.repeat)
+    assert_identical(ref, new)
+    print(f'filas: {len(_plantas(new[1]))}  nodos: {new[0].number_of_nodes()}  aristas: {new[0].number_of_edges()}')
+    print(f'iterrows:    {t_loop * 1000:9.1f} ms')
+    print(f'vectorizado: {t_vec * 1000:9.1f} ms  ({t_loop / t_vec:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
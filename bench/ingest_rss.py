@@ -0,0 +1,73 @@
+"""Peak RSS of a dataset build: whole-file read vs streamed chunks.
+
+Writes the CSV replicated --factor times (fresh ID_PLANTACION per copy) and
+builds it in a child process per mode, so each peak is measured alone.
+
+Usage: python bench/ingest_rss.py [csv_path] [--factor N] [--chunk-rows N]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+DEFAULT_CSV = Path(__file__).resolve().parent.parent / 'datos' / 'plantaciones-2021-1.csv'
+
+
+def replicate(src, dst, factor):
+    with open(src, 'r', encoding='utf-8-sig') as f:
+        header = f.readline()
+        filas = [line.rstrip('\n') for line in f if line.strip()]
+    with open(dst, 'w', encoding='utf-8') as out:
+        out.write(header)
+        for k in range(factor):
+            for line in filas:
+                id_, resto = line.split(';', 1)
+                out.write(f'{id_}-{k};{resto}\n')
+    return factor * len(filas)
+
+
+def child(mode, csv_path):
+    import pandas as pd  # noqa: F401  (imported before the baseline)
+    import networkx  # noqa: F401
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    if mode == 'entero':
+        from codigo.aggregates import AggregateCube
+        from codigo.complex_grafo import build_graphs_from_frame, read_plantaciones
+        df = read_plantaciones(Path(csv_path))
+        build_graphs_from_frame(df)
+        AggregateCube.from_frame(df)
+    else:
+        from codigo.dataset_store import DatasetStore
+        DatasetStore().get(csv_path)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f'{mode:8s} {time.perf_counter() - t0:7.2f} s  pico +{(peak - base) / 1024:7.1f} MiB')
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('csv', nargs='?', default=str(DEFAULT_CSV))
+    ap.add_argument('--factor', type=int, default=200)
+    ap.add_argument('--chunk-rows', type=int, default=50000)
+    ap.add_argument('--child', choices=['entero', 'stream'])
+    args = ap.parse_args()
+    if args.child:
+        child(args.child, args.csv)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        dst = os.path.join(tmp, 'plantaciones.csv')
+        n = replicate(args.csv, dst, args.factor)
+        print(f'{n} filas, {os.path.getsize(dst) / 2**20:.1f} MiB')
+        env = dict(os.environ, INGEST_CHUNK_ROWS=str(args.chunk_rows))
+        for mode in ('entero', 'stream'):
+            subprocess.run([sys.executable, __file__, dst, '--child', mode], env=env, check=True)
+
+
+if __name__ == '__main__':
+    main()
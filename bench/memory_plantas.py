@@ -0,0 +1,71 @@
+"""Bytes per plantation record: object-per-row model vs columnar GrafoPlantaciones.
+
+Usage: python bench/memory_plantas.py [csv_path] [--factor N]
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from codigo.complex_grafo import build_graphs_from_frame, normalize_string, read_plantaciones  # noqa: E402
+
+DEFAULT_CSV = Path(__file__).resolve().parent.parent / 'datos' / 'plantaciones-2021-1.csv'
+
+
+class PlantaDict:
+    # the previous Planta: one __dict__ and one string copy per field per row
+    def __init__(self, id, especie, titular, distrito, superficie):
+        self.id = id
+        self.especie = normalize_string(especie)
+        self.titular = normalize_string(titular)
+        self.distrito = normalize_string(distrito)
+        self.superficie = superficie
+
+
+def build_objetos(df):
+    objetos = {}
+    for i, (d, e, t, s) in enumerate(zip(df['DISTRITO'], df['ESPECIE'], df['TITULAR'], df['SUPERFICIE_PLANTACION']), 1):
+        objetos[i] = PlantaDict(i, normalize_string(e), normalize_string(t), normalize_string(d), s)
+    return objetos
+
+
+def build_columnar(df):
+    return build_graphs_from_frame(df)[1]
+
+
+def measure(fn, df):
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    out = fn(df)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return retained, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('csv', nargs='?', default=str(DEFAULT_CSV))
+    ap.add_argument('--factor', type=int, default=10, help='replicate the rows N times')
+    args = ap.parse_args()
+
+    df = read_plantaciones(args.csv)
+    df = pd.concat([df] * args.factor, ignore_index=True)
+    n = len(df)
+    antes, _ = measure(build_objetos, df)
+    despues, G_logico = measure(build_columnar, df)
+    print(f'registros: {n}')
+    print(f'objetos Planta: {antes / n:8.1f} B/registro  ({antes / 2**20:.1f} MiB)')
+    print(f'columnar:       {despues / n:8.1f} B/registro  ({despues / 2**20:.1f} MiB, incluye G_viz)')
+    print(f'columnar (memoria_bytes): {G_logico.memoria_bytes() / n:.1f} B/registro')
+
+
+if __name__ == '__main__':
+    main()
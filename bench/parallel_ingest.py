@@ -0,0 +1,64 @@
+"""Wall clock of a multi-file dataset build against the number of workers.
+
+Writes --files copies of the CSV (each replicated --factor times, fresh
+ID_PLANTACION per copy) and times construir_parciales + fusionar_parciales
+for each worker count, reporting speedup and efficiency against 1 worker.
+
+Usage: python bench/parallel_ingest.py [csv_path] [--files N] [--factor N] [--workers 1,2,4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from codigo.dataset_store import construir_parciales, fusionar_parciales  # noqa: E402
+from codigo.ingest import expand_sources  # noqa: E402
+
+DEFAULT_CSV = Path(__file__).resolve().parent.parent / 'datos' / 'plantaciones-2021-1.csv'
+
+
+def write_files(src, out_dir, files, factor):
+    with open(src, 'r', encoding='utf-8-sig') as f:
+        header = f.readline()
+        filas = [line.rstrip('\n').split(';', 1) for line in f if line.strip()]
+    for i in range(files):
+        with open(os.path.join(out_dir, f'plantaciones-{i:02d}.csv'), 'w', encoding='utf-8') as out:
+            out.write(header)
+            for k in range(factor):
+                for id_, resto in filas:
+                    out.write(f'{id_}-{i}-{k};{resto}\n')
+    return files * factor * len(filas)
+
+
+def main():
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    ap = argparse.ArgumentParser()
+    ap.add_argument('csv', nargs='?', default=str(DEFAULT_CSV))
+    ap.add_argument('--files', type=int, default=8)
+    ap.add_argument('--factor', type=int, default=20)
+    ap.add_argument('--workers', default=','.join(str(w) for w in sorted({1, 2, 4, cpus}) if w <= max(cpus, 2)))
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        n = write_files(args.csv, tmp, args.files, args.factor)
+        paths = expand_sources(tmp)
+        size = sum(os.path.getsize(p) for p in paths)
+        print(f'{len(paths)} archivos, {n} filas, {size / 2**20:.1f} MiB, {cpus} CPU')
+        base = None
+        for w in (int(x) for x in args.workers.split(',')):
+            t0 = time.perf_counter()
+            parciales = construir_parciales(paths, workers=w)
+            t1 = time.perf_counter()
+            fusionar_parciales(parciales)
+            t2 = time.perf_counter()
+            total = t2 - t0
+            base = base or total
+            print(f'workers={w:2d}  total {total:7.2f} s  (parciales {t1 - t0:6.2f} s, fusión {t2 - t1:5.2f} s)'
+                  f'  speedup {base / total:4.2f}x  eficiencia {base / total / w:4.0%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Graph load and traversal cost: pickle vs CSR snapshot (lazy and materialized).
+
+Each mode runs in a fresh interpreter over the same graph:
+  pickle        pickle.load of the .pkl
+  lazy          open_snapshot(): rows decoded on first touch
+  materialized  open_snapshot(materialize=True), what app.py does by default
+
+and reports the open time, then the median of --reps runs of a BFS tree from
+the highest-degree node, connected components and a single-source Dijkstra
+(first run reported apart: it is the one that decodes lazy rows), plus the
+resident memory added by opening the graph and traversing it.
+
+Usage: python bench/snapshot.py [--scales real,10] [--reps 5] [--modes pickle,lazy,materialized]
+"""
+import argparse
+import json
+import os
+import pickle
+import statistics
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('pickle', 'lazy', 'materialized')
+
+
+def _rss_mib():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def _ms(fn):
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+def child(mode, pkl, snapshot, reps):
+    import networkx as nx
+    from codigo.graph_snapshot import open_snapshot
+    base = _rss_mib()
+    t0 = time.perf_counter()
+    if mode == 'pickle':
+        with open(pkl, 'rb') as f:
+            g = pickle.load(f)
+    else:
+        g = open_snapshot(snapshot, materialize=mode == 'materialized')
+    out = {'open_ms': (time.perf_counter() - t0) * 1000}
+    origen = max(g.degree, key=lambda nd: nd[1])[0]
+    pruebas = {
+        'bfs_tree': lambda: nx.bfs_tree(g, origen),
+        'components': lambda: list(nx.connected_components(g)),
+        'dijkstra': lambda: nx.single_source_dijkstra_path_length(g, origen),
+    }
+    for nombre, fn in pruebas.items():
+        out[f'{nombre}_first_ms'] = _ms(fn)
+        out[f'{nombre}_ms'] = statistics.median(_ms(fn) for _ in range(reps))
+    out['rss_mib'] = _rss_mib() - base
+    print(json.dumps(out))
+
+
+def _rutas(escala):
+    if escala == 'real':
+        datos = os.path.join(BASE_DIR, 'datos')
+        return os.path.join(datos, 'grafo_plantaciones.pkl'), os.path.join(datos, 'grafo_plantaciones.csrg')
+    sys.path.insert(0, os.path.join(BASE_DIR, 'bench'))
+    from synth_data import write_dataset
+    paths = write_dataset(float(escala))
+    return paths['pkl'], paths['snapshot']
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--scales', default='real,10')
+    ap.add_argument('--reps', type=int, default=5)
+    ap.add_argument('--modes', default=','.join(MODES))
+    ap.add_argument('--child', nargs=3, metavar=('MODE', 'PKL', 'SNAPSHOT'))
+    args = ap.parse_args()
+    sys.path.insert(0, BASE_DIR)
+    if args.child:
+        child(*args.child, args.reps)
+        return
+    from codigo.graph_snapshot import convert, is_current
+    for escala in args.scales.split(','):
+        pkl, snapshot = _rutas(escala)
+        if not is_current(snapshot, pkl):
+            convert(pkl, snapshot)
+        print(f'== {escala}')
+        for mode in args.modes.split(','):
+            r = subprocess.run([sys.executable, __file__, '--reps', str(args.reps), '--child', mode, pkl, snapshot],
+                               cwd=BASE_DIR, capture_output=True, text=True, check=True)
+            res = json.loads(r.stdout.strip().splitlines()[-1])
+            print(f'  {mode:12s} open {res["open_ms"]:8.1f} ms'
+                  + ''.join(f'  {k} {res[k + "_ms"]:7.1f} ms (1a {res[k + "_first_ms"]:7.1f})'
+                            for k in ('bfs_tree', 'components', 'dijkstra'))
+                  + f'  rss +{res["rss_mib"]:6.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
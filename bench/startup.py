@@ -0,0 +1,69 @@
+"""Cold start: app import time, heavy modules loaded and time to first response.
+
+Each trial runs in a fresh interpreter:
+  import      `import app` alone
+  preload     import + warm_caches(), what gunicorn's master does before
+              forking: nothing is served until it returns
+  background  import + start_warmup(): first /api/stats response and the
+              moment /api/ready turns 200 (plus when the warmup finishes)
+
+Usage: python bench/startup.py [--trials 3] [--modes import,preload,background]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PESADOS = ('networkx', 'numpy', 'pandas', 'pyvis', 'scipy')
+
+
+def child(mode):
+    t0 = time.perf_counter()
+    import app as app_mod
+    out = {'import_s': time.perf_counter() - t0,
+           'modules': [m for m in PESADOS if m in sys.modules]}
+    client = app_mod.app.test_client()
+    if mode == 'preload':
+        app_mod.warm_caches()
+        client.get('/api/stats')
+        out['first_response_s'] = out['ready_s'] = time.perf_counter() - t0
+    elif mode == 'background':
+        hilo = app_mod.start_warmup(html=False)
+        client.get('/api/stats')
+        out['first_response_s'] = time.perf_counter() - t0
+        while client.get('/api/ready').status_code != 200:
+            time.sleep(0.02)
+        out['ready_s'] = time.perf_counter() - t0
+        hilo.join()
+        out['warm_s'] = time.perf_counter() - t0
+    print(json.dumps(out))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--trials', type=int, default=3)
+    ap.add_argument('--modes', default='import,preload,background')
+    ap.add_argument('--child')
+    args = ap.parse_args()
+    if args.child:
+        sys.path.insert(0, BASE_DIR)
+        child(args.child)
+        return
+    env = dict(os.environ, METRICS_DIR='')
+    for mode in args.modes.split(','):
+        runs = []
+        for _ in range(args.trials):
+            r = subprocess.run([sys.executable, __file__, '--child', mode], cwd=BASE_DIR, env=env,
+                               capture_output=True, text=True, check=True)
+            runs.append(json.loads(r.stdout.strip().splitlines()[-1]))
+        campos = [k for k in ('import_s', 'first_response_s', 'ready_s', 'warm_s') if k in runs[0]]
+        print(f'{mode:10s} ' + '  '.join(f'{k} {statistics.median(r[k] for r in runs):6.2f}' for k in campos)
+              + f'  módulos tras import: {",".join(runs[0]["modules"]) or "-"}')
+
+
+if __name__ == '__main__':
+    main()
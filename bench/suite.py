@@ -0,0 +1,271 @@
+"""Endpoint and ingest benchmarks over synthetic datasets, with a JSON baseline.
+
+  python bench/suite.py run [--scales 1,10,100] [--requests 50] [--out FILE] [--compare BASELINE]
+  python bench/suite.py compare BASELINE CURRENT [--threshold 0.2] [--min-ms 1]
+
+`run` generates (or reuses) one dataset per scale with bench/synth_data.py,
+points the app at it and drives each endpoint through Flask's test client;
+ingest functions are called directly. Each benchmark records latency
+percentiles over warm calls, the first (cold) call, throughput and the peak
+Python allocation of one extra call under tracemalloc. Memoized responses and
+paths are dropped before every endpoint call (untimed), so repeated payloads
+measure the work rather than a cache hit. `compare` flags
+benchmarks whose p50/p90 or peak memory grew past the threshold and exits
+with status 1 when there is any regression.
+
+Endpoints over the whole graph (/api/graph builds the layout and payload
+on its first call) only run up to their `max_factor` unless --all is given;
+1000x needs a few GB of memory for the pickled graph alone.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import synth_data  # noqa: E402
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _percentil(ms, q):
+    return round(float(np.percentile(ms, q)), 3)
+
+
+def medir(fn, payloads, n, memoria=True, antes=None):
+    """Run fn(payload) n times cycling over payloads; fn returns True on success.
+
+    `antes()`, if given, runs before every call outside the timing.
+    """
+    antes = antes or (lambda: None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        antes()
+        t0 = time.perf_counter()
+        ok = fn(payloads[0])
+        cold_ms = (time.perf_counter() - t0) * 1000
+        ms, errores, total = [], 0 if ok else 1, 0.0
+        for i in range(n):
+            antes()
+            t0 = time.perf_counter()
+            ok = fn(payloads[(i + 1) % len(payloads)])
+            ms.append((time.perf_counter() - t0) * 1000)
+            total += ms[-1] / 1000
+            errores += 0 if ok else 1
+        pico = None
+        if memoria:
+            antes()
+            tracemalloc.start()
+            fn(payloads[0])
+            pico = round(tracemalloc.get_traced_memory()[1] / 2**20, 3)
+            tracemalloc.stop()
+    return {
+        'n': n,
+        'errors': errores,
+        'cold_ms': round(cold_ms, 3),
+        'mean_ms': round(float(np.mean(ms)), 3),
+        'p50_ms': _percentil(ms, 50),
+        'p90_ms': _percentil(ms, 90),
+        'p99_ms': _percentil(ms, 99),
+        'max_ms': round(float(np.max(ms)), 3),
+        'rps': round(n / total, 2) if total else None,
+        'peak_alloc_mib': pico,
+    }
+
+
+def apuntar_app(app_mod, paths):
+    """Point the app's data files at one synthetic dataset and drop caches."""
+    from codigo.dataset_store import DATASET_STORE
+    app_mod.PKL_FILE = paths['pkl']
+    app_mod.SNAPSHOT_FILE = paths['snapshot']
+    app_mod.STATS_FILE = paths['stats']
+    app_mod.PLANTACIONES_SOURCES = paths['csv']
+    app_mod._STATS_CACHE = None
+    app_mod.invalidate_graph_cache()
+    DATASET_STORE.invalidate()
+
+
+def limpiar_respuestas(app_mod):
+    """Drop the response cache and the cached shortest paths (indexes stay)."""
+    app_mod.get_response_cache().clear()
+    paths = app_mod._DERIVED.get('paths')
+    if paths is not None:
+        paths[1].clear()
+
+
+def _payloads(paths, rng, k=64):
+    import pandas as pd
+    df = pd.read_csv(paths['csv'], sep=';', encoding='utf-8-sig', dtype=str,
+                     usecols=['ID_PLANTACION', 'ESPECIE', 'DEPARTAMENTO'])
+    ids = df['ID_PLANTACION'].unique()
+    # species weighted by rows, like user searches for common species
+    especies = df['ESPECIE'].to_numpy()
+    plantas = rng.choice(ids, size=2 * k)
+    return {
+        'plantas': plantas[:k].tolist(),
+        'pares': list(zip(plantas[:k].tolist(), plantas[k:].tolist())),
+        'especies': rng.choice(especies, size=k).tolist(),
+        'departamentos': rng.choice(df['DEPARTAMENTO'].unique(), size=k).tolist(),
+        'consultas': [e.split()[0][:4] for e in rng.choice(especies, size=k)],
+    }
+
+
+def benchmarks(client, paths, p):
+    """name -> (fn, payloads, max_factor, repeticiones por defecto)."""
+    from codigo.complex_grafo import build_visual_and_logical_graphs
+    from codigo.dataset_store import DatasetStore
+
+    def post(url):
+        return lambda body: client.post(url, json=body).status_code == 200
+
+    def analysis(body):
+        r = client.post('/api/analysis', json=body)
+        return r.status_code == 200 and r.get_json().get('success', True) is not False
+
+    return {
+        'ingest.build_visual_and_logical_graphs': (
+            lambda _: build_visual_and_logical_graphs(paths['csv']) is not None, [None], None, 3),
+        'ingest.dataset_store': (lambda _: DatasetStore().get(paths['csv']) is not None, [None], None, 3),
+        'api.graph': (lambda _: client.get('/api/graph').status_code == 200, [None], 10, None),
+        'api.analysis.bfs': (analysis, [{'tipo': 'bfs', 'startNode': s, 'limit': 100} for s in p['plantas']], None, None),
+        'api.analysis.dijkstra': (analysis, [{'tipo': 'dijkstra', 'startNode': a, 'targetNode': b}
+                                             for a, b in p['pares']], None, None),
+        'api.analysis.components': (analysis, [{'tipo': 'components'}], None, None),
+        'api.analysis.bfs_filtrado': (analysis, [{'tipo': 'bfs', 'startNode': e, 'especie': e, 'limit': 100}
+                                                 for e in p['especies']], None, None),
+        'api.bfs_execute': (post('/api/bfs_execute'), [{'species': e} for e in p['especies']], None, None),
+        'api.species_search': (post('/api/species_search'), [{'query': q} for q in p['consultas']], None, None),
+    }
+
+
+def _git_rev():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    import app as app_mod
+    client = app_mod.app.test_client()
+    rng = np.random.default_rng(args.seed)
+    solo = set(args.only.split(',')) if args.only else None
+    out = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_rev': _git_rev(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'requests': args.requests,
+            'seed': args.seed,
+        },
+        'results': {},
+    }
+    for factor in (float(s) for s in args.scales.split(',')):
+        t0 = time.perf_counter()
+        paths = synth_data.write_dataset(factor, args.seed, args.data_dir)
+        with open(paths['stats'], encoding='utf-8') as f:
+            stats = json.load(f)
+        escala = f'{factor:g}x'
+        print(f'== {escala}: {stats["num_plantaciones"]} plantaciones, {stats["num_nodos"]} nodos, '
+              f'{stats["num_aristas"]} aristas (datos en {time.perf_counter() - t0:.1f} s)', flush=True)
+        apuntar_app(app_mod, paths)
+        res = {'dataset': stats, 'benchmarks': {}}
+        for nombre, (fn, payloads, max_factor, reps) in benchmarks(client, paths, _payloads(paths, rng)).items():
+            if solo and not any(nombre.startswith(s) for s in solo):
+                continue
+            if max_factor is not None and factor > max_factor and not args.all:
+                res['benchmarks'][nombre] = {'skipped': f'factor > {max_factor} (use --all)'}
+                continue
+            r = medir(fn, payloads, reps or args.requests, memoria=not args.no_memory,
+                      antes=(lambda: limpiar_respuestas(app_mod)) if nombre.startswith('api.') else None)
+            res['benchmarks'][nombre] = r
+            print(f'  {nombre:40s} p50 {r["p50_ms"]:9.2f} ms  p90 {r["p90_ms"]:9.2f} ms  '
+                  f'cold {r["cold_ms"]:9.1f} ms  {r["rps"]:8.1f}/s  mem {r["peak_alloc_mib"]} MiB'
+                  + (f'  ERRORES {r["errors"]}' if r['errors'] else ''), flush=True)
+        out['results'][escala] = res
+    out['meta']['max_rss_mib'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(out, f, indent=2)
+            f.write('\n')
+        print(f'resultados en {args.out}')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            return 1 if comparar(json.load(f), out, args.threshold, args.min_ms) else 0
+    return 0
+
+
+def comparar(base, actual, threshold=0.2, min_ms=1.0):
+    """Print a comparison table; returns the list of regressions."""
+    regresiones = []
+    for escala, res in actual['results'].items():
+        previo = base.get('results', {}).get(escala)
+        if previo is None:
+            continue
+        for nombre, r in res['benchmarks'].items():
+            b = previo['benchmarks'].get(nombre)
+            if not b or 'skipped' in r or 'skipped' in b:
+                continue
+            for campo, minimo in (('p50_ms', min_ms), ('p90_ms', min_ms), ('peak_alloc_mib', 0.5)):
+                antes, ahora = b.get(campo), r.get(campo)
+                if antes is None or ahora is None:
+                    continue
+                ratio = ahora / antes if antes else float('inf')
+                malo = ratio > 1 + threshold and ahora - antes > minimo
+                marca = 'REGRESION' if malo else ('mejora' if ratio < 1 - threshold else '')
+                print(f'{escala:6s} {nombre:40s} {campo:15s} {antes:10.3f} -> {ahora:10.3f}  {ratio:5.2f}x  {marca}')
+                if malo:
+                    regresiones.append((escala, nombre, campo, antes, ahora))
+            if r.get('errors', 0) > b.get('errors', 0):
+                print(f'{escala:6s} {nombre:40s} errores {b.get("errors", 0)} -> {r["errors"]}  REGRESION')
+                regresiones.append((escala, nombre, 'errors', b.get('errors', 0), r['errors']))
+    print(f'{len(regresiones)} regresiones (umbral {threshold:.0%}, mínimo {min_ms} ms)')
+    return regresiones
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    r = sub.add_parser('run')
+    r.add_argument('--scales', default='1,10,100')
+    r.add_argument('--requests', type=int, default=50)
+    r.add_argument('--seed', type=int, default=0)
+    r.add_argument('--data-dir', default=synth_data.DEFAULT_DIR)
+    r.add_argument('--only', help='comma list of benchmark name prefixes')
+    r.add_argument('--all', action='store_true', help='also run whole-graph endpoints above their max_factor')
+    r.add_argument('--no-memory', action='store_true')
+    r.add_argument('--out')
+    r.add_argument('--compare', metavar='BASELINE')
+    r.add_argument('--threshold', type=float, default=0.2)
+    r.add_argument('--min-ms', type=float, default=1.0)
+    c = sub.add_parser('compare')
+    c.add_argument('baseline')
+    c.add_argument('current')
+    c.add_argument('--threshold', type=float, default=0.2)
+    c.add_argument('--min-ms', type=float, default=1.0)
+    args = ap.parse_args()
+    if args.cmd == 'run':
+        sys.exit(run(args))
+    with open(args.baseline, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        actual = json.load(f)
+    sys.exit(1 if comparar(base, actual, args.threshold, args.min_ms) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""Synthetic plantaciones datasets, scaled from the real export.
+
+The real CSV is the model: plantation-level tuples (ubicación + ARFFS,
+finalidad/tipo/régimen), species frequencies, species per plantation,
+plantations per holder and superficie are sampled from it. The species and
+district vocabularies grow with the square root of the scale (long tail of
+rare names), holders grow linearly. Output has the real column schema and
+the same graph schema as datos/grafo_plantaciones.pkl.
+
+Usage: python bench/synth_data.py --factor 10 [--seed 0] [--out DIR]
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import tempfile
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+DEFAULT_CSV = Path(__file__).resolve().parent.parent / 'datos' / 'plantaciones-2021-1.csv'
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), 'mi-flask-app-bench')
+# Peru has 1874 districts; synthetic ones stop there
+MAX_DISTRITOS = 1874
+
+UBICACION = ['DEPARTAMENTO', 'PROVINCIA', 'DISTRITO', 'ARFFS', 'UBIGEO']
+REGISTRO = ['FINALIDAD', 'TIPO_PLANTACION', 'REGIMEN_TENENCIA']
+PERSONA = ['TIPO_PERSONA', 'TIPO_DOCUMENTO']
+
+
+def _empirica(serie: pd.Series):
+    cuentas = serie.value_counts(sort=False)
+    return cuentas.index.to_numpy(), (cuentas / cuentas.sum()).to_numpy()
+
+
+def _sortear(rng, valores, pesos, n):
+    return valores[rng.choice(len(valores), size=n, p=pesos)]
+
+
+def _vocabulario(rng, reales, pesos, extra, nombre):
+    """Real values plus `extra` synthetic rare ones, weights renormalized."""
+    if extra <= 0:
+        return reales, pesos
+    nuevos = np.array([f'{nombre} {i:05d}' for i in range(extra)], dtype=object)
+    # each synthetic value about as rare as the rarest real ones
+    w_nuevos = pesos.min() * rng.uniform(0.2, 1.0, size=extra)
+    todos = np.concatenate([pesos, w_nuevos])
+    return np.concatenate([reales.astype(object), nuevos]), todos / todos.sum()
+
+
+def generate(factor: float, seed: int = 0, src=DEFAULT_CSV) -> pd.DataFrame:
+    """Rows of a synthetic export about `factor` times the size of `src`."""
+    rng = np.random.default_rng(seed)
+    real = pd.read_csv(src, sep=';', encoding='utf-8-sig', dtype=str)
+    columnas = list(real.columns)
+    plantas = real.drop_duplicates('ID_PLANTACION')
+    n_plantas = max(1, int(round(len(plantas) * factor)))
+    escala = np.sqrt(factor)
+
+    # locations: real (departamento, provincia, distrito, ARFFS, ubigeo) tuples,
+    # plus synthetic districts inside real provincias
+    ubic = plantas[UBICACION].astype(str).agg('|'.join, axis=1)
+    ubic_vals, ubic_w = _empirica(ubic)
+    extra = min(MAX_DISTRITOS, int(len(ubic_vals) * escala)) - len(ubic_vals)
+    ubic_vals, ubic_w = _vocabulario(rng, ubic_vals, ubic_w, extra, 'SINTETICO')
+    for i in range(len(ubic_vals)):
+        if ubic_vals[i].startswith('SINTETICO '):
+            base = ubic_vals[rng.integers(len(ubic_w) - extra)].split('|')
+            ubic_vals[i] = '|'.join([base[0], base[1], f'DISTRITO {ubic_vals[i]}', base[3], str(900000 + i)])
+    por_planta = pd.DataFrame([v.split('|') for v in _sortear(rng, ubic_vals, ubic_w, n_plantas)],
+                              columns=UBICACION)
+
+    reg_vals, reg_w = _empirica(plantas[REGISTRO].astype(str).agg('|'.join, axis=1))
+    por_planta[REGISTRO] = [v.split('|') for v in _sortear(rng, reg_vals, reg_w, n_plantas)]
+
+    # holders: plantations per holder follows the real distribution
+    por_titular_vals, por_titular_w = _empirica(real.groupby('TITULAR')['ID_PLANTACION'].nunique())
+    cuantas = []
+    while sum(cuantas) < n_plantas:
+        cuantas.extend(_sortear(rng, por_titular_vals, por_titular_w, 1024).tolist())
+    cuantas = np.array(cuantas)
+    cuantas = cuantas[:np.searchsorted(np.cumsum(cuantas), n_plantas) + 1]
+    n_titulares = len(cuantas)
+    partes = real['TITULAR'].str.replace('\xa0', ' ').str.strip().str.split(',', n=1)
+    apellidos = np.unique(np.concatenate([p[0].split() for p in partes if len(p) == 2]))
+    nombres = np.unique(np.concatenate([p[1].split() for p in partes if len(p) == 2]))
+    titulares = np.char.add(np.char.add(np.char.add(np.char.add(
+        rng.choice(apellidos, n_titulares).astype(str), ' '), rng.choice(apellidos, n_titulares).astype(str)),
+        ', '), rng.choice(nombres, n_titulares).astype(str))
+    persona_vals, persona_w = _empirica(real.drop_duplicates('TITULAR')[PERSONA].astype(str).agg('|'.join, axis=1))
+    persona = np.array([v.split('|') for v in _sortear(rng, persona_vals, persona_w, n_titulares)])
+    documentos = rng.integers(10_000_000, 99_999_999, size=n_titulares)
+    dueno = np.repeat(np.arange(n_titulares), cuantas)[:n_plantas]
+    rng.shuffle(dueno)
+    por_planta['TITULAR'] = np.char.add(titulares[dueno], '\xa0')
+    por_planta['TIPO_PERSONA'] = persona[dueno, 0]
+    por_planta['TIPO_DOCUMENTO'] = persona[dueno, 1]
+    por_planta['NUMERO_DOCUMENTO'] = documentos[dueno].astype(str)
+
+    ids = np.arange(100_000, 100_000 + n_plantas)
+    por_planta['ID_PLANTACION'] = ids.astype(str)
+    por_planta['PERIODO'] = real['PERIODO'].iloc[0]
+    por_planta['FECHA_CORTE'] = real['FECHA_CORTE'].iloc[0]
+    por_planta['NUMERO_CERTIFICADO'] = [f'{i % 25 + 1:02d}-SYN/REG-PLT-2021-{i:06d}' for i in range(n_plantas)]
+    sup = pd.to_numeric(plantas['SUPERFICIE_PLANTACION'], errors='coerce').dropna().to_numpy()
+    por_planta['SUPERFICIE_PLANTACION'] = np.round(
+        rng.choice(sup, n_plantas) * rng.lognormal(0.0, 0.2, n_plantas), 2).astype(str)
+
+    # species rows: count per plantation and species frequencies from the real rows
+    k_vals, k_w = _empirica(real.groupby('ID_PLANTACION').size())
+    k = _sortear(rng, k_vals, k_w, n_plantas).astype(np.int64)
+    esp_vals, esp_w = _empirica(real['ESPECIE'])
+    extra = int(len(esp_vals) * escala) - len(esp_vals)
+    esp_vals, esp_w = _vocabulario(rng, esp_vals, esp_w, extra, 'Especie sintetica')
+    filas = por_planta.loc[por_planta.index.repeat(k)].reset_index(drop=True)
+    filas['ESPECIE'] = _sortear(rng, esp_vals, esp_w, len(filas))
+    filas = filas.drop_duplicates(['ID_PLANTACION', 'ESPECIE'])
+    return filas[columnas].reset_index(drop=True)
+
+
+def graph_from_frame(df: pd.DataFrame) -> nx.Graph:
+    """Graph with the schema of datos/grafo_plantaciones.pkl."""
+    g = nx.Graph()
+    sup = pd.to_numeric(df['SUPERFICIE_PLANTACION'], errors='coerce').to_numpy()
+    titular = df['TITULAR'].str.strip().to_numpy()
+    ubic = (df['DISTRITO'] + ', ' + df['PROVINCIA'] + ', ' + df['DEPARTAMENTO']).to_numpy()
+    cols = [df[c].to_numpy() for c in ('ID_PLANTACION', 'ESPECIE', 'ARFFS', 'DISTRITO', 'PROVINCIA', 'DEPARTAMENTO',
+                                        'TIPO_PERSONA', 'TIPO_DOCUMENTO', 'NUMERO_DOCUMENTO',
+                                        'TIPO_PLANTACION', 'FINALIDAD')]
+    for i, (pid, esp, arffs, dist, prov, dep, tper, tdoc, ndoc, tplan, fin) in enumerate(zip(*cols)):
+        if pid not in g:
+            g.add_node(pid, tipo='Plantación', superficie=float(sup[i]))
+            if titular[i] not in g:
+                g.add_node(titular[i], tipo='Titular', tipo_persona=tper, tipo_doc=tdoc, num_doc=ndoc)
+            g.add_edge(pid, titular[i], relacion='registrada por', peso=1)
+        if esp not in g:
+            g.add_node(esp, tipo='Especie')
+        g.add_edge(pid, esp, relacion='contiene', tipo_plantacion=tplan, finalidad=fin, peso=float(sup[i]))
+        if ubic[i] not in g:
+            g.add_node(ubic[i], tipo='Ubicación', distrito=dist, provincia=prov, departamento=dep)
+        g.add_edge(pid, ubic[i], relacion='ubicada en', peso=1)
+        if arffs not in g:
+            g.add_node(arffs, tipo='ARFFS')
+        g.add_edge(pid, arffs, relacion='supervisada por', peso=1)
+    return g
+
+
+def graph_stats(g: nx.Graph) -> dict:
+    tipos = pd.Series([a.get('tipo') for _, a in g.nodes(data=True)]).value_counts()
+    return {
+        'num_nodos': g.number_of_nodes(),
+        'num_aristas': g.number_of_edges(),
+        'num_plantaciones': int(tipos.get('Plantación', 0)),
+        'num_titulares': int(tipos.get('Titular', 0)),
+        'num_especies': int(tipos.get('Especie', 0)),
+        'num_ubicaciones': int(tipos.get('Ubicación', 0)),
+        'num_arffs': int(tipos.get('ARFFS', 0)),
+    }
+
+
+def write_dataset(factor: float, seed: int = 0, out_dir: str = DEFAULT_DIR, src=DEFAULT_CSV) -> dict:
+    """Write CSV, pickle, snapshot and stats for one scale; reused if present."""
+    from codigo.graph_snapshot import convert
+    d = os.path.join(out_dir, f'x{factor:g}-s{seed}')
+    paths = {
+        'dir': d,
+        'csv': os.path.join(d, 'plantaciones.csv'),
+        'pkl': os.path.join(d, 'grafo_plantaciones.pkl'),
+        'snapshot': os.path.join(d, 'grafo_plantaciones.csrg'),
+        'stats': os.path.join(d, 'grafo_stats.json'),
+    }
+    if all(os.path.exists(p) for p in paths.values()):
+        return paths
+    os.makedirs(d, exist_ok=True)
+    df = generate(factor, seed, src)
+    df.to_csv(paths['csv'], sep=';', index=False, encoding='utf-8-sig', lineterminator='\n')
+    g = graph_from_frame(df)
+    with open(paths['pkl'], 'wb') as f:
+        pickle.dump(g, f, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(paths['stats'], 'w', encoding='utf-8') as f:
+        json.dump(graph_stats(g), f, indent=2)
+    convert(paths['pkl'], paths['snapshot'])
+    return paths
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--factor', type=float, default=10)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--out', default=DEFAULT_DIR)
+    ap.add_argument('--src', default=str(DEFAULT_CSV))
+    args = ap.parse_args()
+    paths = write_dataset(args.factor, args.seed, args.out, args.src)
+    with open(paths['stats'], encoding='utf-8') as f:
+        print(paths['dir'], f.read())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+from typing import Dict, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+
+from codigo.search_index import fold
+
+# API name -> CSV column
+DIMENSIONES = {
+    'especie': 'ESPECIE',
+    'departamento': 'DEPARTAMENTO',
+    'provincia': 'PROVINCIA',
+    'distrito': 'DISTRITO',
+    'arffs': 'ARFFS',
+    'finalidad': 'FINALIDAD',
+    'tipo_plantacion': 'TIPO_PLANTACION',
+    'periodo': 'PERIODO',
+}
+# values meaning "no filter", as sent by the analysis form
+SIN_FILTRO = {'', 'todas', 'todos', 'all', '*'}
+
+
+class AggregateCube:
+    """Plantation counts and summed surface over every combination of the
+    `DIMENSIONES` present in the data.
+
+    The cube has one row per distinct combination (far fewer than CSV rows);
+    a query filters rows by dimension code and sums them per group with
+    `np.bincount`. Rows are partitioned by PERIODO: they are kept sorted by
+    it, so a periodo filter takes its contiguous ranges and the other
+    filters only scan those rows. Cubes built from separate chunks can be
+    merged, or extended with `anexar` without regrouping.
+    """
+
+    def __init__(self, valores: Dict[str, List[str]], codigos: Dict[str, np.ndarray],
+                 conteo: np.ndarray, superficie: np.ndarray, orden: Optional[np.ndarray] = None,
+                 buscar: Optional[Dict[str, Dict[str, int]]] = None):
+        # `orden` (rows by periodo) and `buscar` (folded value -> code), when
+        # the caller already has them
+        if orden is None:
+            orden = np.argsort(codigos['periodo'], kind='stable')
+        self.valores = valores
+        self.codigos = {dim: c[orden] for dim, c in codigos.items()}
+        self.conteo = conteo[orden]
+        self.superficie = superficie[orden]
+        if buscar is None:
+            buscar = {dim: {_clave(v): i for i, v in enumerate(vals)} for dim, vals in valores.items()}
+        self._buscar = buscar
+        # periodo code -> (first row, end row)
+        codes, inicios, cuentas = np.unique(self.codigos['periodo'], return_index=True, return_counts=True)
+        self._periodos = {int(c): (int(a), int(a + n)) for c, a, n in zip(codes, inicios, cuentas)}
+
+    @classmethod
+    def from_frame(cls, df) -> 'AggregateCube':
+        import pandas as pd
+        from codigo.complex_grafo import _factorize_normalized
+        valores, columnas = {}, {}
+        for dim, col in DIMENSIONES.items():
+            if col in df.columns:
+                codes, uniques = _factorize_normalized(df[col])
+            else:
+                codes, uniques = np.zeros(len(df), dtype=np.intp), np.array(['NAN'], dtype=object)
+            valores[dim] = list(uniques)
+            columnas[dim] = codes
+        sup = pd.to_numeric(df['SUPERFICIE_PLANTACION'], errors='coerce').fillna(0.0).to_numpy(dtype=np.float64)
+        return cls._agrupar(valores, columnas, np.ones(len(df), dtype=np.int64), sup)
+
+    @classmethod
+    def _agrupar(cls, valores, columnas, conteo, superficie) -> 'AggregateCube':
+        import pandas as pd
+        tabla = pd.DataFrame(columnas)
+        tabla['conteo'] = conteo
+        tabla['superficie'] = superficie
+        cubo = tabla.groupby(list(DIMENSIONES), sort=False).sum().reset_index()
+        return cls(
+            valores,
+            {dim: cubo[dim].to_numpy(dtype=np.int32) for dim in DIMENSIONES},
+            cubo['conteo'].to_numpy(dtype=np.int64),
+            cubo['superficie'].to_numpy(dtype=np.float64),
+        )
+
+    def _unir(self, other: 'AggregateCube'):
+        """(valores of both cubes, other's codes mapped into them, column by column)."""
+        valores, columnas = {}, {}
+        for dim in DIMENSIONES:
+            vals = list(self.valores[dim])
+            idx = {v: i for i, v in enumerate(vals)}
+            remap = np.empty(len(other.valores[dim]), dtype=np.int32)
+            for i, v in enumerate(other.valores[dim]):
+                j = idx.get(v)
+                if j is None:
+                    j = idx[v] = len(vals)
+                    vals.append(v)
+                remap[i] = j
+            valores[dim] = vals
+            columnas[dim] = np.concatenate((self.codigos[dim], remap[other.codigos[dim]]))
+        return valores, columnas
+
+    def merge(self, other: 'AggregateCube') -> 'AggregateCube':
+        """Cube over the rows of both inputs, regrouped (one row per combination)."""
+        valores, columnas = self._unir(other)
+        return self._agrupar(valores, columnas, np.concatenate((self.conteo, other.conteo)),
+                             np.concatenate((self.superficie, other.superficie)))
+
+    def anexar(self, other: 'AggregateCube') -> 'AggregateCube':
+        """Cube over the rows of both inputs without regrouping, for appends.
+
+        other's rows are placed at the end of their periodo partitions, so a
+        combination present in both cubes gets two rows (queries sum them
+        alike). Costs a copy of the arrays rather than a group-by; a full
+        rebuild compacts the cube again.
+        """
+        valores, columnas = self._unir(other)
+        n = len(self.conteo)
+        periodo = columnas['periodo']
+        nuevas = n + np.argsort(periodo[n:], kind='stable')
+        codes, inicios, cuentas = np.unique(periodo[nuevas], return_index=True, return_counts=True)
+        suyas = {int(c): (int(a), int(a + k)) for c, a, k in zip(codes, inicios, cuentas)}
+        partes = []
+        for c in sorted(set(self._periodos) | set(suyas)):
+            if c in self._periodos:
+                partes.append(np.arange(*self._periodos[c]))
+            if c in suyas:
+                partes.append(nuevas[slice(*suyas[c])])
+        orden = np.concatenate(partes) if partes else np.empty(0, dtype=np.intp)
+        # only the values other added need folding
+        buscar = {}
+        for dim, vals in valores.items():
+            buscar[dim] = b = dict(self._buscar[dim])
+            for i in range(len(self.valores[dim]), len(vals)):
+                b[_clave(vals[i])] = i
+        return AggregateCube(valores, columnas, np.concatenate((self.conteo, other.conteo)),
+                             np.concatenate((self.superficie, other.superficie)), orden=orden, buscar=buscar)
+
+    def __len__(self):
+        return len(self.conteo)
+
+    def _filas_periodo(self, valores) -> Union[slice, np.ndarray]:
+        rangos = {self._periodos.get(self._buscar['periodo'].get(_clave(v), -1)) for v in valores} - {None}
+        if len(rangos) <= 1:
+            return slice(*rangos.pop()) if rangos else slice(0, 0)
+        return np.concatenate([np.arange(a, b) for a, b in sorted(rangos)])
+
+    def _seleccion(self, filtros: Optional[Mapping[str, object]]):
+        """(rows, mask over those rows or None, applied filters)."""
+        aplicados = {}
+        for dim, valor in (filtros or {}).items():
+            if dim not in DIMENSIONES or valor is None or _clave(valor) in SIN_FILTRO:
+                continue
+            aplicados[dim] = valor
+        # the periodo partitions first, so the other filters scan fewer rows
+        filas = self._filas_periodo(_lista(aplicados['periodo'])) if 'periodo' in aplicados else slice(None)
+        mascara = None
+        for dim, valor in aplicados.items():
+            if dim == 'periodo':
+                continue
+            codigos = [self._buscar[dim].get(_clave(v), -1) for v in _lista(valor)]
+            m = np.isin(self.codigos[dim][filas], codigos)
+            mascara = m if mascara is None else mascara & m
+        return filas, mascara, aplicados
+
+    def query(self, by: str, top: Optional[int] = 10, filtros: Optional[Mapping[str, object]] = None,
+              orden: str = 'conteo') -> dict:
+        """Groups of `by` (count and summed superficie) after `filtros`.
+
+        Returns the `top` groups sorted by `orden` ('conteo' or
+        'superficie'), the totals and what the remaining groups add up to.
+        """
+        if by not in DIMENSIONES:
+            raise ValueError(f"Dimensión desconocida: {by}")
+        if orden not in ('conteo', 'superficie'):
+            raise ValueError(f"Orden desconocido: {orden}")
+        filas, mascara, aplicados = self._seleccion(filtros)
+        codigos, conteo, superficie = self.codigos[by][filas], self.conteo[filas], self.superficie[filas]
+        if mascara is not None:
+            codigos, conteo, superficie = codigos[mascara], conteo[mascara], superficie[mascara]
+        n = len(self.valores[by])
+        por_conteo = np.bincount(codigos, weights=conteo, minlength=n)
+        por_superficie = np.bincount(codigos, weights=superficie, minlength=n)
+        presentes = np.flatnonzero(por_conteo)
+        clave = por_conteo if orden == 'conteo' else por_superficie
+        # descending by the metric, ties by name for stable output
+        nombres = self.valores[by]
+        presentes = sorted(presentes, key=lambda i: (-clave[i], nombres[i]))
+        elegidos = presentes if top is None else presentes[:max(0, int(top))]
+        grupos = [{'key': nombres[i], 'conteo': int(por_conteo[i]),
+                   'superficie': round(float(por_superficie[i]), 4)} for i in elegidos]
+        total_conteo = int(conteo.sum())
+        total_superficie = float(superficie.sum())
+        return {
+            'by': by,
+            'orden': orden,
+            'filtros': aplicados,
+            'num_grupos': len(presentes),
+            'total': {'conteo': total_conteo, 'superficie': round(total_superficie, 4)},
+            'grupos': grupos,
+            'otros': {
+                'conteo': total_conteo - sum(g['conteo'] for g in grupos),
+                'superficie': round(total_superficie - sum(float(por_superficie[i]) for i in elegidos), 4),
+            },
+        }
+
+    def valores_de(self, dim: str) -> List[str]:
+        return sorted(self.valores[dim])
+
+
+def _clave(valor) -> str:
+    return fold(valor)
+
+
+def _lista(valor) -> list:
+    return list(valor) if isinstance(valor, (list, tuple, set)) else [valor]
@@ -1,11 +1,19 @@
 import os
 import re
+import sys
+import tempfile
+from array import array
+from collections.abc import Mapping
 from pathlib import Path
-from typing import Set, Tuple, Iterable, List
+from typing import TYPE_CHECKING, Set, Tuple, Iterable, List, Optional
 
-import pandas as pd
+import numpy as np
 import networkx as nx
-from pyvis.network import Network
+
+# pandas and pyvis are imported where rows are ingested or pages rendered,
+# so the query paths (resumen_especie, bfs_por_especie) start without them
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Colors
 COLOR_DISTRITO = "skyblue"
@@ -22,6 +30,8 @@ def normalize_string(text):
 
 
 class Planta:
+    __slots__ = ('id', 'especie', 'titular', 'distrito', 'superficie')
+
     def __init__(self, id, especie, titular, distrito, superficie):
         self.id = id
         self.especie = normalize_string(especie)
@@ -29,56 +39,593 @@ class Planta:
         self.distrito = normalize_string(distrito)
         self.superficie = superficie
 
+    @classmethod
+    def desde_normalizado(cls, id, especie, titular, distrito, superficie):
+        # bulk ingest already normalized the strings; skip the per-field regex
+        p = cls.__new__(cls)
+        p.id = id
+        p.especie = especie
+        p.titular = titular
+        p.distrito = distrito
+        p.superficie = superficie
+        return p
+
+    def __repr__(self):
+        return f"Planta({self.id}, {self.especie}, {self.distrito}, {self.titular}, {self.superficie})"
+
+
+class _Categorias:
+    """Interned string table: each distinct value is stored once and coded as int.
+
+    Append-only (a value's code never changes), so copies of a store share
+    it: a code added by one is just unused by the others.
+    """
+    __slots__ = ('valores', 'codigos')
+
+    def __init__(self):
+        self.valores: List[str] = []
+        self.codigos = {}
+
+    def codigo(self, valor: str) -> int:
+        c = self.codigos.get(valor)
+        if c is None:
+            valor = sys.intern(valor)
+            c = len(self.valores)
+            self.valores.append(valor)
+            self.codigos[valor] = c
+        return c
+
+    def codificar(self, valores: np.ndarray) -> np.ndarray:
+        import pandas as pd
+        codes, uniques = pd.factorize(valores)
+        mapa = np.fromiter((self.codigo(u) for u in uniques), dtype=np.int32, count=len(uniques))
+        return mapa[codes]
+
+
+class _Resumen:
+    """Precomputed aggregates for one index key (especie, distrito or titular)."""
+    __slots__ = ('filas', 'superficie', 'distritos', 'especies')
+
+    def __init__(self):
+        self.filas = array('q')  # row numbers, in insertion order
+        self.superficie = 0.0
+        self.distritos = {}      # distrito code -> count of plantas
+        self.especies = {}       # especie code -> count of plantas
+
+    def agregar(self, fila: int, superficie: float, distrito: int, especie: int):
+        self.filas.append(fila)
+        self.superficie += superficie
+        self.distritos[distrito] = self.distritos.get(distrito, 0) + 1
+        self.especies[especie] = self.especies.get(especie, 0) + 1
+
+    def copia(self) -> '_Resumen':
+        r = _Resumen.__new__(_Resumen)
+        r.filas = array('q', self.filas)
+        r.superficie = self.superficie
+        r.distritos = dict(self.distritos)
+        r.especies = dict(self.especies)
+        return r
+
+    def quitar(self, fila: int, superficie: float, distrito: int, especie: int):
+        self.filas.remove(fila)
+        self.superficie -= superficie
+        for conteo, clave in ((self.distritos, distrito), (self.especies, especie)):
+            n = conteo.get(clave, 0) - 1
+            if n > 0:
+                conteo[clave] = n
+            else:
+                conteo.pop(clave, None)
+
+
+def _superficie(valor) -> float:
+    try:
+        v = float(valor)
+    except (TypeError, ValueError):
+        return float('nan')
+    return v
+
+
+class _Cola:
+    """Rows written so far into column arrays shared by copies of a store.
+
+    A store appends in place only while `n` equals its own row count, i.e.
+    no other copy has written past it; otherwise it reallocates.
+    """
+    __slots__ = ('n', 'compartida')
+
+    def __init__(self, n: int = 0):
+        self.n = n
+        self.compartida = False
+
+
+class _VistaObjetos(Mapping):
+    """Read-only `id -> Planta` view; Planta objects are built on access."""
+
+    def __init__(self, grafo: 'GrafoPlantaciones'):
+        self._g = grafo
+
+    def __getitem__(self, id):
+        fila = self._g._buscar_fila(id)
+        if fila is None:
+            raise KeyError(id)
+        return self._g._planta(fila)
+
+    def __contains__(self, id):
+        return self._g._buscar_fila(id) is not None
+
+    def __iter__(self):
+        return iter(self._g._ids[:self._g._n].tolist())
+
+    def __len__(self):
+        return self._g._n
+
+    def values(self):
+        return (self._g._planta(i) for i in range(self._g._n))
+
+
+_COLUMNAS = ('_ids', '_superficie', '_especie', '_distrito', '_titular')
+
 
 class GrafoPlantaciones:
+    """Columnar store of plantaciones.
+
+    ids and superficie live in NumPy arrays; especie/distrito/titular are int32
+    codes into interned string tables. `Planta` objects are only materialized
+    when a record is read (`objetos`, `por_especie`, ...). `copia()` gives an
+    independent store to append to while readers keep using this one; it
+    costs O(distinct especies/distritos/titulares), not O(rows).
+    """
+
+    _CAPACIDAD_INICIAL = 1024
+
     def __init__(self):
-        self.objetos = {}
+        self._n = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._superficie = np.empty(0, dtype=np.float64)
+        self._especie = np.empty(0, dtype=np.int32)
+        self._distrito = np.empty(0, dtype=np.int32)
+        self._titular = np.empty(0, dtype=np.int32)
+        self._cola = _Cola()
+        # planta id -> row; while ids arrive in increasing order (the normal
+        # ingest case) rows are found by binary search and no dict is kept
+        self._fila = None
+        self._especies = _Categorias()
+        self._distritos = _Categorias()
+        self._titulares = _Categorias()
+        # secondary indexes: category code -> _Resumen (rows + aggregates)
+        self._por_especie = {}
+        self._por_distrito = {}
+        self._por_titular = {}
+        # ids of the _Resumen this store may modify; None means all of them.
+        # After copia() the index entries are shared with the original until
+        # first written (_resumen_propio copies them then).
+        self._propios = None
+        self.objetos = _VistaObjetos(self)
+
+    def __len__(self):
+        return self._n
+
+    def copia(self) -> 'GrafoPlantaciones':
+        """Copy that can grow without changing this store.
+
+        The column arrays are shared: rows are only appended past both
+        stores' row counts (see _Cola), and rewriting an existing row copies
+        the columns first. The string tables are append-only and shared;
+        index entries are copied on first write.
+        """
+        otro = GrafoPlantaciones()
+        otro._n = self._n
+        for nombre in _COLUMNAS:
+            setattr(otro, nombre, getattr(self, nombre))
+        self._cola.compartida = True
+        otro._cola = self._cola
+        otro._fila = None if self._fila is None else dict(self._fila)
+        otro._especies = self._especies
+        otro._distritos = self._distritos
+        otro._titulares = self._titulares
+        otro._por_especie = dict(self._por_especie)
+        otro._por_distrito = dict(self._por_distrito)
+        otro._por_titular = dict(self._por_titular)
+        otro._propios = set()
+        return otro
+
+    def _resumen_propio(self, indice, clave) -> '_Resumen':
+        """indice[clave] ready to modify: created if missing, copied first if
+        it is still shared with the store this one was copied from."""
+        resumen = indice.get(clave)
+        if resumen is None:
+            resumen = indice[clave] = _Resumen()
+        elif self._propios is None or id(resumen) in self._propios:
+            return resumen
+        else:
+            resumen = indice[clave] = resumen.copia()
+        if self._propios is not None:
+            self._propios.add(id(resumen))
+        return resumen
+
+    def _reservar(self, extra: int):
+        """Room for `extra` rows past the end, in arrays no other copy writes to."""
+        necesario = self._n + extra
+        if necesario <= len(self._ids) and self._cola.n == self._n:
+            return
+        self._realojar(max(necesario, 2 * len(self._ids), self._CAPACIDAD_INICIAL))
+
+    def _realojar(self, capacidad: int):
+        for nombre in _COLUMNAS:
+            viejo = getattr(self, nombre)
+            nuevo = np.empty(capacidad, dtype=viejo.dtype)
+            nuevo[:self._n] = viejo[:self._n]
+            setattr(self, nombre, nuevo)
+        self._cola = _Cola(self._n)
+
+    def _buscar_fila(self, id) -> Optional[int]:
+        if self._fila is not None:
+            return self._fila.get(id)
+        if not isinstance(id, (int, np.integer)):
+            return None
+        fila = int(np.searchsorted(self._ids[:self._n], id))
+        if fila < self._n and self._ids[fila] == id:
+            return fila
+        return None
+
+    def _registrar_filas(self, ids: np.ndarray, inicio: int):
+        if self._fila is None:
+            previo = self._ids[inicio - 1] if inicio else None
+            if (previo is None or ids[0] > previo) and (len(ids) < 2 or bool(np.all(ids[1:] > ids[:-1]))):
+                return
+            self._fila = dict(zip(self._ids[:inicio].tolist(), range(inicio)))
+        self._fila.update(zip(ids.tolist(), range(inicio, inicio + len(ids))))
+
+    def _planta(self, fila: int) -> Planta:
+        return Planta.desde_normalizado(
+            int(self._ids[fila]),
+            self._especies.valores[self._especie[fila]],
+            self._titulares.valores[self._titular[fila]],
+            self._distritos.valores[self._distrito[fila]],
+            float(self._superficie[fila]),
+        )
+
+    def _indices(self, fila: int):
+        return ((self._por_especie, int(self._especie[fila])),
+                (self._por_distrito, int(self._distrito[fila])),
+                (self._por_titular, int(self._titular[fila])))
+
+    def _sup_agregada(self, fila: int) -> float:
+        v = float(self._superficie[fila])
+        return v if v == v else 0.0
 
     def agregar_planta(self, planta: Planta):
-        self.objetos[planta.id] = planta
+        fila = self._buscar_fila(planta.id)
+        if fila is not None:
+            if self._cola.compartida:
+                # the row is visible to the other copies: rewrite our own columns
+                self._realojar(len(self._ids))
+            sup, d, e = self._sup_agregada(fila), int(self._distrito[fila]), int(self._especie[fila])
+            for indice, clave in self._indices(fila):
+                resumen = self._resumen_propio(indice, clave)
+                resumen.quitar(fila, sup, d, e)
+                if not resumen.filas:
+                    del indice[clave]
+        else:
+            self._reservar(1)
+            fila = self._n
+            self._registrar_filas(np.array([planta.id], dtype=np.int64), fila)
+            self._n += 1
+            self._cola.n = self._n
+        self._ids[fila] = planta.id
+        self._superficie[fila] = _superficie(planta.superficie)
+        self._especie[fila] = self._especies.codigo(planta.especie)
+        self._distrito[fila] = self._distritos.codigo(planta.distrito)
+        self._titular[fila] = self._titulares.codigo(planta.titular)
+        sup, d, e = self._sup_agregada(fila), int(self._distrito[fila]), int(self._especie[fila])
+        for indice, clave in self._indices(fila):
+            self._resumen_propio(indice, clave).agregar(fila, sup, d, e)
+
+    def agregar_plantas(self, plantas: Iterable[Planta]):
+        for p in plantas:
+            self.agregar_planta(p)
+
+    def agregar_columnas(self, ids, especies, titulares, distritos, superficies):
+        """Bulk append of already-normalized columns."""
+        ids = np.asarray(ids, dtype=np.int64)
+        k = len(ids)
+        if k == 0:
+            return
+        superficies = np.asarray(superficies, dtype=np.float64)
+        if len(np.unique(ids)) != k or any(self._buscar_fila(i) is not None for i in ids.tolist()):
+            # replacements keep the row-by-row semantics
+            for fila in zip(ids.tolist(), especies, titulares, distritos, superficies.tolist()):
+                self.agregar_planta(Planta.desde_normalizado(*fila))
+            return
+        self._agregar_codigos(
+            ids,
+            self._especies.codificar(np.asarray(especies, dtype=object)),
+            self._titulares.codificar(np.asarray(titulares, dtype=object)),
+            self._distritos.codificar(np.asarray(distritos, dtype=object)),
+            superficies,
+        )
+
+    def _agregar_codigos(self, ids, e, t, d, superficies):
+        k = len(ids)
+        self._reservar(k)
+        inicio = self._n
+        filas = np.arange(inicio, inicio + k)
+        self._ids[inicio:inicio + k] = ids
+        self._superficie[inicio:inicio + k] = superficies
+        self._especie[inicio:inicio + k] = e
+        self._distrito[inicio:inicio + k] = d
+        self._titular[inicio:inicio + k] = t
+        self._registrar_filas(ids, inicio)
+        self._n += k
+        self._cola.n = self._n
+        sup = np.nan_to_num(superficies, nan=0.0)
+        for indice, codes in ((self._por_especie, e), (self._por_distrito, d), (self._por_titular, t)):
+            self._indexar_lote(indice, codes, filas, sup, d, e)
+
+    def extender(self, otro: 'GrafoPlantaciones', desplazamiento: int = 0):
+        """Append every row of `otro`, its ids shifted by `desplazamiento`.
+
+        Same result as adding otro's rows here in order, but the category
+        codes are remapped once per distinct value instead of per row.
+        """
+        n = otro._n
+        if n == 0:
+            return
+        ids = otro._ids[:n] + desplazamiento
+        e, t, d = otro._especie[:n], otro._titular[:n], otro._distrito[:n]
+        superficies = otro._superficie[:n]
+        nuevos = self._n == 0 or (self._fila is None and otro._fila is None and ids[0] > self._ids[self._n - 1])
+        if not nuevos:
+            self.agregar_columnas(ids, np.asarray(otro._especies.valores, dtype=object)[e],
+                                  np.asarray(otro._titulares.valores, dtype=object)[t],
+                                  np.asarray(otro._distritos.valores, dtype=object)[d], superficies)
+            return
+        remap = [mias.codificar(np.asarray(suyas.valores, dtype=object))
+                 for mias, suyas in ((self._especies, otro._especies), (self._titulares, otro._titulares),
+                                     (self._distritos, otro._distritos))]
+        self._agregar_codigos(ids, remap[0][e], remap[1][t], remap[2][d], superficies)
+
+    def _indexar_lote(self, indice, codes, filas, sup, d, e):
+        orden = np.argsort(codes, kind='stable')
+        unicos, inicios = np.unique(codes[orden], return_index=True)
+        fines = np.append(inicios[1:], len(codes))
+        sumas = np.bincount(codes, weights=sup)
+        for code, a, b in zip(unicos.tolist(), inicios.tolist(), fines.tolist()):
+            resumen = self._resumen_propio(indice, code)
+            resumen.filas.extend(filas[orden[a:b]].tolist())
+            resumen.superficie += float(sumas[code])
+        for otros, campo in ((d, 'distritos'), (e, 'especies')):
+            pares = codes.astype(np.int64) << 32 | otros.astype(np.int64)
+            claves, cuentas = np.unique(pares, return_counts=True)
+            for clave, n in zip(claves.tolist(), cuentas.tolist()):
+                conteo = getattr(indice[clave >> 32], campo)
+                otro = clave & 0xFFFFFFFF
+                conteo[otro] = conteo.get(otro, 0) + n
+
+    def _buscar(self, indice, categorias: _Categorias, clave) -> Optional['_Resumen']:
+        code = categorias.codigos.get(normalize_string(clave))
+        return None if code is None else indice.get(code)
+
+    def _plantas(self, resumen) -> List[Planta]:
+        if resumen is None:
+            return []
+        return [self._planta(f) for f in resumen.filas]
+
+    def por_especie(self, especie: str) -> List[Planta]:
+        return self._plantas(self._buscar(self._por_especie, self._especies, especie))
+
+    def por_distrito(self, distrito: str) -> List[Planta]:
+        return self._plantas(self._buscar(self._por_distrito, self._distritos, distrito))
+
+    def por_titular(self, titular: str) -> List[Planta]:
+        return self._plantas(self._buscar(self._por_titular, self._titulares, titular))
+
+    def _resumen(self, resumen):
+        if resumen is None:
+            return None
+        return {
+            'plantas': len(resumen.filas),
+            'superficie': resumen.superficie,
+            'distritos': {self._distritos.valores[c] for c in resumen.distritos},
+            'especies': {self._especies.valores[c] for c in resumen.especies},
+        }
+
+    def resumen_especie(self, especie: str):
+        return self._resumen(self._buscar(self._por_especie, self._especies, especie))
+
+    def resumen_distrito(self, distrito: str):
+        return self._resumen(self._buscar(self._por_distrito, self._distritos, distrito))
+
+    def resumen_titular(self, titular: str):
+        return self._resumen(self._buscar(self._por_titular, self._titulares, titular))
+
+    def especies(self) -> List[str]:
+        return [self._especies.valores[c] for c in self._por_especie]
+
+    def distritos(self) -> List[str]:
+        return [self._distritos.valores[c] for c in self._por_distrito]
+
+    def titulares(self) -> List[str]:
+        return [self._titulares.valores[c] for c in self._por_titular]
 
     def bfs_por_especie(self, especie: str) -> List[Planta]:
-        q = normalize_string(especie)
-        return [p for p in self.objetos.values() if p.especie == q]
+        return self.por_especie(especie)
 
+    def memoria_bytes(self) -> int:
+        """Approximate resident size of the columns, tables and indexes."""
+        total = sum(getattr(self, c).nbytes for c in _COLUMNAS)
+        if self._fila is not None:
+            total += sys.getsizeof(self._fila)
+        for cats in (self._especies, self._distritos, self._titulares):
+            total += sys.getsizeof(cats.codigos) + sys.getsizeof(cats.valores)
+            total += sum(sys.getsizeof(v) for v in cats.valores)
+        for indice in (self._por_especie, self._por_distrito, self._por_titular):
+            total += sys.getsizeof(indice)
+            for r in indice.values():
+                total += sys.getsizeof(r.filas) + sys.getsizeof(r.distritos) + sys.getsizeof(r.especies)
+        return total
 
-def build_visual_and_logical_graphs(csv_path: Path) -> Tuple[nx.Graph, GrafoPlantaciones]:
+
+def _normalize_values(values: np.ndarray) -> np.ndarray:
+    import pandas as pd
+    col = pd.Series(values, dtype=object)
+    is_str = col.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    out = col.to_numpy(dtype=object, copy=True)
+    if is_str.any():
+        out[is_str] = (col[is_str].str.strip()
+                       .str.replace(r"\s+", " ", regex=True)
+                       .str.upper()
+                       .to_numpy(dtype=object))
+    if not is_str.all():
+        out[~is_str] = [str(v) for v in out[~is_str]]
+    return out
+
+
+def _factorize_normalized(values: 'pd.Series') -> Tuple[np.ndarray, np.ndarray]:
+    # Columns repeat a few hundred distinct names across thousands of rows,
+    # so only the distinct values go through the string ops.
+    import pandas as pd
+    codes, uniques = pd.factorize(values.astype(object), use_na_sentinel=False)
+    return codes, _normalize_values(np.asarray(uniques, dtype=object))
+
+
+def normalize_column(values: 'pd.Series') -> np.ndarray:
+    """Vectorized `normalize_string` over a column; returns an object array."""
+    codes, uniques = _factorize_normalized(values)
+    return uniques[codes]
+
+
+def read_plantaciones(csv_path: Path) -> 'pd.DataFrame':
+    import pandas as pd
     df = pd.read_csv(csv_path, sep=';', encoding='utf-8-sig')
     # ensure required columns
     required_cols = ["DISTRITO", "ESPECIE", "TITULAR", "SUPERFICIE_PLANTACION"]
     for c in required_cols:
         if c not in df.columns:
             raise ValueError(f"Falta columna requerida: {c}")
+    return df
+
+
+def _nodo_distrito(distrito):
+    return distrito, {'tipo': 'Ubicación', 'color': {'background': COLOR_DISTRITO, 'border': '#0066aa'}, 'title': f'Distrito: {distrito}', 'group': 1}
 
+
+def _nodo_especie(especie):
+    return especie, {'tipo': 'Especie', 'color': {'background': COLOR_ESPECIE, 'border': '#114411'}, 'title': f'Especie: {especie}', 'group': 2}
+
+
+def build_graphs_from_frame(df: 'pd.DataFrame', first_id: int = 1) -> Tuple[nx.Graph, GrafoPlantaciones]:
+    return build_graphs_from_chunks([df], first_id)
+
+
+def build_graphs_from_chunks(chunks: Iterable['pd.DataFrame'], first_id: int = 1) -> Tuple[nx.Graph, GrafoPlantaciones]:
+    """Same graphs as one build over the concatenated chunks."""
+    from codigo.metrics import fase
     G_viz = nx.Graph()
     G_logico = GrafoPlantaciones()
+    chunks = iter(chunks)
+    while True:
+        with fase('graph.read'):
+            df = next(chunks, None)
+        if df is None:
+            break
+        with fase('graph.build'):
+            agregar_filas(G_viz, G_logico, df, first_id)
+        first_id += len(df)
+    return G_viz, G_logico
 
-    df = df.copy()
-    df['ID_PLANTA'] = range(1, len(df) + 1)
 
-    for _, fila in df.iterrows():
-        distrito = normalize_string(fila['DISTRITO'])
-        especie = normalize_string(fila['ESPECIE'])
-        titular = normalize_string(fila['TITULAR'])
+def agregar_filas(G_viz: nx.Graph, G_logico: GrafoPlantaciones, df: 'pd.DataFrame', first_id: int):
+    """Add CSV rows to existing graphs; plantas get ids first_id, first_id+1, ..."""
+    nodos, pares = agregar_filas_logicas(G_logico, df, first_id)
+    agregar_viz(G_viz, nodos, pares)
 
-        planta = Planta(id=fila['ID_PLANTA'], especie=especie, titular=titular, distrito=distrito, superficie=fila['SUPERFICIE_PLANTACION'])
-        G_logico.agregar_planta(planta)
 
-        if distrito not in G_viz:
-            G_viz.add_node(distrito, tipo='Ubicación', color={'background': COLOR_DISTRITO, 'border': '#0066aa'}, title=f'Distrito: {distrito}', group=1)
-        if especie not in G_viz:
-            G_viz.add_node(especie, tipo='Especie', color={'background': COLOR_ESPECIE, 'border': '#114411'}, title=f'Especie: {especie}', group=2)
+def agregar_filas_logicas(G_logico: GrafoPlantaciones, df: 'pd.DataFrame', first_id: int):
+    """Add CSV rows to G_logico; returns the G_viz part of the rows as
+    (nodos, pares) for `agregar_viz`."""
+    import pandas as pd
+    d_codes, d_uniques = _factorize_normalized(df['DISTRITO'])
+    e_codes, e_uniques = _factorize_normalized(df['ESPECIE'])
+    t_codes, t_uniques = _factorize_normalized(df['TITULAR'])
+    distritos = d_uniques[d_codes]
+    especies = e_uniques[e_codes]
+    superficies = pd.to_numeric(df['SUPERFICIE_PLANTACION'], errors='coerce').to_numpy(dtype=np.float64)
+    ids = np.arange(first_id, first_id + len(df), dtype=np.int64)
 
-        G_viz.add_edge(distrito, especie, relacion='contiene')
+    # Planta normalizes its fields once more on top of the row normalization;
+    # that is a no-op for text but turns missing values ('nan') into 'NAN'.
+    G_logico.agregar_columnas(
+        ids,
+        _normalize_values(e_uniques)[e_codes],
+        _normalize_values(t_uniques)[t_codes],
+        _normalize_values(d_uniques)[d_codes],
+        superficies,
+    )
 
-    return G_viz, G_logico
+    # Nodes in order of first appearance, alternating distrito/especie per row,
+    # so the graph matches the row-by-row construction exactly.
+    intercalados = np.empty(2 * len(df), dtype=object)
+    intercalados[0::2] = distritos
+    intercalados[1::2] = especies
+    primeros = pd.Series(intercalados).drop_duplicates()
+    nodos = [(n, pos % 2 == 0) for pos, n in zip(primeros.index, primeros.to_numpy())]
+    pares = pd.DataFrame({'distrito': distritos, 'especie': especies}).drop_duplicates()
+    return nodos, list(zip(pares['distrito'].to_numpy(), pares['especie'].to_numpy()))
+
+
+def agregar_viz(G_viz: nx.Graph, nodos: Iterable[Tuple[str, bool]], pares: Iterable[Tuple[str, str]]):
+    """Add (name, es_distrito) nodes and distrito-especie edges, in order.
+
+    A name seen first as a distrito keeps the distrito attributes (and vice
+    versa), including names already in the graph from earlier rows.
+    """
+    G_viz.add_nodes_from(
+        _nodo_distrito(n) if es_distrito else _nodo_especie(n)
+        for n, es_distrito in nodos
+        if n not in G_viz
+    )
+    G_viz.add_edges_from(
+        (d, e, {'relacion': 'contiene'})
+        for d, e in pares
+        if not G_viz.has_edge(d, e)
+    )
+
+
+def extender_viz(G_viz: nx.Graph, nodos: Iterable[Tuple[str, bool]], pares: Iterable[Tuple[str, str]]) -> nx.Graph:
+    """`agregar_viz` on a copy of G_viz, leaving G_viz unchanged.
+
+    Only the node and adjacency maps are copied, plus the adjacency rows of
+    the nodes that get a new edge; every other row and every attribute dict
+    is shared, so neither graph may be modified in place afterwards.
+    """
+    pares = [(d, e) for d, e in pares if not G_viz.has_edge(d, e)]
+    H = G_viz.__class__()
+    H.graph.update(G_viz.graph)
+    H._node = dict(G_viz._node)
+    H._adj = dict(G_viz._adj)
+    for par in pares:
+        for n in par:
+            fila = G_viz._adj.get(n)
+            if fila is not None and H._adj[n] is fila:
+                H._adj[n] = dict(fila)
+    agregar_viz(H, nodos, pares)
+    return H
+
+
+def build_visual_and_logical_graphs(csv_path: Path) -> Tuple[nx.Graph, GrafoPlantaciones]:
+    # streamed in chunks with only the columns the graphs use (CSV or XLSX)
+    from codigo.ingest import REQUIRED_COLUMNS, iter_plantaciones
+    return build_graphs_from_chunks(iter_plantaciones(csv_path, REQUIRED_COLUMNS))
 
 
 def ejecutar_bfs_en_grafos(G_viz: nx.Graph, G_logico: GrafoPlantaciones, especie_buscada: str):
-    plantas = G_logico.bfs_por_especie(especie_buscada)
-    if not plantas:
+    from codigo.metrics import fase
+    with fase('bfs.resumen_especie'):
+        resumen = G_logico.resumen_especie(especie_buscada)
+    if not resumen:
         return set(), []
-    distritos = set(p.distrito for p in plantas)
+    distritos = resumen['distritos']
     nodos_resaltar = set([normalize_string(especie_buscada)])
     bordes_resaltar = []
     for d in distritos:
@@ -88,7 +635,14 @@ def ejecutar_bfs_en_grafos(G_viz: nx.Graph, G_logico: GrafoPlantaciones, especie
     return nodos_resaltar, bordes_resaltar
 
 
-def export_pyvis(G_viz: nx.Graph, out_path: Path, nodos_resaltar: Iterable[str] = None, bordes_resaltar: Iterable[Tuple[str,str]] = None):
+def render_pyvis_html(G_viz: nx.Graph, nodos_resaltar: Iterable[str] = None, bordes_resaltar: Iterable[Tuple[str,str]] = None) -> str:
+    from codigo.metrics import fase
+    with fase('pyvis.render'):
+        return _render_pyvis_html(G_viz, nodos_resaltar, bordes_resaltar)
+
+
+def _render_pyvis_html(G_viz, nodos_resaltar, bordes_resaltar) -> str:
+    from pyvis.network import Network
     if nodos_resaltar is None:
         nodos_resaltar = set()
     else:
@@ -111,7 +665,32 @@ def export_pyvis(G_viz: nx.Graph, out_path: Path, nodos_resaltar: Iterable[str]
         else:
             net.add_edge(str(u), str(v), color='#888888', width=1)
 
-    out_path.parent.mkdir(parents=True, exist_ok=True)
     net.toggle_physics(True)
-    # Use write_html to avoid pyvis attempting to render via an environment that may not be available
-    net.write_html(str(out_path))
+    # generate_html avoids pyvis attempting to render via an environment that may not be available
+    return net.generate_html()
+
+
+def write_text_atomic(out_path: Path, text: str):
+    """Write to a temp file in the same directory and rename it into place, so
+    readers see either the old file or the complete new one."""
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=out_path.parent, prefix=f'.{out_path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, out_path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def export_pyvis(G_viz: nx.Graph, out_path: Path, nodos_resaltar: Iterable[str] = None, bordes_resaltar: Iterable[Tuple[str,str]] = None):
+    from codigo.metrics import fase
+    html = render_pyvis_html(G_viz, nodos_resaltar, bordes_resaltar)
+    with fase('pyvis.write'):
+        write_text_atomic(out_path, html)
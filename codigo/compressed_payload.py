@@ -0,0 +1,36 @@
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip/identity are offered
+    brotli = None
+
+
+class CompressedPayload:
+    """An immutable response body kept in memory in every encoding we serve.
+
+    Each encoding gets its own strong ETag (a strong validator must change
+    with the bytes on the wire), all derived from the same content hash.
+    """
+
+    def __init__(self, raw: bytes, mimetype: str = 'application/json'):
+        self.mimetype = mimetype
+        digest = hashlib.sha256(raw).hexdigest()[:32]
+        self.bodies = {'identity': raw, 'gzip': gzip.compress(raw, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(raw, quality=11)
+        self.etags = {enc: digest if enc == 'identity' else f'{digest}-{enc}' for enc in self.bodies}
+
+    def sizes(self):
+        return {enc: len(body) for enc, body in self.bodies.items()}
+
+    def choose_encoding(self, accept_encodings) -> str:
+        """Pick the best encoding the client accepts (werkzeug MIMEAccept-like)."""
+        for enc in ('br', 'gzip'):
+            if enc in self.bodies and accept_encodings[enc] > 0:
+                return enc
+        return 'identity'
+
+    def matches(self, if_none_match) -> bool:
+        return any(if_none_match.contains(tag) for tag in self.etags.values())
@@ -0,0 +1,525 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+ID_COLUMN = 'ID_PLANTACION'
+PERIODO_COLUMN = 'PERIODO'
+
+
+@dataclass
+class Dataset:
+    """Graphs built from one version of a plantaciones CSV."""
+    path: str
+    digest: str
+    version: int
+    G_viz: Any
+    G_logico: Any
+    build_seconds: float = 0.0
+    extras: Dict[str, Any] = field(default_factory=dict)
+    # bytes of the CSV ingested so far (appends are detected past this point)
+    size: int = 0
+    # sorted 64-bit hashes of the ID_PLANTACION values already ingested,
+    # used to drop duplicate appends (8 bytes per id instead of a str set)
+    ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.uint64))
+    # PERIODO -> rows, for stats (queries use AggregateCube's PERIODO ranges)
+    periodos: Dict[str, int] = field(default_factory=dict)
+
+    def __iter__(self):
+        # allow `G_viz, G_logico = dataset` like the old build call
+        return iter((self.G_viz, self.G_logico))
+
+
+@dataclass
+class Parcial:
+    """What one source file contributes to a Dataset, before merging."""
+    path: str
+    # G_viz in first-appearance order: (name, es_distrito) and (distrito, especie)
+    nodos: List[Tuple[str, bool]]
+    pares: List[Tuple[str, str]]
+    G_logico: Any
+    cube: Any
+    ids: np.ndarray
+    periodos: Dict[str, int]
+    seconds: float = 0.0
+    # phase -> seconds (read / logical graph / aggregates), reported as
+    # metrics by the parent since pool workers have their own registry
+    fases: Dict[str, float] = field(default_factory=dict)
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stat: Optional[Tuple[int, int]] = None
+        self.dataset: Optional[Dataset] = None
+
+
+def _stat_key(path: str):
+    from codigo.ingest import es_multiple, expand_sources
+    if es_multiple(path):
+        return tuple((p,) + _stat_key(p) for p in expand_sources(path))
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def source_digest(path: str) -> str:
+    """file_digest of a file; for a directory/glob, a digest of its files'."""
+    from codigo.ingest import es_multiple, expand_sources
+    if not es_multiple(path):
+        return file_digest(path)
+    h = hashlib.sha256()
+    for p in expand_sources(path):
+        h.update(f'{p}\0{file_digest(p)}\n'.encode('utf-8'))
+    return h.hexdigest()
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _leer_desde(path: str, prefix_size: int, prefix_digest: str, chunk_size: int = 1 << 20):
+    """(header line, bytes after prefix_size, digest of the whole file) when
+    the first prefix_size bytes still hash to prefix_digest, else None."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(0)
+        restante = prefix_size
+        ultimo = b''
+        while restante:
+            chunk = f.read(min(chunk_size, restante))
+            if not chunk:
+                return None
+            h.update(chunk)
+            restante -= len(chunk)
+            ultimo = chunk[-1:]
+        if h.hexdigest() != prefix_digest:
+            return None
+        cola = f.read()
+    # new lines must start after a line break, not extend the old last line
+    if ultimo and ultimo != b'\n' and not cola.startswith(b'\n'):
+        return None
+    h.update(cola)
+    return header, cola, h.hexdigest()
+
+
+def _es_csv_unico(path) -> bool:
+    from codigo.ingest import es_excel, es_multiple
+    return not es_excel(path) and not es_multiple(path)
+
+
+def _hash_ids(df) -> np.ndarray:
+    import pandas as pd
+    if ID_COLUMN not in df.columns:
+        return np.empty(0, dtype=np.uint64)
+    return pd.util.hash_array(df[ID_COLUMN].astype(str).str.strip().to_numpy(dtype=object))
+
+
+def _ids(df) -> np.ndarray:
+    return np.unique(_hash_ids(df))
+
+
+def _columnas_dataset() -> Set[str]:
+    """CSV columns a Dataset uses: graph, aggregate dimensions, id, periodo."""
+    from codigo.aggregates import DIMENSIONES
+    from codigo.ingest import REQUIRED_COLUMNS
+    return set(REQUIRED_COLUMNS) | set(DIMENSIONES.values()) | {ID_COLUMN, PERIODO_COLUMN}
+
+
+def _sumar_periodos(periodos: Dict[str, int], df):
+    if PERIODO_COLUMN not in df.columns:
+        return
+    for k, v in df[PERIODO_COLUMN].astype(str).str.strip().value_counts().items():
+        periodos[str(k)] = periodos.get(str(k), 0) + int(v)
+
+
+def _sin_repetidos(df, ids: np.ndarray):
+    """Rows whose ID_PLANTACION is not in the sorted `ids` (all of a
+    plantation's rows, one per especie, are kept together)."""
+    if ID_COLUMN not in df.columns or not len(ids):
+        return df
+    h = _hash_ids(df)
+    # binary search: O(rows log ids) instead of sorting both sides
+    pos = np.minimum(np.searchsorted(ids, h), len(ids) - 1)
+    return df[ids[pos] != h]
+
+
+def _unir_ids(ids: np.ndarray, nuevos: np.ndarray) -> np.ndarray:
+    """Sorted union of sorted `ids` and sorted `nuevos`, none of them in `ids`."""
+    return np.insert(ids, np.searchsorted(ids, nuevos), nuevos)
+
+
+def append_rows_to_csv(csv_path, df) -> int:
+    """Append rows (already deduplicated) to a plantaciones CSV, in its column
+    order and format. Returns the number of rows written."""
+    import pandas as pd
+    columnas = list(pd.read_csv(csv_path, sep=';', encoding='utf-8-sig', nrows=0).columns)
+    faltan = [c for c in columnas if c not in df.columns]
+    if faltan:
+        raise ValueError(f"Faltan columnas: {', '.join(faltan)}")
+    if df.empty:
+        return 0
+    texto = df[columnas].to_csv(sep=';', header=False, index=False, lineterminator='\n')
+    with open(csv_path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+        f.write(texto.encode('utf-8'))
+    return len(df)
+
+
+def construir_parcial(path: str) -> Parcial:
+    """Stream one source file into a Parcial (runs in a pool worker)."""
+    from codigo.aggregates import AggregateCube
+    from codigo.complex_grafo import GrafoPlantaciones, agregar_filas_logicas
+    from codigo.ingest import iter_plantaciones
+    from codigo.metrics import Fases
+    t0 = time.perf_counter()
+    fases = Fases()
+    # streamed: only one chunk of rows (and only the used columns) in memory
+    G_logico = GrafoPlantaciones()
+    nodos: Dict[str, bool] = {}
+    pares: Dict[Tuple[str, str], None] = {}
+    cube, ids, periodos = None, [], {}
+    chunks = iter(iter_plantaciones(path, _columnas_dataset()))
+    while True:
+        with fases.fase('dataset.read'):
+            df = next(chunks, None)
+        if df is None:
+            break
+        with fases.fase('dataset.logical_graph'):
+            chunk_nodos, chunk_pares = agregar_filas_logicas(G_logico, df, first_id=len(G_logico) + 1)
+            for n, es_distrito in chunk_nodos:
+                nodos.setdefault(n, es_distrito)
+            for par in chunk_pares:
+                pares.setdefault(par)
+        with fases.fase('dataset.aggregates'):
+            parcial = AggregateCube.from_frame(df)
+            cube = parcial if cube is None else cube.merge(parcial)
+            ids.append(_ids(df))
+            _sumar_periodos(periodos, df)
+    return Parcial(path=path, nodos=list(nodos.items()), pares=list(pares), G_logico=G_logico, cube=cube,
+                   ids=np.unique(np.concatenate(ids)) if ids else np.empty(0, dtype=np.uint64),
+                   periodos=periodos, seconds=time.perf_counter() - t0, fases=fases.segundos)
+
+
+def construir_parciales(paths: Sequence[str], workers: Optional[int] = None) -> List[Parcial]:
+    """One Parcial per file, in `paths` order.
+
+    Several files totalling at least INGEST_PARALLEL_MIN_BYTES go to a
+    process pool of up to INGEST_WORKERS processes (or `workers`, which
+    also skips the size check).
+    """
+    from codigo.ingest import INGEST_PARALLEL_MIN_BYTES, INGEST_WORKERS
+    if workers is None:
+        workers = INGEST_WORKERS
+        if sum(os.path.getsize(p) for p in paths) < INGEST_PARALLEL_MIN_BYTES:
+            workers = 1
+    workers = min(len(paths), workers)
+    if workers <= 1:
+        return [construir_parcial(p) for p in paths]
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    # spawn: the parent may be a threaded web worker, where fork is unsafe
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(construir_parcial, paths))
+
+
+def fusionar_parciales(parciales: Sequence[Parcial]):
+    """(G_viz, G_logico, cube, ids, periodos) over the parciales in order.
+
+    Deterministic and identical to building the concatenated files in one
+    pass: nodes and edges are replayed in first-appearance order and the
+    plantation stores are appended with consecutive ids.
+    """
+    import networkx as nx
+    from codigo.aggregates import AggregateCube
+    from codigo.complex_grafo import GrafoPlantaciones, agregar_viz
+    G_viz = nx.Graph()
+    G_logico = None
+    cube, periodos = None, {}
+    for p in parciales:
+        agregar_viz(G_viz, p.nodos, p.pares)
+        if G_logico is None:
+            G_logico = p.G_logico
+        else:
+            G_logico.extender(p.G_logico, len(G_logico))
+        if p.cube is not None:
+            cube = p.cube if cube is None else cube.merge(p.cube)
+        for periodo, n in p.periodos.items():
+            periodos[periodo] = periodos.get(periodo, 0) + n
+    if G_logico is None:
+        G_logico = GrafoPlantaciones()
+    if cube is None:
+        import pandas as pd
+        cube = AggregateCube.from_frame(pd.DataFrame(columns=sorted(_columnas_dataset())))
+    ids = [p.ids for p in parciales]
+    ids = np.unique(np.concatenate(ids)) if ids else np.empty(0, dtype=np.uint64)
+    return G_viz, G_logico, cube, ids, periodos
+
+
+class DatasetStore:
+    """Process-wide cache of (G_viz, GrafoPlantaciones) keyed by CSV path.
+
+    A cached dataset is reused while the file's mtime/size are unchanged. When
+    they change the content hash is recomputed and the graphs are rebuilt only
+    if the bytes actually differ (a `touch` does not trigger a rebuild). If the
+    file only grew and its old bytes are intact, just the appended rows are
+    ingested. Every change produces a new Dataset with a higher version.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        self._versions = 0
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'revalidations': 0,
+            'rebuilds': 0,
+            'rebuild_seconds_total': 0.0,
+            'last_rebuild_seconds': None,
+            'appends': 0,
+            'appended_rows': 0,
+            'duplicate_rows': 0,
+        }
+
+    def _entry(self, key: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            return entry
+
+    def _count(self, name: str, value=1):
+        with self._lock:
+            self._counters[name] += value
+        if name in ('hits', 'misses'):
+            from codigo.metrics import inc
+            inc('cache_requests_total', value, cache='dataset', result='hit' if name == 'hits' else 'miss')
+
+    def _next_version(self) -> int:
+        with self._lock:
+            self._versions += 1
+            return self._versions
+
+    def get(self, csv_path, progress: Optional[Callable[[str], None]] = None) -> Dataset:
+        """Return the dataset for `csv_path`, rebuilding it if the file changed.
+
+        `progress`, if given, is called with 'parse' and 'build' as a rebuild
+        (or an append) goes through those phases; not called on cache hits.
+        """
+        key = os.path.abspath(str(csv_path))
+        entry = self._entry(key)
+        stat = _stat_key(key)
+        # fast path: unchanged file, no locking beyond the counters
+        ds = entry.dataset
+        if ds is not None and entry.stat == stat:
+            self._count('hits')
+            return ds
+        with entry.lock:
+            stat = _stat_key(key)
+            ds = entry.dataset
+            if ds is not None and entry.stat == stat:
+                self._count('hits')
+                return ds
+            if ds is not None and _es_csv_unico(key) and stat[1] > ds.size:
+                crecido = self._ingerir_cola(ds, key, progress)
+                if crecido is not None:
+                    entry.dataset = crecido
+                    entry.stat = stat
+                    self._count('hits')
+                    return crecido
+            digest = source_digest(key)
+            if ds is not None and ds.digest == digest:
+                entry.stat = stat
+                self._count('revalidations')
+                self._count('hits')
+                return ds
+            self._count('misses')
+            ds = self._build(key, digest, stat[1] if _es_csv_unico(key) else 0, progress)
+            entry.dataset = ds
+            entry.stat = stat
+            return ds
+
+    def _build(self, path: str, digest: str, size: int, progress=None) -> Dataset:
+        from codigo.ingest import expand_sources
+        from codigo.metrics import fase, observar_fases
+        t0 = time.perf_counter()
+        if progress:
+            progress('parse')
+        with fase('dataset.parse'):
+            parciales = construir_parciales(expand_sources(path))
+        for p in parciales:
+            observar_fases(p.fases)
+        if progress:
+            progress('build')
+        with fase('dataset.merge'):
+            G_viz, G_logico, cube, ids, periodos = fusionar_parciales(parciales)
+        elapsed = time.perf_counter() - t0
+        version = self._next_version()
+        with self._lock:
+            self._counters['rebuilds'] += 1
+            self._counters['rebuild_seconds_total'] += elapsed
+            self._counters['last_rebuild_seconds'] = elapsed
+        extras = {
+            'aggregates': cube,
+            'sources': [{'path': p.path, 'rows': len(p.G_logico), 'seconds': round(p.seconds, 4)} for p in parciales],
+        }
+        return Dataset(path=path, digest=digest, version=version, G_viz=G_viz, G_logico=G_logico,
+                       build_seconds=elapsed, extras=extras, size=size, ids=ids, periodos=periodos)
+
+    def _ingerir_cola(self, ds: Dataset, path: str, progress=None) -> Optional[Dataset]:
+        import pandas as pd
+        from codigo.ingest import iter_plantaciones
+        leido = _leer_desde(path, ds.size, ds.digest)
+        if leido is None:
+            return None
+        from codigo.metrics import fase
+        header, cola, digest = leido
+        if progress:
+            progress('parse')
+        columnas = _columnas_dataset()
+        with fase('dataset.append_read'):
+            chunks = list(iter_plantaciones(io.BytesIO(header + cola), columnas))
+            df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=sorted(columnas))
+        if progress:
+            progress('build')
+        with fase('dataset.append_build'):
+            return self._extender(ds, df, digest, ds.size + len(cola))
+
+    def _extender(self, ds: Dataset, df, digest: str, size: int) -> Dataset:
+        """New dataset version with the rows of `df` whose ID_PLANTACION is new.
+
+        The new version shares everything the rows do not touch with `ds`,
+        so its cost follows the appended rows, not the dataset: G_viz copies
+        only the adjacency rows that get an edge, GrafoPlantaciones appends
+        into shared columns and copies the index entries it writes, and the
+        aggregate cube gets the new rows without regrouping. The ids,
+        periodos and species index are extended in the same step. Requests
+        still holding `ds` keep a consistent previous version.
+        """
+        from codigo.aggregates import AggregateCube
+        from codigo.complex_grafo import agregar_filas_logicas, extender_viz
+        t0 = time.perf_counter()
+        nuevas = _sin_repetidos(df, ds.ids)
+        duplicadas = len(df) - len(nuevas)
+        G_viz, G_logico, extras, ids, periodos = ds.G_viz, ds.G_logico, dict(ds.extras), ds.ids, ds.periodos
+        if len(nuevas):
+            G_logico = ds.G_logico.copia()
+            nodos, pares = agregar_filas_logicas(G_logico, nuevas, first_id=len(G_logico) + 1)
+            G_viz = extender_viz(ds.G_viz, nodos, pares)
+            # renders of the previous graph are dropped
+            extras = {'aggregates': ds.extras['aggregates'].anexar(AggregateCube.from_frame(nuevas))}
+            if 'species_index' in ds.extras:
+                from codigo.search_index import extend_species_index
+                tocados = [n for n, _ in nodos] + [n for par in pares for n in par]
+                extras['species_index'] = extend_species_index(ds.extras['species_index'], G_viz, ds.G_viz, tocados)
+            ids = _unir_ids(ds.ids, _ids(nuevas))
+            periodos = dict(ds.periodos)
+            _sumar_periodos(periodos, nuevas)
+        version = self._next_version()
+        with self._lock:
+            self._counters['appends'] += 1
+            self._counters['appended_rows'] += len(nuevas)
+            self._counters['duplicate_rows'] += duplicadas
+        extras['last_append'] = {'rows': len(nuevas), 'duplicates': duplicadas, 'version': version}
+        return Dataset(path=ds.path, digest=digest, version=version, G_viz=G_viz, G_logico=G_logico,
+                       build_seconds=time.perf_counter() - t0, extras=extras, size=size, ids=ids,
+                       periodos=periodos)
+
+    def append(self, csv_path, df, persist: bool = True) -> Dataset:
+        """Ingest new rows into the cached dataset without a rebuild.
+
+        Rows whose ID_PLANTACION was already ingested are dropped. With
+        `persist` the remaining rows are also appended to the CSV, so other
+        processes pick them up as a file append.
+        """
+        key = os.path.abspath(str(csv_path))
+        if not _es_csv_unico(key):
+            raise ValueError('Solo se pueden agregar filas a un único archivo CSV')
+        self.get(key)
+        entry = self._entry(key)
+        with entry.lock:
+            ds = entry.dataset
+            if ds is None or entry.stat != _stat_key(key):
+                raise RuntimeError('El CSV cambió durante la ingesta; reintente')
+            size, digest = ds.size, ds.digest
+            nuevas = _sin_repetidos(df, ds.ids)
+            if persist and len(nuevas):
+                append_rows_to_csv(key, nuevas)
+                leido = _leer_desde(key, ds.size, ds.digest)
+                if leido is None:
+                    raise RuntimeError('El CSV cambió durante la ingesta; reintente')
+                size, digest = os.path.getsize(key), leido[2]
+            nuevo = self._extender(ds, df, digest, size)
+            entry.dataset = nuevo
+            entry.stat = _stat_key(key)
+            return nuevo
+
+    def invalidate(self, csv_path=None):
+        with self._lock:
+            if csv_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(str(csv_path)), None)
+
+    def datasets(self) -> List[Dataset]:
+        """Current dataset of every cached source."""
+        with self._lock:
+            return [e.dataset for e in self._entries.values() if e.dataset is not None]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counters)
+            out['datasets'] = [
+                {'path': e.dataset.path, 'version': e.dataset.version, 'digest': e.dataset.digest[:12],
+                 'build_seconds': round(e.dataset.build_seconds, 4), 'rows': len(e.dataset.G_logico),
+                 'periodos': e.dataset.periodos}
+                for e in self._entries.values() if e.dataset is not None
+            ]
+        lookups = out['hits'] + out['misses']
+        out['hit_rate'] = (out['hits'] / lookups) if lookups else None
+        return out
+
+
+DATASET_STORE = DatasetStore()
+
+
+def get_dataset(csv_path, progress=None) -> Dataset:
+    return DATASET_STORE.get(csv_path, progress)
+
+
+def main(argv=None):
+    import argparse
+    import pandas as pd
+    parser = argparse.ArgumentParser(description='Agrega filas nuevas (por ID_PLANTACION) a un CSV de plantaciones.')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    ap = sub.add_parser('append', help='agregar a DESTINO las filas de NUEVOS cuyo ID_PLANTACION no exista')
+    ap.add_argument('destino', type=Path)
+    ap.add_argument('nuevos', type=Path, nargs='+')
+    args = parser.parse_args(argv)
+
+    existentes = _ids(pd.read_csv(args.destino, sep=';', encoding='utf-8-sig', usecols=[ID_COLUMN], dtype=str))
+    for nuevos in args.nuevos:
+        df = pd.read_csv(nuevos, sep=';', encoding='utf-8-sig')
+        nuevas = _sin_repetidos(df, existentes)
+        escritas = append_rows_to_csv(args.destino, nuevas)
+        existentes = np.union1d(existentes, _ids(nuevas))
+        print(f'{nuevos}: {escritas} filas agregadas, {len(df) - escritas} ya existían')
+
+
+if __name__ == '__main__':
+    main()
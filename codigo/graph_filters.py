@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Set, Tuple
+
+import networkx as nx
+
+from codigo.aggregates import SIN_FILTRO
+from codigo.search_index import fold
+
+
+def _tipo(attrs) -> str:
+    return attrs.get('tipo', attrs.get('type', attrs.get('categoria')))
+
+
+def _activo(valor) -> bool:
+    return valor is not None and fold(valor) not in SIN_FILTRO
+
+
+class FilterIndex:
+    """Plantación node sets per departamento and per especie for one graph.
+
+    A filtered region is the plantaciones matching every active filter plus
+    their direct neighbours (titular, especie, ubicación, ARFFS). Regions are
+    exposed as zero-copy `nx.subgraph_view`s, the most recent ones kept in a
+    small LRU, so traversals only touch the nodes of the region.
+    """
+
+    def __init__(self, g, cache_size: int = 32):
+        self.g = g
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._vistas: 'OrderedDict[Tuple[str, str], Tuple[nx.Graph, FrozenSet]]' = OrderedDict()
+        self.por_departamento: Dict[str, Set] = {}
+        self.por_especie: Dict[str, Set] = {}
+        for n, attrs in g.nodes(data=True):
+            tipo = _tipo(attrs)
+            if tipo == 'Ubicación' and attrs.get('departamento'):
+                destino = self.por_departamento.setdefault(fold(attrs['departamento']), set())
+            elif tipo == 'Especie':
+                destino = self.por_especie.setdefault(fold(attrs.get('label') or n), set())
+            else:
+                continue
+            destino.update(m for m in g.neighbors(n) if _tipo(g.nodes[m]) == 'Plantación')
+
+    def region(self, especie=None, departamento=None) -> Optional[FrozenSet]:
+        """Node set for the filters, or None when no filter is active."""
+        conjuntos = []
+        if _activo(especie):
+            conjuntos.append(self.por_especie.get(fold(especie), set()))
+        if _activo(departamento):
+            conjuntos.append(self.por_departamento.get(fold(departamento), set()))
+        if not conjuntos:
+            return None
+        plantas = set.intersection(*sorted(conjuntos, key=len))
+        nodos = set(plantas)
+        for p in plantas:
+            nodos.update(self.g.neighbors(p))
+        return frozenset(nodos)
+
+    def view(self, especie=None, departamento=None):
+        """(graph, node set) for the filters; the full graph when unfiltered."""
+        clave = (fold(especie) if _activo(especie) else '', fold(departamento) if _activo(departamento) else '')
+        if clave == ('', ''):
+            return self.g, None
+        with self._lock:
+            hit = self._vistas.get(clave)
+            if hit is not None:
+                self._vistas.move_to_end(clave)
+                return hit
+        nodos = self.region(especie, departamento)
+        hit = (nx.subgraph_view(self.g, filter_node=nx.filters.show_nodes(nodos)), nodos)
+        with self._lock:
+            self._vistas[clave] = hit
+            while len(self._vistas) > self.cache_size:
+                self._vistas.popitem(last=False)
+        return hit
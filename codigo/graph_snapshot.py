@@ -0,0 +1,473 @@
+"""Memory-mappable binary snapshot of an undirected NetworkX graph.
+
+Layout (little endian)::
+
+    b'CSRGRAF1' | uint64 header length | JSON header | padding | arrays...
+
+The header lists every array (dtype, shape, byte offset) plus the node and
+edge attribute columns. Arrays are:
+
+* node id string table (``ids_off`` int64 offsets + ``ids_data`` utf-8 bytes)
+  and ``ids_sorted`` (node indices ordered by id, for binary search);
+* CSR adjacency: ``indptr`` int64, ``indices`` int32 and ``slot_edge`` int32
+  (the edge id of each adjacency slot, so edge attributes are stored once);
+* one column per attribute key. Numeric keys are a float64 value array plus
+  a uint8 tag (0 missing, 1 float, 2 int). Any other key is an int32 code
+  array (-1 missing) into a string table of JSON-encoded values.
+
+`open_snapshot` maps the file read-only and returns a frozen `SnapshotGraph`
+whose node/adjacency mappings decode entries on first access and keep them
+as plain dicts (each edge's attribute dict is decoded once and shared by
+both endpoints), so opening costs O(1) and every process mapping the same
+file shares its page cache. `SnapshotGraph.materialize()` decodes everything
+in one vectorized pass and swaps in plain dicts, after which traversals run
+exactly as on an unpickled graph.
+"""
+import json
+import os
+import pickle
+import sys
+import tempfile
+from bisect import bisect_left
+from collections.abc import Mapping
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+
+MAGIC = b'CSRGRAF1'
+_ALIGN = 64
+
+TAG_MISSING = 0
+TAG_FLOAT = 1
+TAG_INT = 2
+_FALTA = object()
+
+
+def _is_number(v):
+    return isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, (bool, np.bool_))
+
+
+def _string_table(values):
+    data = [v.encode('utf-8') for v in values]
+    off = np.zeros(len(data) + 1, dtype=np.int64)
+    if data:
+        off[1:] = np.cumsum([len(b) for b in data])
+    return off, np.frombuffer(b''.join(data), dtype=np.uint8).copy()
+
+
+def _columns(records, count, prefix, arrays):
+    """Encode a list of attribute dicts into typed columns."""
+    keys = []
+    for attrs in records:
+        for k in attrs:
+            if k not in keys:
+                keys.append(k)
+    spec = {}
+    for pos, key in enumerate(keys):
+        name = f'{prefix}{pos}'
+        present = [a[key] for a in records if key in a]
+        if present and all(_is_number(v) for v in present):
+            tags = np.zeros(count, dtype=np.uint8)
+            vals = np.full(count, np.nan, dtype=np.float64)
+            for i, a in enumerate(records):
+                if key in a:
+                    v = a[key]
+                    tags[i] = TAG_INT if isinstance(v, (int, np.integer)) else TAG_FLOAT
+                    vals[i] = v
+            arrays[name + '_tag'] = tags
+            arrays[name + '_val'] = vals
+            spec[str(key)] = {'kind': 'num', 'col': name}
+        else:
+            cats = {}
+            codes = np.full(count, -1, dtype=np.int32)
+            for i, a in enumerate(records):
+                if key in a:
+                    enc = json.dumps(a[key], ensure_ascii=False, sort_keys=False, default=str)
+                    codes[i] = cats.setdefault(enc, len(cats))
+            off, data = _string_table(list(cats))
+            arrays[name + '_code'] = codes
+            arrays[name + '_cat_off'] = off
+            arrays[name + '_cat_data'] = data
+            spec[str(key)] = {'kind': 'json', 'col': name}
+    return spec
+
+
+def write_snapshot(g, path, source=None):
+    """Write `g` (undirected) to `path` atomically.
+
+    `source` (e.g. path and sha256 of the pickle it came from) is stored in
+    the header so readers can tell whether the snapshot is stale.
+    """
+    if g.is_directed() or g.is_multigraph():
+        raise ValueError('Solo se admiten grafos simples no dirigidos')
+    nodes = list(g.nodes())
+    ids = [str(n) for n in nodes]
+    if len(set(ids)) != len(ids):
+        raise ValueError('Los ids de nodo deben ser distintos como texto')
+    index = {n: i for i, n in enumerate(nodes)}
+
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    indices = []
+    slot_edge = []
+    edge_ids = {}
+    edge_attrs = []
+    for i, n in enumerate(nodes):
+        nbrs = g._adj[n]
+        for nbr, data in nbrs.items():
+            j = index[nbr]
+            key = (i, j) if i <= j else (j, i)
+            eid = edge_ids.get(key)
+            if eid is None:
+                eid = edge_ids[key] = len(edge_attrs)
+                edge_attrs.append(data)
+            indices.append(j)
+            slot_edge.append(eid)
+        indptr[i + 1] = len(indices)
+
+    arrays = {}
+    arrays['ids_off'], arrays['ids_data'] = _string_table(ids)
+    arrays['ids_sorted'] = np.array(sorted(range(len(ids)), key=lambda i: ids[i]), dtype=np.int32)
+    arrays['indptr'] = indptr
+    arrays['indices'] = np.array(indices, dtype=np.int32)
+    arrays['slot_edge'] = np.array(slot_edge, dtype=np.int32)
+    node_spec = _columns([g._node[n] for n in nodes], len(nodes), 'n', arrays)
+    edge_spec = _columns(edge_attrs, len(edge_attrs), 'e', arrays)
+
+    try:
+        graph_attrs = json.loads(json.dumps(g.graph, default=str))
+    except (TypeError, ValueError):
+        graph_attrs = {}
+
+    offset = 0
+    layout = {}
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        arrays[name] = arr
+        offset = -(-offset // _ALIGN) * _ALIGN
+        layout[name] = {'dtype': arr.dtype.str, 'shape': list(arr.shape), 'offset': offset}
+        offset += arr.nbytes
+    header = json.dumps({
+        'version': 1,
+        'num_nodes': len(nodes),
+        'num_edges': len(edge_attrs),
+        'graph': graph_attrs,
+        'source': source,
+        'arrays': layout,
+        'node_attrs': node_spec,
+        'edge_attrs': edge_spec,
+    }).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // _ALIGN) * _ALIGN
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(np.array([len(header)], dtype='<u8').tobytes())
+            f.write(header)
+            for name, arr in arrays.items():
+                f.seek(data_start + layout[name]['offset'])
+                f.write(arr.tobytes())
+            f.truncate(data_start + offset)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return path
+
+
+class _Snapshot:
+    """Typed views over the mapped file plus lazily decoded lookups."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        buf = np.memmap(self.path, dtype=np.uint8, mode='r')
+        if bytes(buf[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f'{self.path} no es un snapshot de grafo')
+        hlen = int(buf[len(MAGIC):len(MAGIC) + 8].view('<u8')[0])
+        hstart = len(MAGIC) + 8
+        self.header = json.loads(bytes(buf[hstart:hstart + hlen]).decode('utf-8'))
+        data_start = -(-(hstart + hlen) // _ALIGN) * _ALIGN
+        self.arrays = {}
+        for name, spec in self.header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape'])) if spec['shape'] else 1
+            start = data_start + spec['offset']
+            self.arrays[name] = buf[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+        self.n = self.header['num_nodes']
+        self.m = self.header['num_edges']
+        self._ids = [None] * self.n
+        self._index = {}
+        self._cats = {}
+        self._node_attrs = [None] * self.n
+        self._edge_attrs = [None] * self.m
+
+    def node_id(self, i):
+        s = self._ids[i]
+        if s is None:
+            off = self.arrays['ids_off']
+            s = self._ids[i] = bytes(self.arrays['ids_data'][off[i]:off[i + 1]]).decode('utf-8')
+        return s
+
+    def index_of(self, node):
+        i = self._index.get(node)
+        if i is not None:
+            return i
+        if not isinstance(node, str):
+            return None
+        order = self.arrays['ids_sorted']
+        pos = bisect_left(range(self.n), node, key=lambda k: self.node_id(int(order[k])))
+        if pos < self.n:
+            i = int(order[pos])
+            if self.node_id(i) == node:
+                self._index[node] = i
+                return i
+        return None
+
+    def _category(self, col, code):
+        cache = self._cats.get(col)
+        if cache is None:
+            cache = self._cats[col] = {}
+        v = cache.get(code)
+        if v is None and code not in cache:
+            off = self.arrays[col + '_cat_off']
+            raw = bytes(self.arrays[col + '_cat_data'][off[code]:off[code + 1]]).decode('utf-8')
+            v = cache[code] = json.loads(raw)
+        return v
+
+    def _category_table(self, col):
+        """Every value of a string table, sharing objects with _category()."""
+        cache = self._cats.setdefault(col, {})
+        off = self.arrays[col + '_cat_off'].tolist()
+        data = bytes(self.arrays[col + '_cat_data'])
+        for code in range(len(off) - 1):
+            if code not in cache:
+                cache[code] = json.loads(data[off[code]:off[code + 1]].decode('utf-8'))
+        return [cache[code] for code in range(len(off) - 1)]
+
+    def attrs(self, spec, i):
+        out = {}
+        for key, s in spec.items():
+            col = s['col']
+            if s['kind'] == 'num':
+                tag = self.arrays[col + '_tag'][i]
+                if tag == TAG_MISSING:
+                    continue
+                v = float(self.arrays[col + '_val'][i])
+                out[key] = int(v) if tag == TAG_INT else v
+            else:
+                code = int(self.arrays[col + '_code'][i])
+                if code >= 0:
+                    out[key] = self._category(col, code)
+        return out
+
+    def node_attrs(self, i):
+        d = self._node_attrs[i]
+        if d is None:
+            d = self._node_attrs[i] = self.attrs(self.header['node_attrs'], i)
+        return d
+
+    def edge_attrs(self, e):
+        d = self._edge_attrs[e]
+        if d is None:
+            d = self._edge_attrs[e] = self.attrs(self.header['edge_attrs'], e)
+        return d
+
+    def row(self, i):
+        """Plain {neighbor id: edge attrs} dict of node i."""
+        indptr = self.arrays['indptr']
+        a, b = int(indptr[i]), int(indptr[i + 1])
+        node_id, edge_attrs = self.node_id, self.edge_attrs
+        return {node_id(j): edge_attrs(e) for j, e in
+                zip(self.arrays['indices'][a:b].tolist(), self.arrays['slot_edge'][a:b].tolist())}
+
+    def _all_attrs(self, spec, cache):
+        """Fill `cache` (one dict per row) decoding whole columns at once."""
+        pendientes = [k for k, d in enumerate(cache) if d is None]
+        if not pendientes:
+            return cache
+        claves, columnas = list(spec), []
+        for s in spec.values():
+            col = s['col']
+            if s['kind'] == 'num':
+                vals = self.arrays[col + '_val'].tolist()
+                tags = self.arrays[col + '_tag'].tolist()
+                columnas.append([_FALTA if t == TAG_MISSING else int(v) if t == TAG_INT else v
+                                 for t, v in zip(tags, vals)])
+            else:
+                tabla = self._category_table(col) + [_FALTA]  # code -1 -> _FALTA
+                columnas.append([tabla[c] for c in self.arrays[col + '_code'].tolist()])
+        filas = list(zip(*columnas)) if columnas else [()] * len(cache)
+        for k in pendientes:
+            cache[k] = {c: v for c, v in zip(claves, filas[k]) if v is not _FALTA}
+        return cache
+
+    def decode_all(self):
+        """(node ids, node attr dicts, adjacency dict of dicts), fully decoded."""
+        off = self.arrays['ids_off'].tolist()
+        data = bytes(self.arrays['ids_data'])
+        ids = self._ids = [data[off[i]:off[i + 1]].decode('utf-8') for i in range(self.n)]
+        self._index = {n: i for i, n in enumerate(ids)}
+        nodos = self._all_attrs(self.header['node_attrs'], self._node_attrs)
+        aristas = self._all_attrs(self.header['edge_attrs'], self._edge_attrs)
+        indptr = self.arrays['indptr'].tolist()
+        vecinos = [ids[j] for j in self.arrays['indices'].tolist()]
+        slots = [aristas[e] for e in self.arrays['slot_edge'].tolist()]
+        adj = {ids[i]: dict(zip(vecinos[indptr[i]:indptr[i + 1]], slots[indptr[i]:indptr[i + 1]]))
+               for i in range(self.n)}
+        return ids, nodos, adj
+
+
+class _NodeMap(Mapping):
+    def __init__(self, snap):
+        self._s = snap
+
+    def __getitem__(self, node):
+        i = self._s.index_of(node)
+        if i is None:
+            raise KeyError(node)
+        return self._s.node_attrs(i)
+
+    def __contains__(self, node):
+        try:
+            return self._s.index_of(node) is not None
+        except TypeError:
+            return False
+
+    def __iter__(self):
+        return (self._s.node_id(i) for i in range(self._s.n))
+
+    def __len__(self):
+        return self._s.n
+
+
+class _AdjMap(Mapping):
+    """Adjacency rows decoded on first access and kept for the graph's life."""
+
+    def __init__(self, snap):
+        self._s = snap
+        self._rows = {}
+
+    def __getitem__(self, node):
+        row = self._rows.get(node)
+        if row is not None:
+            return row
+        i = self._s.index_of(node)
+        if i is None:
+            raise KeyError(node)
+        # a racing thread may decode the same row; keep whichever landed first
+        return self._rows.setdefault(node, self._s.row(i))
+
+    def __contains__(self, node):
+        return self._s.index_of(node) is not None
+
+    def __iter__(self):
+        return (self._s.node_id(i) for i in range(self._s.n))
+
+    def __len__(self):
+        return self._s.n
+
+
+class SnapshotGraph(nx.Graph):
+    """Read-only nx.Graph backed by a mapped snapshot file.
+
+    Without `snapshot` it behaves like a plain nx.Graph, which is what
+    NetworkX needs when it builds subgraph views or copies.
+    """
+
+    def __init__(self, incoming_graph_data=None, snapshot=None, **attr):
+        if snapshot is None:
+            super().__init__(incoming_graph_data, **attr)
+            return
+        super().__init__(**attr)
+        self.graph.update(snapshot.header.get('graph') or {})
+        self._snapshot = snapshot
+        self._node = _NodeMap(snapshot)
+        self._adj = _AdjMap(snapshot)
+        nx.freeze(self)
+
+    def materialize(self):
+        """Decode every node and row now and replace the lazy mappings with
+        plain dicts, so traversals cost what they do on an unpickled graph.
+        The arrays stay mapped; returns self."""
+        snap = getattr(self, '_snapshot', None)
+        if snap is None or isinstance(self._adj, dict):
+            return self
+        ids, nodos, adj = snap.decode_all()
+        self._node = dict(zip(ids, nodos))
+        self._adj = adj
+        return self
+
+    def number_of_nodes(self):
+        snap = getattr(self, '_snapshot', None)
+        return snap.n if snap is not None else super().number_of_nodes()
+
+    def number_of_edges(self, u=None, v=None):
+        snap = getattr(self, '_snapshot', None)
+        if snap is not None and u is None:
+            return snap.m
+        return super().number_of_edges(u, v)
+
+
+def open_snapshot(path, materialize: bool = False) -> SnapshotGraph:
+    g = SnapshotGraph(snapshot=_Snapshot(path))
+    return g.materialize() if materialize else g
+
+
+def snapshot_source(path):
+    """Return the `source` recorded in a snapshot header without mapping it."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} no es un snapshot de grafo')
+        hlen = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+        return json.loads(f.read(hlen).decode('utf-8')).get('source')
+
+
+def _firma(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def is_current(snapshot_path, src) -> bool:
+    """Whether the snapshot was built from `src` as it is now.
+
+    Same size and mtime as recorded means current; only when those differ
+    is `src` hashed and compared with the recorded sha256.
+    """
+    from codigo.dataset_store import file_digest
+    if not os.path.exists(snapshot_path):
+        return False
+    source = snapshot_source(snapshot_path) or {}
+    firma = _firma(src)
+    if all(source.get(k) == v for k, v in firma.items()):
+        return True
+    return source.get('sha256') == file_digest(str(src))
+
+
+def convert(src, dst=None):
+    """Build a snapshot from a pickled graph or a plantaciones CSV/XLSX."""
+    from codigo.dataset_store import file_digest
+    src = Path(src)
+    dst = Path(dst) if dst else src.with_suffix('.csrg')
+    source = dict(_firma(src), path=src.name, sha256=file_digest(str(src)))
+    if src.suffix.lower() in ('.csv', '.xlsx'):
+        from codigo.complex_grafo import build_visual_and_logical_graphs
+        g, _ = build_visual_and_logical_graphs(src)
+    else:
+        with open(src, 'rb') as f:
+            g = pickle.load(f)
+        if not isinstance(g, nx.Graph):
+            g = nx.Graph(g)
+    return write_snapshot(g, dst, source=source)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        print('Uso: python -m codigo.graph_snapshot <grafo.pkl|plantaciones.csv|plantaciones.xlsx> [salida.csrg]')
+        sys.exit(2)
+    out = convert(*sys.argv[1:])
+    print('Snapshot escrito en:', out)
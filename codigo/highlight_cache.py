@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Tuple
+
+# Applied after pyvis' drawGraph(): recolours the highlighted nodes/edges on
+# the vis DataSets instead of rendering a whole new network per species.
+_OVERLAY_SCRIPT = '''<script type="text/javascript">
+(function () {
+  var hl = %s;
+  function apply() {
+    if (typeof nodes === 'undefined' || !nodes || typeof edges === 'undefined' || !edges) {
+      return setTimeout(apply, 50);
+    }
+    nodes.update(hl.nodes.map(function (id) {
+      return {id: id, color: {background: hl.color, border: hl.color}};
+    }));
+    var keys = {};
+    hl.edges.forEach(function (e) { keys[e[0] + '\\u0000' + e[1]] = true; keys[e[1] + '\\u0000' + e[0]] = true; });
+    edges.update(edges.get({filter: function (e) { return keys[e.from + '\\u0000' + e.to]; }}).map(function (e) {
+      return {id: e.id, color: hl.color, width: 3};
+    }));
+  }
+  apply();
+})();
+</script>
+'''
+
+
+def overlay_html(base_html: str, nodos: Iterable[str], bordes: Iterable[Tuple[str, str]], color: str) -> str:
+    hl = {
+        'nodes': sorted(map(str, nodos)),
+        'edges': sorted([str(u), str(v)] for u, v in bordes),
+        'color': color,
+    }
+    # '</' inside the JSON would close the <script> element early
+    script = _OVERLAY_SCRIPT % json.dumps(hl, ensure_ascii=False).replace('</', '<\\/')
+    cut = base_html.rfind('</body>')
+    if cut < 0:
+        return base_html + script
+    return base_html[:cut] + script + base_html[cut:]
+
+
+class HighlightCache:
+    """Per-species highlight pages kept in a bounded on-disk LRU.
+
+    The base network is rendered with pyvis once per dataset and stored in
+    `Dataset.extras`; each species page is that HTML plus a small overlay
+    script. Recency is the file mtime, so gunicorn workers sharing the
+    directory agree on what to evict. Files are written atomically.
+    """
+
+    def __init__(self, out_dir, max_files: int = 64):
+        self.out_dir = Path(out_dir)
+        self.max_files = max(1, int(max_files))
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'base_renders': 0}
+
+    def _base_html(self, dataset) -> str:
+        from codigo.complex_grafo import render_pyvis_html
+        html = dataset.extras.get('highlight_base_html')
+        if html is None:
+            html = render_pyvis_html(dataset.G_viz)
+            dataset.extras['highlight_base_html'] = html
+            self._counters['base_renders'] += 1
+        return html
+
+    @staticmethod
+    def _nombre(dataset, especie: str) -> str:
+        clave = hashlib.sha1(str(especie).encode('utf-8')).hexdigest()[:16]
+        return f'{dataset.digest[:12]}_{clave}.html'
+
+    def _podar(self):
+        paginas = []
+        for p in self.out_dir.glob('*.html'):
+            try:
+                paginas.append((p.stat().st_mtime_ns, p))
+            except OSError:
+                pass
+        paginas.sort()
+        for _, p in paginas[:max(0, len(paginas) - self.max_files)]:
+            try:
+                p.unlink()
+                self._counters['evictions'] += 1
+            except OSError:
+                pass
+
+    def render(self, dataset, especie: str, nodos, bordes, color: str) -> Path:
+        from codigo.complex_grafo import write_text_atomic
+        from codigo.metrics import inc
+        path = self.out_dir / self._nombre(dataset, especie)
+        with self._lock:
+            try:
+                os.utime(path)
+                self._counters['hits'] += 1
+                inc('cache_requests_total', cache='highlights', result='hit')
+                return path
+            except FileNotFoundError:
+                pass
+            self._counters['misses'] += 1
+            inc('cache_requests_total', cache='highlights', result='miss')
+            write_text_atomic(path, overlay_html(self._base_html(dataset), nodos, bordes, color))
+            self._podar()
+            return path
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counters)
+        out['max_files'] = self.max_files
+        return out
@@ -0,0 +1,187 @@
+import glob
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+import pandas as pd
+
+CHUNK_ROWS = int(os.environ.get('INGEST_CHUNK_ROWS', '50000'))
+# processes building per-file partial datasets when a source has several files
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', '0')) or (os.cpu_count() or 1)
+# below this many source bytes the files are built in-process (a spawned
+# worker costs about a second of imports before it reads anything)
+INGEST_PARALLEL_MIN_BYTES = int(os.environ.get('INGEST_PARALLEL_MIN_BYTES', str(64 << 20)))
+# converted copies of spreadsheets, keyed by source path, mtime and size
+CACHE_DIR = os.environ.get('INGEST_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'mi-flask-app-ingest'))
+REQUIRED_COLUMNS = ('DISTRITO', 'ESPECIE', 'TITULAR', 'SUPERFICIE_PLANTACION')
+EXCEL_SUFFIXES = ('.xlsx', '.xlsm')
+SOURCE_SUFFIXES = ('.csv',) + EXCEL_SUFFIXES
+
+
+def es_excel(source) -> bool:
+    return isinstance(source, (str, os.PathLike)) and Path(source).suffix.lower() in EXCEL_SUFFIXES
+
+
+def es_multiple(source) -> bool:
+    """True for a directory or a glob pattern (several source files)."""
+    s = str(source)
+    return os.path.isdir(s) or (not os.path.isfile(s) and glob.has_magic(s))
+
+
+def expand_sources(source) -> List[str]:
+    """Files of a source: itself, the CSV/XLSX files of a directory, or the
+    matches of a glob. Sorted by path, which is also the merge order."""
+    s = str(source)
+    if os.path.isdir(s):
+        candidatos = [os.path.join(s, n) for n in os.listdir(s)]
+    elif not os.path.isfile(s) and glob.has_magic(s):
+        candidatos = glob.glob(s)
+    else:
+        return [os.path.abspath(s)] if os.path.isfile(s) else []
+    return sorted(os.path.abspath(p) for p in candidatos
+                  if os.path.isfile(p) and Path(p).suffix.lower() in SOURCE_SUFFIXES)
+
+
+def _validar(columnas):
+    for c in REQUIRED_COLUMNS:
+        if c not in columnas:
+            raise ValueError(f"Falta columna requerida: {c}")
+
+
+def iter_plantaciones(source, columns: Optional[Sequence[str]] = None,
+                      chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Plantaciones rows as DataFrames of at most `chunk_rows` rows.
+
+    `source` is a ';' CSV (path or binary file object), an .xlsx workbook or
+    a .parquet file. Only `columns` are loaded (those missing from the file
+    are skipped), every value is read as text so chunks agree on types, and
+    spreadsheets are read through a cached converted copy. Peak memory is
+    bounded by the chunk size, not by the file size.
+    """
+    if es_excel(source):
+        source = columnar_copy(source)
+    if isinstance(source, (str, os.PathLike)) and Path(source).suffix.lower() == '.parquet':
+        chunks = _iter_parquet(source, columns, chunk_rows)
+    else:
+        chunks = _iter_csv(source, columns, chunk_rows)
+    primero = True
+    for chunk in chunks:
+        if primero:
+            _validar(chunk.columns)
+            primero = False
+        yield chunk
+
+
+def _iter_csv(source, columns, chunk_rows):
+    usecols = None
+    if columns is not None:
+        pedidas = set(columns)
+        usecols = lambda c: c in pedidas  # noqa: E731
+    with pd.read_csv(source, sep=';', encoding='utf-8-sig', usecols=usecols, dtype=str,
+                     chunksize=chunk_rows) as reader:
+        yield from reader
+
+
+def _iter_parquet(path, columns, chunk_rows):
+    import pyarrow.parquet as pq
+    pf = pq.ParquetFile(path)
+    if columns is not None:
+        columns = [c for c in pf.schema_arrow.names if c in set(columns)]
+    for batch in pf.iter_batches(batch_size=chunk_rows, columns=columns):
+        yield batch.to_pandas()
+
+
+def _iter_excel(path, chunk_rows):
+    """Rows of the first sheet that has the required columns, as text."""
+    import openpyxl
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            filas = ws.iter_rows(values_only=True)
+            cabecera = next(filas, None)
+            if cabecera is None:
+                continue
+            cabecera = [str(c).strip() if c is not None else '' for c in cabecera]
+            if not all(c in cabecera for c in REQUIRED_COLUMNS):
+                continue
+            n = len(cabecera)
+            lote, emitidos = [], 0
+            for fila in filas:
+                if all(v is None for v in fila):
+                    continue
+                fila = list(fila[:n]) + [None] * (n - len(fila))
+                lote.append([None if v is None else str(v) for v in fila])
+                if len(lote) >= chunk_rows:
+                    yield pd.DataFrame(lote, columns=cabecera)
+                    lote, emitidos = [], emitidos + 1
+            if lote or not emitidos:
+                # a header-only sheet still yields its (empty) columns
+                yield pd.DataFrame(lote, columns=cabecera)
+            return
+        raise ValueError(f"Ninguna hoja tiene las columnas requeridas: {', '.join(REQUIRED_COLUMNS)}")
+    finally:
+        wb.close()
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def columnar_copy(path, cache_dir: str = CACHE_DIR) -> str:
+    """Path of a streamable copy of a spreadsheet, converting it if needed.
+
+    Parquet when pyarrow is installed, otherwise a ';' CSV (still read in
+    chunks with only the needed columns). The copy is reused while the
+    source's mtime and size are unchanged; older copies are removed.
+    """
+    path = os.path.abspath(str(path))
+    st = os.stat(path)
+    prefijo = f"{Path(path).stem}-{hashlib.sha1(path.encode('utf-8')).hexdigest()[:10]}-"
+    ext = '.parquet' if _has_pyarrow() else '.csv'
+    destino = os.path.join(cache_dir, f'{prefijo}{st.st_mtime_ns}-{st.st_size}{ext}')
+    if os.path.exists(destino):
+        return destino
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    os.close(fd)
+    try:
+        if ext == '.parquet':
+            _escribir_parquet(_iter_excel(path, CHUNK_ROWS), tmp)
+        else:
+            with open(tmp, 'w', encoding='utf-8', newline='') as f:
+                for i, chunk in enumerate(_iter_excel(path, CHUNK_ROWS)):
+                    chunk.to_csv(f, sep=';', header=i == 0, index=False, lineterminator='\n')
+        os.replace(tmp, destino)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    for nombre in os.listdir(cache_dir):
+        viejo = os.path.join(cache_dir, nombre)
+        if nombre.startswith(prefijo) and viejo != destino:
+            try:
+                os.remove(viejo)
+            except OSError:
+                pass
+    return destino
+
+
+def _escribir_parquet(chunks, out_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = pa.schema([(c, pa.string()) for c in chunk.columns])
+                writer = pq.ParquetWriter(out_path, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
@@ -0,0 +1,196 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+ERROR = 'error'
+SKIPPED = 'skipped'
+
+
+class Job:
+    """One background task and its progress through named phases."""
+
+    def __init__(self, kind: str, key: str, phases: Iterable[str], on_change: Callable[['Job'], None]):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.key = key
+        self.state = QUEUED
+        self.phase: Optional[str] = None
+        self.phases: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict(
+            (p, {'name': p, 'state': QUEUED, 'seconds': None}) for p in phases)
+        self.result: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._phase_t0 = None
+        self._on_change = on_change
+
+    def _close_phase(self, state: str):
+        if self.phase is not None and self.phases[self.phase]['state'] == RUNNING:
+            info = self.phases[self.phase]
+            info['state'] = state
+            info['seconds'] = round(time.perf_counter() - self._phase_t0, 4)
+
+    def set_phase(self, name: str):
+        """Mark `name` as running; the previous phase is closed as done."""
+        self._close_phase(DONE)
+        info = self.phases.setdefault(name, {'name': name, 'state': QUEUED, 'seconds': None})
+        info['state'] = RUNNING
+        self.phase = name
+        self._phase_t0 = time.perf_counter()
+        self._on_change(self)
+
+    def skip_phase(self, name: str):
+        info = self.phases.setdefault(name, {'name': name, 'state': QUEUED, 'seconds': None})
+        info['state'] = SKIPPED
+        self._on_change(self)
+
+    def _start(self):
+        self.state = RUNNING
+        self.started_at = time.time()
+        self._on_change(self)
+
+    def _finish(self, result=None, error=None):
+        self._close_phase(ERROR if error else DONE)
+        if error is None:
+            for info in self.phases.values():
+                if info['state'] == QUEUED:
+                    info['state'] = SKIPPED
+        self.result = result or {}
+        self.error = error
+        self.state = ERROR if error else DONE
+        self.finished_at = time.time()
+        self._on_change(self)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (DONE, ERROR)
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'phase': self.phase,
+            'phases': [dict(p) for p in self.phases.values()],
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'elapsed_seconds': round(end - (self.started_at or self.created_at), 4),
+            'pid': os.getpid(),
+        }
+
+
+class JobRunner:
+    """In-process thread pool for slow work started from requests.
+
+    `submit` returns immediately; a job with the same (kind, key) that is
+    still queued or running is returned instead of starting another one.
+    Each state change is also written to `status_dir` so a status request
+    served by a different gunicorn worker can still report it.
+    """
+
+    def __init__(self, max_workers: int = 2, keep: int = 200, status_dir=None):
+        self.max_workers = max_workers
+        self.keep = keep
+        self.status_dir = Path(status_dir) if status_dir else None
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_pid = None
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], Job] = {}
+        self._counters = {'submitted': 0, 'deduplicated': 0, 'done': 0, 'errors': 0}
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # threads do not survive fork: a pool created in the gunicorn master
+        # would be dead in the workers, so create it lazily per process
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def _persist(self, job: Job):
+        if self.status_dir is None:
+            return
+        try:
+            self.status_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.status_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(job.to_dict(), f)
+            os.replace(tmp, self.status_dir / f'{job.id}.json')
+        except OSError:
+            pass
+
+    def submit(self, kind: str, key: str, fn: Callable[[Job], Dict[str, Any]],
+               phases: Iterable[str] = ()) -> Tuple[Job, bool]:
+        """Queue `fn(job)`; returns (job, created)."""
+        with self._lock:
+            job = self._inflight.get((kind, key))
+            if job is not None:
+                self._counters['deduplicated'] += 1
+                return job, False
+            job = Job(kind, key, phases, self._persist)
+            self._jobs[job.id] = job
+            self._inflight[(kind, key)] = job
+            self._counters['submitted'] += 1
+            self._trim()
+            self._executor().submit(self._run, job, fn)
+        self._persist(job)
+        return job, True
+
+    def _run(self, job: Job, fn):
+        job._start()
+        try:
+            result = fn(job)
+        except Exception as e:
+            traceback.print_exc()
+            job._finish(error=str(e))
+        else:
+            job._finish(result=result)
+        with self._lock:
+            self._inflight.pop((job.kind, job.key), None)
+            self._counters['errors' if job.error else 'done'] += 1
+
+    def _trim(self):
+        while len(self._jobs) > self.keep:
+            viejo = next((j for j in self._jobs.values() if j.finished), None)
+            if viejo is None:
+                break
+            del self._jobs[viejo.id]
+            if self.status_dir is not None:
+                try:
+                    os.unlink(self.status_dir / f'{viejo.id}.json')
+                except OSError:
+                    pass
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.to_dict()
+        if self.status_dir is None or not job_id.isalnum():
+            return None
+        try:
+            with open(self.status_dir / f'{job_id}.json', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counters)
+            out['inflight'] = len(self._inflight)
+            out['tracked'] = len(self._jobs)
+        return out
@@ -0,0 +1,348 @@
+"""Counters, gauges and histograms exposed in the Prometheus text format.
+
+Each process keeps its series in memory and writes them to
+METRICS_DIR/<run>/<pid>-<token>.json (at most every METRICS_FLUSH_SECONDS,
+from the request hooks, and at exit), so the /metrics of any gunicorn
+worker can merge the files of all of them: counters and histograms are
+summed over every file of the run, dead workers included, so totals never
+go backwards when a worker is replaced; gauges are reported per live
+process with a `pid` label. A forked worker starts from empty series (the
+master's warmup stays in the master's file) and its own file, so a reused
+pid never overwrites an earlier one.
+
+A run is one server: gunicorn's master starts it (start_run) and its
+workers inherit the id through METRICS_RUN; any other process (dev server,
+bench, CLI) is a run of its own. Files of other runs are deleted once their
+process is gone. An empty METRICS_DIR keeps everything in-process.
+"""
+import atexit
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'mi-flask-app-metrics'))
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', '1'))
+PREFIX = 'miflask_'
+# seconds; the top buckets cover cold graph builds up to gunicorn's timeout
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+METRICAS: Dict[str, Tuple[str, str]] = {
+    'http_request_duration_seconds': (HISTOGRAM, 'Request latency by route, method and status.'),
+    'phase_duration_seconds': (HISTOGRAM, 'Time spent in named phases of request handling and dataset builds.'),
+    'cache_requests_total': (COUNTER, 'Cache lookups by cache and result (hit or miss).'),
+    'graph_nodes': (GAUGE, 'Nodes of the loaded graphs.'),
+    'graph_edges': (GAUGE, 'Edges of the loaded graphs.'),
+    'dataset_rows': (GAUGE, 'Plantation rows of the current plantaciones dataset.'),
+    'dataset_version': (GAUGE, 'Version number of the current plantaciones dataset.'),
+    'process_memory_bytes': (GAUGE, 'Memory of the process by kind (rss, pss, shared, private).'),
+}
+
+Etiquetas = Tuple[Tuple[str, str], ...]
+
+
+def _etiquetas(labels: Dict[str, object]) -> Etiquetas:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Registry:
+    """Thread-safe in-memory series of one process."""
+
+    def __init__(self, directory: Optional[str] = METRICS_DIR, flush_seconds: float = METRICS_FLUSH_SECONDS):
+        self.base = directory
+        self.flush_seconds = flush_seconds
+        self.run = os.environ.get('METRICS_RUN') or f'{os.getpid()}-{int(time.time())}'
+        self._lock = threading.Lock()
+        self._collectors: List[Callable[['Registry'], None]] = []
+        self._reset()
+
+    def _reset(self):
+        self._counters: Dict[Tuple[str, Etiquetas], float] = {}
+        self._gauges: Dict[Tuple[str, Etiquetas], float] = {}
+        # name, labels -> [count per bucket (+Inf last), sum]
+        self._histograms: Dict[Tuple[str, Etiquetas], list] = {}
+        self._pid = os.getpid()
+        self._archivo = f'{self._pid}-{uuid.uuid4().hex[:8]}.json'
+        self._dirty = False
+        self._last_flush = 0.0
+
+    @staticmethod
+    def _clave(nombre: str, tipo: str, labels) -> Tuple[str, Etiquetas]:
+        declarado = METRICAS.get(nombre)
+        if declarado is None or declarado[0] != tipo:
+            raise KeyError(f'Métrica {tipo} no declarada: {nombre}')
+        return nombre, _etiquetas(labels)
+
+    def inc(self, nombre: str, value: float = 1, **labels):
+        clave = self._clave(nombre, COUNTER, labels)
+        with self._lock:
+            self._counters[clave] = self._counters.get(clave, 0) + value
+            self._dirty = True
+
+    def set(self, nombre: str, value: float, **labels):
+        clave = self._clave(nombre, GAUGE, labels)
+        with self._lock:
+            self._gauges[clave] = value
+            self._dirty = True
+
+    def observe(self, nombre: str, value: float, **labels):
+        clave = self._clave(nombre, HISTOGRAM, labels)
+        i = bisect.bisect_left(BUCKETS, value)
+        with self._lock:
+            h = self._histograms.get(clave)
+            if h is None:
+                h = self._histograms[clave] = [[0] * (len(BUCKETS) + 1), 0.0]
+            h[0][i] += 1
+            h[1] += value
+            self._dirty = True
+
+    def add_collector(self, fn: Callable[['Registry'], None]):
+        """fn(registry) runs before every snapshot, to set gauges."""
+        self._collectors.append(fn)
+
+    def _collect(self):
+        for fn in self._collectors:
+            try:
+                fn(self)
+            except Exception:
+                pass
+
+    def snapshot(self) -> dict:
+        self._collect()
+        with self._lock:
+            return {
+                'pid': self._pid,
+                'counters': [[n, dict(l), v] for (n, l), v in self._counters.items()],
+                'gauges': [[n, dict(l), v] for (n, l), v in self._gauges.items()],
+                'histograms': [[n, dict(l), list(h[0]), h[1]] for (n, l), h in self._histograms.items()],
+            }
+
+    @property
+    def directory(self) -> Optional[str]:
+        return os.path.join(self.base, self.run) if self.base else None
+
+    def start_run(self, run: Optional[str] = None):
+        """Begin a new run (server start: old totals no longer apply); child
+        processes join it through METRICS_RUN."""
+        self.run = run or f'{os.getpid()}-{int(time.time())}'
+        os.environ['METRICS_RUN'] = self.run
+        self.prune()
+
+    def flush(self, force: bool = False):
+        """Write this process's series to its file (throttled unless `force`)."""
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if not force and (not self._dirty or now - self._last_flush < self.flush_seconds):
+            return
+        self._last_flush = now
+        self._dirty = False
+        data = self.snapshot()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f'.{self._pid}.', suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp, os.path.join(self.directory, self._archivo))
+        except OSError:
+            self._dirty = True
+
+    def snapshots(self) -> List[dict]:
+        """Snapshots of every process of this run (this one fresh)."""
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush(force=True)
+        out = []
+        try:
+            nombres = os.listdir(self.directory)
+        except OSError:
+            return [self.snapshot()]
+        for nombre in nombres:
+            if not nombre.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, nombre), encoding='utf-8') as f:
+                    out.append(json.load(f))
+            except (OSError, ValueError):
+                # removed or replaced while listing
+                continue
+        self.prune()
+        return out
+
+    def prune(self):
+        """Delete the files of other runs whose process has exited, and
+        their directories once empty."""
+        if not self.base or not os.path.isdir(self.base):
+            return
+        for run in os.listdir(self.base):
+            ruta = os.path.join(self.base, run)
+            if run == self.run:
+                continue
+            if not os.path.isdir(ruta):
+                # a <pid>.json of the layout before runs
+                _borrar_si_termino(ruta)
+                continue
+            for nombre in os.listdir(ruta):
+                _borrar_si_termino(os.path.join(ruta, nombre))
+            try:
+                os.rmdir(ruta)
+            except OSError:
+                # still has files of a live process
+                pass
+
+    def close(self):
+        # at exit: whatever changed since the last throttled write
+        if self._dirty:
+            self.flush(force=True)
+
+    def after_fork(self):
+        # the parent's lock may have been held by another thread at fork time
+        self._lock = threading.Lock()
+        self._reset()
+
+
+def _pid_de(nombre: str) -> Optional[int]:
+    # <pid>-<token>.json, or .<pid>.<random>.tmp while being written
+    try:
+        return int(nombre.lstrip('.').split('-')[0].split('.')[0])
+    except ValueError:
+        return None
+
+
+def _vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _borrar_si_termino(ruta: str):
+    pid = _pid_de(os.path.basename(ruta))
+    if pid is not None and _vivo(pid):
+        return
+    try:
+        os.unlink(ruta)
+    except OSError:
+        pass
+
+
+def merge(snapshots: Iterable[dict]):
+    """(counters, gauges, histograms) summed over snapshots; gauges of live pids only."""
+    counters: Dict[Tuple[str, Etiquetas], float] = {}
+    gauges: Dict[Tuple[str, Etiquetas], float] = {}
+    histograms: Dict[Tuple[str, Etiquetas], list] = {}
+    for snap in snapshots:
+        for n, labels, v in snap.get('counters', []):
+            clave = (n, _etiquetas(labels))
+            counters[clave] = counters.get(clave, 0) + v
+        if _vivo(snap['pid']):
+            for n, labels, v in snap.get('gauges', []):
+                gauges[(n, _etiquetas(dict(labels, pid=snap['pid'])))] = v
+        for n, labels, cuentas, suma in snap.get('histograms', []):
+            clave = (n, _etiquetas(labels))
+            h = histograms.get(clave)
+            if h is None or len(h[0]) != len(cuentas):
+                histograms[clave] = [list(cuentas), suma]
+            else:
+                h[0] = [a + b for a, b in zip(h[0], cuentas)]
+                h[1] += suma
+    return counters, gauges, histograms
+
+
+def _valor(v: float) -> str:
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+def _labels_text(labels) -> str:
+    if not labels:
+        return ''
+    esc = lambda s: str(s).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+    return '{' + ','.join(f'{k}="{esc(v)}"' for k, v in labels) + '}'
+
+
+def render(snapshots: Iterable[dict]) -> str:
+    """Prometheus text exposition format (0.0.4) of the merged snapshots."""
+    counters, gauges, histograms = merge(snapshots)
+    por_nombre: Dict[str, list] = {}
+    for series in (counters, gauges, histograms):
+        for (n, labels), v in series.items():
+            por_nombre.setdefault(n, []).append((labels, v))
+    lineas = []
+    for n in sorted(por_nombre):
+        tipo, ayuda = METRICAS.get(n, ('untyped', ''))
+        nombre = PREFIX + n
+        lineas.append(f'# HELP {nombre} {ayuda}')
+        lineas.append(f'# TYPE {nombre} {tipo}')
+        for labels, v in sorted(por_nombre[n]):
+            if tipo != HISTOGRAM:
+                lineas.append(f'{nombre}{_labels_text(labels)} {_valor(v)}')
+                continue
+            cuentas, suma = v
+            acumulado = 0
+            for le, c in zip(BUCKETS + (float('inf'),), cuentas):
+                acumulado += c
+                lineas.append(f'{nombre}_bucket{_labels_text(labels + (("le", _valor(le)),))} {acumulado}')
+            lineas.append(f'{nombre}_sum{_labels_text(labels)} {_valor(suma)}')
+            lineas.append(f'{nombre}_count{_labels_text(labels)} {acumulado}')
+    return '\n'.join(lineas) + '\n'
+
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+set_gauge = REGISTRY.set
+observe = REGISTRY.observe
+flush = REGISTRY.flush
+
+
+@contextmanager
+def fase(nombre: str):
+    """Time the block into phase_duration_seconds{phase=nombre}."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('phase_duration_seconds', time.perf_counter() - t0, phase=nombre)
+
+
+class Fases:
+    """Phase durations measured where they cannot be observed directly (pool
+    workers), reported later with observar_fases()."""
+
+    def __init__(self):
+        self.segundos: Dict[str, float] = {}
+
+    @contextmanager
+    def fase(self, nombre: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.segundos[nombre] = self.segundos.get(nombre, 0.0) + time.perf_counter() - t0
+
+
+def observar_fases(segundos: Dict[str, float]):
+    for nombre, s in segundos.items():
+        observe('phase_duration_seconds', s, phase=nombre)
+
+
+def render_all() -> str:
+    return render(REGISTRY.snapshots())
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=REGISTRY.after_fork)
+atexit.register(REGISTRY.close)
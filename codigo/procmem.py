@@ -0,0 +1,31 @@
+import os
+import resource
+
+
+def memory_usage():
+    """RSS/PSS/shared/private sizes (bytes) of the current process.
+
+    PSS and the shared/private split come from /proc/self/smaps_rollup
+    (Linux); elsewhere only the peak RSS from getrusage is reported.
+    """
+    out = {'pid': os.getpid()}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            campos = {}
+            for linea in f:
+                partes = linea.split()
+                if len(partes) >= 3 and partes[-1] == 'kB':
+                    campos[partes[0].rstrip(':')] = int(partes[1]) * 1024
+        out['rss'] = campos.get('Rss')
+        out['pss'] = campos.get('Pss')
+        out['shared'] = campos.get('Shared_Clean', 0) + campos.get('Shared_Dirty', 0)
+        out['private'] = campos.get('Private_Clean', 0) + campos.get('Private_Dirty', 0)
+    except OSError:
+        # ru_maxrss is KiB on Linux, bytes on macOS; only used as a fallback
+        out['rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return out
+
+
+def format_memory(m):
+    mib = lambda v: f'{v / 2**20:.1f}MiB' if v is not None else '-'
+    return ' '.join(f'{k}={mib(m.get(k))}' for k in ('rss', 'pss', 'shared', 'private') if k in m)
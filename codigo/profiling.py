@@ -0,0 +1,211 @@
+"""Opt-in profiles of single requests or jobs, kept in a bounded directory.
+
+Two modes:
+- 'sample': a thread reads the profiled thread's stack every `interval`
+  seconds; low overhead, writes <id>.collapsed (one `a;b;c count` line per
+  stack, for flamegraph.pl or speedscope).
+- 'cprofile': cProfile on the profiled thread, written as <id>.pstats
+  (python -m pstats, snakeviz), plus the sampler's .collapsed (its times
+  include cProfile's own overhead).
+
+Every profile also gets <id>.json with its tags (route, parameters,
+duration...). Only the newest `max_profiles` are kept. One cProfile capture
+runs at a time (Python 3.12+ allows a single profiler per process); a
+concurrent request asking for one is sampled instead.
+"""
+import cProfile
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+CPROFILE = 'cprofile'
+SAMPLE = 'sample'
+MODES = (CPROFILE, SAMPLE)
+FORMATS = {'json': 'application/json', 'pstats': 'application/octet-stream', 'collapsed': 'text/plain'}
+
+
+class _Sampler(threading.Thread):
+    """Collapsed stacks of one thread, sampled until stop()."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            pila = []
+            while frame is not None:
+                code = frame.f_code
+                pila.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(pila))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class Capture:
+    """One running profile; created by Profiler.start()."""
+
+    def __init__(self, mode: str, interval: float, tags: Dict[str, Any]):
+        self.created_at = time.time()
+        # sorts by creation time; rotation relies on it
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.created_at))
+        self.id = f'{stamp}{int(self.created_at * 1e6) % 1000000:06d}-{uuid.uuid4().hex[:6]}'
+        self.mode = mode
+        self.tags = dict(tags)
+        self._profile = cProfile.Profile() if mode == CPROFILE else None
+        self._sampler = _Sampler(threading.get_ident(), interval)
+        self._t0 = time.perf_counter()
+        self.seconds: Optional[float] = None
+
+    def _start(self):
+        self._sampler.start()
+        if self._profile is not None:
+            self._profile.enable()
+        self._t0 = time.perf_counter()
+
+    def _stop(self):
+        self.seconds = time.perf_counter() - self._t0
+        if self._profile is not None:
+            self._profile.disable()
+        self._sampler.stop()
+
+
+class Profiler:
+    def __init__(self, out_dir, max_profiles: int = 50, interval: float = 0.005, sample_rate: float = 0.0):
+        self.out_dir = Path(out_dir)
+        self.max_profiles = max(1, int(max_profiles))
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self._cprofile_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._counters = {'captured': 0, 'downgraded': 0, 'evicted': 0}
+
+    def choose(self, header: Optional[str]) -> Optional[str]:
+        """Mode for a request of a profiled route: from its X-Profile header,
+        else by sampling."""
+        if header:
+            header = header.strip().lower()
+            return header if header in MODES else CPROFILE
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return SAMPLE
+        return None
+
+    def start(self, mode: str, wait: float = 0, **tags) -> Capture:
+        """Begin profiling the calling thread; a cProfile capture waits up to
+        `wait` seconds for a running one to finish before falling back to sampling."""
+        if mode == CPROFILE and not (self._cprofile_lock.acquire(timeout=wait) if wait > 0
+                                     else self._cprofile_lock.acquire(blocking=False)):
+            mode = SAMPLE
+            with self._lock:
+                self._counters['downgraded'] += 1
+        capture = Capture(mode, self.interval, tags)
+        try:
+            capture._start()
+        except BaseException:
+            if mode == CPROFILE:
+                self._cprofile_lock.release()
+            raise
+        return capture
+
+    def stop(self, capture: Capture, save: bool = True, **tags) -> Optional[Dict[str, Any]]:
+        """End the capture and write its files; returns its metadata."""
+        try:
+            capture._stop()
+        finally:
+            if capture.mode == CPROFILE:
+                self._cprofile_lock.release()
+        if not save:
+            return None
+        capture.tags.update(tags)
+        meta = {
+            'id': capture.id,
+            'mode': capture.mode,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(capture.created_at)),
+            'duration_ms': round(capture.seconds * 1000, 3),
+            'samples': sum(capture._sampler.stacks.values()),
+            'pid': os.getpid(),
+            'tags': capture.tags,
+            'formats': ['json', 'collapsed'] + (['pstats'] if capture._profile is not None else []),
+        }
+        from codigo.complex_grafo import write_text_atomic
+        try:
+            if capture._profile is not None:
+                self.out_dir.mkdir(parents=True, exist_ok=True)
+                capture._profile.dump_stats(str(self.out_dir / f'{capture.id}.pstats'))
+            write_text_atomic(self.out_dir / f'{capture.id}.collapsed',
+                              ''.join(f'{pila} {n}\n' for pila, n in capture._sampler.stacks.most_common()))
+            # metadata last: a profile is listed only once its files exist
+            write_text_atomic(self.out_dir / f'{capture.id}.json', json.dumps(meta, ensure_ascii=False, default=str))
+        except OSError:
+            return None
+        with self._lock:
+            self._counters['captured'] += 1
+            self._prune()
+        return meta
+
+    @contextmanager
+    def profile(self, mode: str, wait: float = 0, **tags):
+        capture = self.start(mode, wait, **tags)
+        try:
+            yield capture
+        finally:
+            self.stop(capture)
+
+    def wrap(self, fn, mode: str, **tags):
+        """fn profiled whenever it runs (e.g. inside a background job)."""
+        def profiled(*args, **kwargs):
+            # the request that queued fn may still hold the cProfile slot
+            with self.profile(mode, wait=5, **tags):
+                return fn(*args, **kwargs)
+        return profiled
+
+    def _prune(self):
+        metas = sorted(self.out_dir.glob('*.json'))
+        for meta in metas[:max(0, len(metas) - self.max_profiles)]:
+            for fmt in FORMATS:
+                try:
+                    meta.with_suffix(f'.{fmt}').unlink()
+                except OSError:
+                    pass
+            self._counters['evicted'] += 1
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Metadata of the kept profiles, newest first."""
+        out = []
+        for meta in sorted(self.out_dir.glob('*.json'), reverse=True):
+            try:
+                with open(meta, encoding='utf-8') as f:
+                    out.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return out
+
+    def path_for(self, profile_id: str, fmt: str) -> Optional[Path]:
+        if fmt not in FORMATS or not profile_id.replace('-', '').isalnum():
+            return None
+        path = self.out_dir / f'{profile_id}.{fmt}'
+        return path if path.exists() else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counters)
+        out['max_profiles'] = self.max_profiles
+        out['sample_rate'] = self.sample_rate
+        return out
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+HIT = 'hit'
+MISS = 'miss'
+COALESCED = 'coalesced'
+
+
+class _Flight:
+    """A computation in progress; identical requests wait for it."""
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class ResponseCache:
+    """Bounded cache of computed responses: LRU with a TTL and a byte budget.
+
+    Keys must carry everything the response depends on, data versions
+    included, so a reload makes old entries unreachable (they age out or are
+    dropped by clear()). Concurrent misses on the same key compute once
+    (single-flight): the others wait for that result, or its exception.
+    Failed computations are not cached.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 2**20, ttl: float = 300.0):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.ttl = float(ttl)
+        self._lock = threading.Lock()
+        # key -> (expires_at, size, value)
+        self._entries: 'OrderedDict[Hashable, Tuple[float, int, Any]]' = OrderedDict()
+        self._bytes = 0
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._counters = {'hits': 0, 'misses': 0, 'coalesced': 0, 'expired': 0, 'invalid': 0,
+                          'evictions': 0, 'too_large': 0, 'errors': 0}
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _lookup(self, key, valid) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, _, value = entry
+        if expires_at < time.monotonic():
+            self._drop(key)
+            self._counters['expired'] += 1
+            return False, None
+        if valid is not None and not valid(value):
+            self._drop(key)
+            self._counters['invalid'] += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], size: Callable[[Any], int] = len,
+                       valid: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, str]:
+        """(value, HIT / MISS / COALESCED) for `key`, calling compute() on a miss.
+
+        `size(value)` is its cost in bytes against the budget; `valid(value)`
+        can reject a cached value whose external state went away.
+        """
+        with self._lock:
+            found, value = self._lookup(key, valid)
+            if found:
+                self._counters['hits'] += 1
+                return value, HIT
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._counters['misses'] += 1
+            else:
+                self._counters['coalesced'] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, COALESCED
+        try:
+            value = compute()
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._counters['errors'] += 1
+                self._flights.pop(key, None)
+            flight.done.set()
+            raise
+        flight.value = value
+        with self._lock:
+            self._flights.pop(key, None)
+            self._store(key, value, size(value))
+        flight.done.set()
+        return value, MISS
+
+    def _store(self, key, value, size: int):
+        if size > self.max_bytes:
+            self._counters['too_large'] += 1
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self._counters['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counters)
+            out['entries'] = len(self._entries)
+            out['bytes'] = self._bytes
+        lookups = out['hits'] + out['misses'] + out['coalesced']
+        out['hit_rate'] = (out['hits'] + out['coalesced']) / lookups if lookups else None
+        out.update(max_entries=self.max_entries, max_bytes=self.max_bytes, ttl=self.ttl)
+        return out
@@ -0,0 +1,408 @@
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# Ranking tiers (lower is better)
+TIER_EXACT = 0
+TIER_PREFIX = 1
+TIER_WORD_PREFIX = 2
+TIER_SUBSTRING = 3
+TIER_FUZZY = 4
+
+_TOP_PER_NODE = 64
+_MAX_RANKED = 200
+_FUZZY_CANDIDATES = 40
+
+
+def fold(text) -> str:
+    """Accent- and case-insensitive form used for every key and query."""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _word_starts(key: str) -> List[int]:
+    return [m.start() for m in re.finditer(r"[0-9a-z]+", key)]
+
+
+def _trigrams(text: str) -> List[str]:
+    return [text[i:i + 3] for i in range(len(text) - 2)]
+
+
+def _transpositions(q: str) -> List[str]:
+    """q with each pair of adjacent characters swapped."""
+    return [q[:i] + q[i + 1] + q[i] + q[i + 2:] for i in range(len(q) - 1) if q[i] != q[i + 1]]
+
+
+def _substring_distance(q: str, text: str, bound: int) -> int:
+    """Minimum edit distance between q and any substring of text (Sellers),
+    counting a swap of adjacent characters as one edit (optimal string
+    alignment)."""
+    prev2 = None
+    prev = [0] * (len(text) + 1)
+    for i, qc in enumerate(q, 1):
+        cur = [i] + [0] * len(text)
+        best = cur[0]
+        for j, tc in enumerate(text, 1):
+            if qc == tc:
+                d = prev[j - 1]
+            else:
+                d = 1 + min(prev[j], cur[j - 1], prev[j - 1])
+                if prev2 is not None and j > 1 and qc == text[j - 2] and q[i - 2] == tc and d > prev2[j - 2] + 1:
+                    d = prev2[j - 2] + 1
+            cur[j] = d
+            if d < best:
+                best = d
+        if best > bound:
+            return bound + 1
+        prev2, prev = prev, cur
+    return min(prev)
+
+
+class _TrieNode:
+    __slots__ = ('hijos', 'top', 'truncados')
+
+    def __init__(self):
+        self.hijos: Dict[str, '_TrieNode'] = {}
+        self.top = []
+        # tipos with more entries under this prefix than `top` keeps
+        self.truncados: FrozenSet[str] = frozenset()
+
+    def copia(self) -> '_TrieNode':
+        nodo = _TrieNode()
+        nodo.hijos = dict(self.hijos)
+        nodo.top = list(self.top)
+        nodo.truncados = self.truncados
+        return nodo
+
+
+class _Trie:
+    """Prefix trie whose nodes keep their best-ranked entry ids precomputed
+    (up to _TOP_PER_NODE of each tipo, so filtering by tipo loses nothing)."""
+
+    def __init__(self):
+        self.raiz = _TrieNode()
+        # after copia(): nodes this trie may modify (the rest are shared and
+        # copied on first write) and the ones written since finalizar()
+        self._propios: Optional[Dict[int, _TrieNode]] = None
+        self._sucios: Optional[List[_TrieNode]] = None
+
+    def copia(self) -> '_Trie':
+        t = _Trie()
+        t.raiz = self.raiz
+        t._propios, t._sucios = {}, []
+        return t
+
+    def _propio(self, nodo: _TrieNode) -> _TrieNode:
+        if self._propios is None or id(nodo) in self._propios:
+            return nodo
+        nodo = nodo.copia()
+        self._propios[id(nodo)] = nodo
+        self._sucios.append(nodo)
+        return nodo
+
+    def insertar(self, key: str, entry_id: int):
+        nodo = self.raiz = self._propio(self.raiz)
+        for c in key:
+            hijo = nodo.hijos.get(c)
+            if hijo is None:
+                hijo = _TrieNode()
+                if self._propios is not None:
+                    self._propios[id(hijo)] = hijo
+                    self._sucios.append(hijo)
+            else:
+                hijo = self._propio(hijo)
+            nodo.hijos[c] = hijo
+            nodo = hijo
+            nodo.top.append(entry_id)
+
+    def finalizar(self, rank_key, tipo_de):
+        # a copy only re-ranks the nodes it wrote
+        if self._sucios is None:
+            pila = [self.raiz]
+        else:
+            pila, self._sucios = self._sucios, []
+        while pila:
+            nodo = pila.pop()
+            if nodo.top:
+                por_tipo: Dict[str, int] = {}
+                top, truncados = [], set()
+                for eid in sorted(set(nodo.top), key=rank_key):
+                    tipo = tipo_de(eid)
+                    if por_tipo.get(tipo, 0) < _TOP_PER_NODE:
+                        por_tipo[tipo] = por_tipo.get(tipo, 0) + 1
+                        top.append(eid)
+                    else:
+                        truncados.add(tipo)
+                nodo.top, nodo.truncados = top, frozenset(truncados | nodo.truncados)
+            if self._sucios is None:
+                pila.extend(nodo.hijos.values())
+
+    def buscar(self, prefijo: str) -> _TrieNode:
+        nodo = self.raiz
+        for c in prefijo:
+            nodo = nodo.hijos.get(c)
+            if nodo is None:
+                return _VACIO
+        return nodo
+
+
+_VACIO = _TrieNode()
+
+
+class SearchIndex:
+    """Autocomplete over species, places, holders and node labels.
+
+    Lookups go through two tries (whole label and word starts) for prefixes,
+    a trigram index for substrings, and a bounded edit-distance pass over
+    trigram candidates for typos (substitutions, insertions, deletions and
+    swaps of adjacent characters). Tipos are compared folded, like labels.
+    Ranked results are cut to _MAX_RANKED after the tipo filter; `total` is
+    then a lower bound and `total_exact` is False.
+    """
+
+    def __init__(self, entries: Iterable[dict] = (), cache_size: int = 1024):
+        self.entries: List[dict] = []
+        self._claves: List[str] = []
+        self._tipos: List[str] = []
+        self._vistos: Dict[Tuple[str, str, Optional[str]], int] = {}
+        self._trie_label = _Trie()
+        self._trie_palabra = _Trie()
+        self._gramas: Dict[str, List[int]] = {}
+        # after extendido(): trigrams whose lists are not shared any more
+        self._gramas_propios: Optional[set] = None
+        self._cache: 'OrderedDict[Tuple, Tuple[List[Tuple[int, int]], bool]]' = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        for e in entries:
+            self.agregar(e['label'], e['tipo'], e.get('node'), e.get('weight', 1))
+        self.finalizar()
+
+    def agregar(self, label, tipo: str, node=None, weight: float = 1):
+        label = str(label).strip()
+        if not label:
+            return
+        clave = fold(label)
+        ident = (clave, tipo, None if node is None else str(node))
+        if ident in self._vistos:
+            eid = self._vistos[ident]
+            # entry dicts may be shared with the index this one was copied from
+            self.entries[eid] = dict(self.entries[eid], weight=self.entries[eid]['weight'] + weight)
+            if self._gramas_propios is None:
+                return
+            # after extendido() the new weight re-ranks the nodes on its paths
+        else:
+            eid = len(self.entries)
+            self._vistos[ident] = eid
+            self.entries.append({'label': label, 'tipo': tipo, 'node': ident[2], 'weight': weight})
+            self._claves.append(clave)
+            self._tipos.append(fold(tipo))
+            for g in set(_trigrams(clave)):
+                lista = self._gramas.get(g)
+                if lista is None or (self._gramas_propios is not None and g not in self._gramas_propios):
+                    lista = self._gramas[g] = list(lista or ())
+                    if self._gramas_propios is not None:
+                        self._gramas_propios.add(g)
+                lista.append(eid)
+        self._trie_label.insertar(clave, eid)
+        for pos in _word_starts(clave)[1:]:
+            self._trie_palabra.insertar(clave[pos:], eid)
+
+    def extendido(self, entries: Iterable[dict]) -> 'SearchIndex':
+        """Copy with `entries` added (weights of existing ones summed), leaving
+        this index unchanged. Shares what the new keys do not touch: trie
+        nodes are copied along their paths only, and only those are
+        re-ranked, so the cost follows the new entries, not the index."""
+        otro = SearchIndex.__new__(SearchIndex)
+        otro.entries = list(self.entries)
+        otro._claves = list(self._claves)
+        otro._tipos = list(self._tipos)
+        otro._vistos = dict(self._vistos)
+        otro._trie_label = self._trie_label.copia()
+        otro._trie_palabra = self._trie_palabra.copia()
+        otro._gramas = dict(self._gramas)
+        otro._cache = OrderedDict()
+        otro._cache_size = self._cache_size
+        otro._lock = threading.Lock()
+        otro._gramas_propios = set()
+        for e in entries:
+            otro.agregar(e['label'], e['tipo'], e.get('node'), e.get('weight', 1))
+        otro.finalizar()
+        return otro
+
+    def _rank_key(self, eid: int):
+        e = self.entries[eid]
+        return (-e['weight'], len(self._claves[eid]), self._claves[eid])
+
+    def finalizar(self):
+        tipo_de = self._tipos.__getitem__
+        self._trie_label.finalizar(self._rank_key, tipo_de)
+        self._trie_palabra.finalizar(self._rank_key, tipo_de)
+        with self._lock:
+            self._cache.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _candidatos_substring(self, q: str) -> List[int]:
+        gramas = set(_trigrams(q))
+        listas = sorted((self._gramas.get(g, ()) for g in gramas), key=len)
+        if not listas or not listas[0]:
+            return []
+        comunes = set(listas[0])
+        for lst in listas[1:]:
+            comunes.intersection_update(lst)
+            if not comunes:
+                return []
+        return [eid for eid in comunes if q in self._claves[eid]]
+
+    def _candidatos_fuzzy(self, q: str, max_typos: int, tipos: Optional[FrozenSet[str]]) -> Tuple[List[Tuple[int, int]], bool]:
+        """(entry, distance) pairs within max_typos, and whether every
+        candidate was checked."""
+        # an edit breaks up to three trigrams, a swap up to four; a query too
+        # short to keep one in common is also looked up with each swap applied
+        n_gramas = len(set(_trigrams(q)))
+        minimo = max(1, n_gramas - 4 * max_typos)
+        variantes = [q] + (_transpositions(q) if n_gramas <= 4 * max_typos else [])
+        conteo: Dict[int, int] = {}
+        for variante in variantes:
+            local: Dict[int, int] = {}
+            for g in set(_trigrams(variante)):
+                for eid in self._gramas.get(g, ()):
+                    local[eid] = local.get(eid, 0) + 1
+            for eid, c in local.items():
+                if c > conteo.get(eid, 0):
+                    conteo[eid] = c
+        candidatos = [eid for eid, c in conteo.items()
+                      if c >= minimo and (tipos is None or self._tipos[eid] in tipos)]
+        candidatos.sort(key=lambda eid: -conteo[eid])
+        out = []
+        for eid in candidatos[:_FUZZY_CANDIDATES]:
+            d = _substring_distance(q, self._claves[eid], max_typos)
+            if d <= max_typos:
+                out.append((eid, d))
+        return out, len(candidatos) <= _FUZZY_CANDIDATES
+
+    def _ranked(self, q: str, tipos: Optional[FrozenSet[str]]) -> Tuple[List[Tuple[int, int]], bool]:
+        """(ranked (entry, tier) pairs of the tipos, whether they are all the matches)."""
+        clave = (q, tipos)
+        with self._lock:
+            hit = self._cache.get(clave)
+            if hit is not None:
+                self._cache.move_to_end(clave)
+                return hit
+        tiers: Dict[int, int] = {}
+        exacto = True
+
+        def add(eids, tier):
+            for eid in eids:
+                if tipos is not None and self._tipos[eid] not in tipos:
+                    continue
+                if eid not in tiers or tiers[eid] > tier:
+                    tiers[eid] = tier
+
+        for trie in (self._trie_label, self._trie_palabra):
+            nodo = trie.buscar(q)
+            # from 3 characters the substring pass finds every prefix match too
+            if len(q) < 3 and nodo.truncados and (tipos is None or nodo.truncados & tipos):
+                exacto = False
+            if trie is self._trie_label:
+                for eid in nodo.top:
+                    add((eid,), TIER_EXACT if self._claves[eid] == q else TIER_PREFIX)
+            else:
+                add(nodo.top, TIER_WORD_PREFIX)
+        if len(q) >= 3:
+            add(self._candidatos_substring(q), TIER_SUBSTRING)
+            # typo-tolerant pass only when exact matching found nothing
+            if not tiers and len(q) >= 4 and not q.isdigit():
+                max_typos = 1 if len(q) <= 8 else 2
+                encontrados, completo = self._candidatos_fuzzy(q, max_typos, tipos)
+                exacto = exacto and completo
+                for eid, d in encontrados:
+                    add((eid,), TIER_FUZZY + d - 1 if d else TIER_SUBSTRING)
+
+        ranked = sorted(tiers.items(), key=lambda it: (it[1],) + self._rank_key(it[0]))
+        if len(ranked) > _MAX_RANKED:
+            ranked, exacto = ranked[:_MAX_RANKED], False
+        with self._lock:
+            self._cache[clave] = (ranked, exacto)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return ranked, exacto
+
+    def buscar(self, query, limit: int = 10, offset: int = 0, tipos: Optional[Iterable[str]] = None) -> dict:
+        q = fold(query or '')
+        if not q:
+            return {'total': 0, 'total_exact': True, 'results': []}
+        ranked, exacto = self._ranked(q, frozenset(map(fold, tipos)) if tipos else None)
+        page = ranked[offset:offset + limit]
+        return {
+            'total': len(ranked),
+            'total_exact': exacto,
+            'results': [dict(self.entries[eid], tier=tier) for eid, tier in page],
+        }
+
+    def coincidencias(self, query, tipos: Optional[Iterable[str]] = None) -> List[dict]:
+        """Every entry whose label contains the query, in insertion order,
+        unranked and uncapped."""
+        q = fold(query or '')
+        if not q:
+            return []
+        if len(q) >= 3:
+            eids = sorted(self._candidatos_substring(q))
+        else:
+            # no trigram to look up; the folded keys are still cheaper to scan
+            eids = [eid for eid, clave in enumerate(self._claves) if q in clave]
+        tipos = set(map(fold, tipos)) if tipos else None
+        return [self.entries[eid] for eid in eids if tipos is None or self._tipos[eid] in tipos]
+
+
+def build_graph_search_index(g) -> SearchIndex:
+    """Index the node labels of the plantaciones graph by category: the node's
+    folded tipo ('Ubicación' -> 'ubicacion'), plus 'distrito', 'provincia'
+    and 'departamento' for the parts of each location."""
+    idx = SearchIndex()
+    for n, attrs in g.nodes(data=True):
+        attrs = attrs if isinstance(attrs, dict) else {}
+        tipo = str(attrs.get('tipo', attrs.get('type', 'Nodo')))
+        label = attrs.get('label') or attrs.get('nombre') or attrs.get('titulo') or n
+        peso = 1 + g.degree(n)
+        categoria = fold(tipo)
+        idx.agregar(label, categoria, node=n, weight=peso)
+        if categoria == 'ubicacion':
+            for campo in ('distrito', 'provincia', 'departamento'):
+                if attrs.get(campo):
+                    idx.agregar(attrs[campo], campo, weight=peso)
+    idx.finalizar()
+    return idx
+
+
+def _es_especie(attrs) -> bool:
+    return str(attrs.get('tipo', '')).lower() == 'especie'
+
+
+def build_species_index(G_viz) -> SearchIndex:
+    """Index the especie nodes of a dataset's visual graph."""
+    idx = SearchIndex()
+    for n, attrs in G_viz.nodes(data=True):
+        if _es_especie(attrs):
+            idx.agregar(n, 'especie', node=n, weight=1 + G_viz.degree(n))
+    idx.finalizar()
+    return idx
+
+
+def extend_species_index(index: SearchIndex, G_viz, anterior, nodos: Iterable) -> SearchIndex:
+    """build_species_index(G_viz) for a G_viz grown from `anterior`, from the
+    `index` of `anterior` and the nodes that were added or got edges."""
+    nuevas = []
+    # in G_viz order, so new species get the positions a rebuild gives them
+    for n in dict.fromkeys(nodos):
+        attrs = G_viz.nodes.get(n)
+        if attrs is None or not _es_especie(attrs):
+            continue
+        previo = 1 + anterior.degree(n) if n in anterior else 0
+        if 1 + G_viz.degree(n) != previo:
+            nuevas.append({'label': n, 'tipo': 'especie', 'node': n, 'weight': 1 + G_viz.degree(n) - previo})
+    return index.extendido(nuevas)
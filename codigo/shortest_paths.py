@@ -0,0 +1,249 @@
+import heapq
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Hashable, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+_NUM_LANDMARKS = 8
+
+
+class ShortestPathEngine:
+    """Point-to-point shortest paths over a fixed graph, with a result cache.
+
+    The graph is copied once into integer adjacency lists. Unweighted graphs
+    (no edge has a 'weight') use bidirectional BFS; weighted ones use A* with
+    ALT landmark lower bounds (distances from a few far-apart landmarks,
+    computed with scipy's csgraph). One search returns both the path and its
+    length. Results are kept in a bounded LRU keyed by endpoints and the
+    allowed node set, so the engine must be rebuilt when the graph changes.
+    """
+
+    def __init__(self, g, cache_size: int = 4096, num_landmarks: int = _NUM_LANDMARKS):
+        self.nodes: List[Hashable] = list(g.nodes())
+        self.index: Dict[Hashable, int] = {n: i for i, n in enumerate(self.nodes)}
+        self.vecinos: List[List[int]] = [[] for _ in self.nodes]
+        pesos: List[List[float]] = [[] for _ in self.nodes]
+        weighted = False
+        for u, v, attrs in g.edges(data=True):
+            w = attrs.get('weight', 1) if attrs else 1
+            weighted = weighted or 'weight' in (attrs or {})
+            iu, iv = self.index[u], self.index[v]
+            self.vecinos[iu].append(iv)
+            pesos[iu].append(float(w))
+            if iu != iv:
+                self.vecinos[iv].append(iu)
+                pesos[iv].append(float(w))
+        self.weighted = weighted
+        self.pesos = pesos if weighted else None
+        self.num_landmarks = num_landmarks
+        self._landmarks: Optional[np.ndarray] = None
+        self._dist_landmarks: Optional[np.ndarray] = None
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[Tuple, Optional[Tuple[float, List[int]]]]' = OrderedDict()
+        self._permitidos: 'OrderedDict[FrozenSet, set]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'searches': 0, 'settled': 0}
+
+    # -- landmarks -----------------------------------------------------------
+
+    def _matriz(self):
+        from scipy.sparse import csr_matrix
+        filas = np.repeat(np.arange(len(self.nodes)), [len(v) for v in self.vecinos])
+        cols = np.fromiter((v for vs in self.vecinos for v in vs), dtype=np.int64, count=len(filas))
+        datos = np.fromiter((w for ws in self.pesos for w in ws), dtype=np.float64, count=len(filas))
+        return csr_matrix((datos, (filas, cols)), shape=(len(self.nodes), len(self.nodes)))
+
+    def _preparar_landmarks(self):
+        """Farthest-point landmark selection; distances from each landmark."""
+        if self._dist_landmarks is not None:
+            return
+        from scipy.sparse.csgraph import dijkstra
+        m = self._matriz()
+        n = len(self.nodes)
+        k = min(self.num_landmarks, n)
+        elegidos = [int(np.argmax([len(v) for v in self.vecinos]))]
+        dist = [dijkstra(m, directed=False, indices=elegidos[0])]
+        for _ in range(1, k):
+            cercania = np.min(np.vstack(dist), axis=0)
+            # prefer unreached components first, then the farthest node
+            cercania = np.where(np.isfinite(cercania), cercania, np.finfo(np.float64).max)
+            cercania[elegidos] = -1
+            siguiente = int(np.argmax(cercania))
+            if cercania[siguiente] <= 0:
+                break
+            elegidos.append(siguiente)
+            dist.append(dijkstra(m, directed=False, indices=siguiente))
+        self._landmarks = np.array(elegidos)
+        self._dist_landmarks = np.vstack(dist)
+
+    def _heuristica(self, t: int) -> np.ndarray:
+        d = self._dist_landmarks
+        with np.errstate(invalid='ignore'):
+            diff = np.abs(d[:, t:t + 1] - d)
+        diff[~np.isfinite(diff)] = 0.0
+        return diff.max(axis=0)
+
+    # -- searches ------------------------------------------------------------
+
+    def _bfs_bidireccional(self, s: int, t: int, permitidos) -> Optional[Tuple[float, List[int]]]:
+        if s == t:
+            return 0, [s]
+        vecinos = self.vecinos
+        pred = {s: None}
+        succ = {t: None}
+        prof_f = {s: 0}
+        prof_b = {t: 0}
+        frente_f, frente_b = [s], [t]
+        visitados = 2
+        while frente_f and frente_b:
+            adelante = len(frente_f) <= len(frente_b)
+            frente, padres, prof, otros, otra_prof = (
+                (frente_f, pred, prof_f, succ, prof_b) if adelante else (frente_b, succ, prof_b, pred, prof_f))
+            mejor = None
+            siguiente = []
+            for u in frente:
+                du = prof[u] + 1
+                for v in vecinos[u]:
+                    if v in padres or (permitidos is not None and v not in permitidos):
+                        continue
+                    padres[v] = u
+                    prof[v] = du
+                    siguiente.append(v)
+                    visitados += 1
+                    if v in otros:
+                        total = du + otra_prof[v]
+                        if mejor is None or total < mejor[0]:
+                            mejor = (total, v)
+            if mejor is not None:
+                self._counters['settled'] += visitados
+                return mejor[0], self._unir(mejor[1], pred, succ)
+            if adelante:
+                frente_f = siguiente
+            else:
+                frente_b = siguiente
+        self._counters['settled'] += visitados
+        return None
+
+    @staticmethod
+    def _unir(medio: int, pred, succ) -> List[int]:
+        camino = []
+        u = medio
+        while u is not None:
+            camino.append(u)
+            u = pred[u]
+        camino.reverse()
+        u = succ[medio]
+        while u is not None:
+            camino.append(u)
+            u = succ[u]
+        return camino
+
+    def _alt(self, s: int, t: int, permitidos) -> Optional[Tuple[float, List[int]]]:
+        self._preparar_landmarks()
+        d = self._dist_landmarks
+        if np.any(np.isfinite(d[:, s]) != np.isfinite(d[:, t])):
+            return None  # a landmark reaches one endpoint but not the other
+        h = self._heuristica(t).tolist()
+        vecinos, pesos = self.vecinos, self.pesos
+        g_score = {s: 0.0}
+        pred = {s: None}
+        cerrados = set()
+        heap = [(h[s], 0.0, s)]
+        while heap:
+            _, gu, u = heapq.heappop(heap)
+            if u in cerrados:
+                continue
+            if u == t:
+                self._counters['settled'] += len(cerrados)
+                camino = []
+                while u is not None:
+                    camino.append(u)
+                    u = pred[u]
+                return gu, camino[::-1]
+            cerrados.add(u)
+            for v, w in zip(vecinos[u], pesos[u]):
+                if v in cerrados or (permitidos is not None and v not in permitidos):
+                    continue
+                gv = gu + w
+                if gv < g_score.get(v, float('inf')):
+                    g_score[v] = gv
+                    pred[v] = u
+                    heapq.heappush(heap, (gv + h[v], gv, v))
+        self._counters['settled'] += len(cerrados)
+        return None
+
+    # -- public API ----------------------------------------------------------
+
+    def _indices_permitidos(self, nodos: Optional[FrozenSet]):
+        if nodos is None:
+            return None
+        with self._lock:
+            hit = self._permitidos.get(nodos)
+            if hit is not None:
+                self._permitidos.move_to_end(nodos)
+                return hit
+        idx = self.index
+        out = {idx[n] for n in nodos if n in idx}
+        with self._lock:
+            self._permitidos[nodos] = out
+            while len(self._permitidos) > 32:
+                self._permitidos.popitem(last=False)
+        return out
+
+    def shortest_path(self, source, target, nodos: Optional[FrozenSet] = None) -> Tuple[float, list]:
+        """(distance, path) between two nodes, optionally within `nodos`.
+
+        Raises nx.NodeNotFound / nx.NetworkXNoPath like networkx does.
+        """
+        from codigo.metrics import inc
+        for n in (source, target):
+            if n not in self.index:
+                raise nx.NodeNotFound(f"Node {n} not found in graph")
+        s, t = self.index[source], self.index[target]
+        # undirected: cache each pair once, in a canonical order
+        invertido = s > t
+        clave = (t, s, nodos) if invertido else (s, t, nodos)
+        with self._lock:
+            if clave in self._cache:
+                self._cache.move_to_end(clave)
+                self._counters['hits'] += 1
+                res = self._cache[clave]
+            else:
+                res = False
+        inc('cache_requests_total', cache='paths', result='miss' if res is False else 'hit')
+        if res is False:
+            permitidos = self._indices_permitidos(nodos)
+            a, b = clave[0], clave[1]
+            if permitidos is not None and (a not in permitidos or b not in permitidos):
+                res = None
+            else:
+                res = self._alt(a, b, permitidos) if self.weighted else self._bfs_bidireccional(a, b, permitidos)
+            with self._lock:
+                self._counters['misses'] += 1
+                self._counters['searches'] += 1
+                self._cache[clave] = res
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        if res is None:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        dist, camino = res
+        if invertido:
+            camino = camino[::-1]
+        return dist, [self.nodes[i] for i in camino]
+
+    def clear(self):
+        """Drop the cached paths; the index and landmarks stay."""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._counters)
+            out['cached'] = len(self._cache)
+        out['weighted'] = self.weighted
+        out['landmarks'] = 0 if self._landmarks is None else len(self._landmarks)
+        lookups = out['hits'] + out['misses']
+        out['hit_rate'] = (out['hits'] / lookups) if lookups else None
+        return out
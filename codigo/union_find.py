@@ -0,0 +1,137 @@
+from typing import Dict, Hashable, Iterable, List, Optional
+
+
+class UnionFind:
+    """Disjoint-set forest with path compression and union by rank.
+
+    Items are mapped to integer slots so the forest is three flat lists;
+    the number of sets and the size of each set are kept as unions happen.
+    """
+
+    def __init__(self, items: Iterable[Hashable] = ()):
+        self.index: Dict[Hashable, int] = {}
+        self.items: List[Hashable] = []
+        self._padre: List[int] = []
+        self._rango: List[int] = []
+        self._tam: List[int] = []
+        self.count = 0
+        for x in items:
+            self.add(x)
+
+    def add(self, x) -> int:
+        i = self.index.get(x)
+        if i is None:
+            i = len(self.items)
+            self.index[x] = i
+            self.items.append(x)
+            self._padre.append(i)
+            self._rango.append(0)
+            self._tam.append(1)
+            self.count += 1
+        return i
+
+    def _raiz(self, i: int) -> int:
+        padre = self._padre
+        r = i
+        while padre[r] != r:
+            r = padre[r]
+        while padre[i] != r:
+            padre[i], i = r, padre[i]
+        return r
+
+    def find(self, x) -> int:
+        """Slot of the representative of x's set."""
+        return self._raiz(self.index[x])
+
+    def union(self, a, b) -> bool:
+        """Merge the sets of a and b (added if new); False if already joined."""
+        ra, rb = self._raiz(self.add(a)), self._raiz(self.add(b))
+        if ra == rb:
+            return False
+        if self._rango[ra] < self._rango[rb]:
+            ra, rb = rb, ra
+        self._padre[rb] = ra
+        self._tam[ra] += self._tam[rb]
+        if self._rango[ra] == self._rango[rb]:
+            self._rango[ra] += 1
+        self.count -= 1
+        return True
+
+    def connected(self, a, b) -> bool:
+        if a not in self.index or b not in self.index:
+            return False
+        return self.find(a) == self.find(b)
+
+    def size(self, x) -> int:
+        return self._tam[self.find(x)]
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, x):
+        return x in self.index
+
+
+class ComponentIndex:
+    """Connected components of a graph kept in a UnionFind.
+
+    Built once per graph version (graph_derived). The component count and
+    the largest component are O(1); component ids and member lists are
+    derived lazily on first use.
+    """
+
+    def __init__(self, g=None):
+        self.uf = UnionFind()
+        self._mayor = 0
+        self._ids: Optional[Dict[int, int]] = None
+        self._miembros: Dict[int, List[Hashable]] = {}
+        if g is not None:
+            uf = self.uf
+            for n in g.nodes():
+                uf.add(n)
+            for u, v in g.edges():
+                if uf.union(u, v):
+                    self._mayor = max(self._mayor, uf.size(u))
+            self._mayor = max(self._mayor, 1 if len(uf) else 0)
+
+    @property
+    def count(self) -> int:
+        return self.uf.count
+
+    @property
+    def largest(self) -> int:
+        return self._mayor
+
+    def _raices_por_tamano(self) -> Dict[int, int]:
+        # component ids: 0 is the largest component, ties by first node seen
+        if self._ids is None:
+            raices = {}
+            for i in range(len(self.uf)):
+                raices.setdefault(self.uf._raiz(i), i)
+            orden = sorted(raices, key=lambda r: (-self.uf._tam[r], raices[r]))
+            self._ids = {r: cid for cid, r in enumerate(orden)}
+        return self._ids
+
+    def sizes(self) -> List[int]:
+        """Component sizes, largest first."""
+        ids = self._raices_por_tamano()
+        return [self.uf._tam[r] for r in sorted(ids, key=ids.get)]
+
+    def component_id(self, node) -> int:
+        return self._raices_por_tamano()[self.uf.find(node)]
+
+    def connected(self, a, b) -> bool:
+        return self.uf.connected(a, b)
+
+    def component_size(self, node) -> int:
+        return self.uf.size(node)
+
+    def members(self, node, offset: int = 0, limit: int = 100) -> List[Hashable]:
+        """Page of the nodes in `node`'s component, in insertion order."""
+        raiz = self.uf.find(node)
+        miembros = self._miembros.get(raiz)
+        if miembros is None:
+            uf = self.uf
+            miembros = [uf.items[i] for i in range(len(uf)) if uf._raiz(i) == raiz]
+            self._miembros[raiz] = miembros
+        return miembros[offset:offset + limit]
@@ -0,0 +1,70 @@
+# Gunicorn settings: gunicorn -c gunicorn.conf.py app:app
+#
+# With preload (default) the master imports the app, loads the graph, the
+# plantaciones dataset and their indexes once, then gc.freeze()s them before
+# forking, so workers share those pages copy-on-write instead of each paying
+# the load on its first request. Set GUNICORN_PRELOAD=0 to load per worker.
+# As the gc docs recommend, the collector is off in the master from here on
+# (no collection leaves freed holes in pages the workers would then copy),
+# freeze runs right before each fork and every worker turns it back on.
+#
+# WARMUP=background skips that blocking warmup: workers accept connections
+# as soon as the (lazily importing) app is loaded and each warms its caches,
+# plus the general graph page, in a thread; /api/ready reports progress.
+# Faster cold start for one-worker instances, at the cost of per-worker
+# copies of the graph. WARMUP=off leaves everything to the first requests.
+import gc
+import os
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+warmup = os.environ.get('WARMUP', 'preload')
+# heavy first requests (graph HTML generation) need more than the 30 s default
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+
+if preload_app and warmup == 'preload':
+    # this file is read before the app is imported
+    gc.disable()
+
+
+def on_starting(server):
+    # a new metrics run for this master and its workers (codigo/metrics.py);
+    # files left by previous runs are deleted
+    from codigo.metrics import REGISTRY
+    REGISTRY.start_run()
+
+
+def _warm(log):
+    import app as flask_app
+    from codigo.procmem import format_memory, memory_usage
+    timings = flask_app.warm_caches()
+    log.info('Caches precargadas en %.2fs (%s) pid=%s %s, import de la app %.2fs',
+             sum(timings.values()), ', '.join(f'{k}={v:.2f}s' for k, v in timings.items()),
+             os.getpid(), format_memory(memory_usage()), flask_app._IMPORT_SECONDS)
+
+
+def when_ready(server):
+    # runs in the master after the app is loaded and before any worker forks
+    if not preload_app or warmup != 'preload':
+        return
+    _warm(server.log)
+
+
+def pre_fork(server, worker):
+    # move everything allocated so far to a permanent generation so the
+    # collector never touches (and thus never copies) those pages in workers
+    if not gc.isenabled():
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+
+
+def post_worker_init(worker):
+    from codigo.procmem import format_memory, memory_usage
+    if warmup == 'background':
+        import app as flask_app
+        flask_app.start_warmup()
+    elif warmup == 'preload' and not preload_app:
+        _warm(worker.log)
+    worker.log.info('Worker listo pid=%s %s', worker.pid, format_memory(memory_usage()))
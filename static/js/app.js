@@ -33,6 +33,8 @@ document.addEventListener('DOMContentLoaded', () => {
     document.getElementById('username').focus();
     // load existing graph links if any
     try { loadGraphLinks(); } catch (e) { /* ignore */ }
+    // server-side autocomplete does not need the graph to be loaded
+    try { setupSearchAutocomplete(); } catch (e) { /* ignore */ }
 });
 
 // Load existing generated graph HTML links from server
@@ -125,23 +127,31 @@ function renderStats(stats) {
 
 function inicializarGraficos(stats) {
         // Use the dedicated initCharts function so charts are centralized and easier to update.
-        // `stats` can later be passed into initCharts to populate data dynamically.
+        // initCharts loads its data from /api/aggregates.
         initCharts();
 }
 
-// Charts: species & departments (moved into its own function as requested)
+// Charts: species & departments, filled from the server-side aggregates
 function initCharts(){
-    new Chart(document.getElementById('chartEspecies').getContext('2d'),{
-        type:'bar',
-        data:{ labels:['Guazuma','Ochroma','Eucalyptus g.','Eucalyptus s.','Cordia','Schizolobium','Pinus','Calycophyllum','Cedrelinga','Swietenia'], datasets:[{ label:'Plantaciones', data:[280,152,134,96,95,79,64,63,54,47], backgroundColor:['#006400','#228B22','#32CD32','#90EE90','#3CB371','#2E8B57','#8FBC8F','#20B2AA','#3D9970','#004D00'], borderColor:'#006400', borderWidth:1 }] },
-        options:{ indexAxis:'y', responsive:true, maintainAspectRatio:false, plugins:{ legend:{ display:false } }, scales:{ x:{ beginAtZero:true } } }
-    });
+    const palette = ['#006400','#228B22','#32CD32','#90EE90','#3CB371','#2E8B57','#8FBC8F','#20B2AA','#3D9970','#004D00'];
+    fetch('/api/aggregates?by=especie,departamento&top=10')
+    .then(r => r.json())
+    .then(j => {
+        if (!j || !j.success) throw new Error(j && j.error ? j.error : 'Sin datos');
+        const especies = j.aggregates.especie.grupos;
+        const deptos = j.aggregates.departamento.grupos;
+        new Chart(document.getElementById('chartEspecies').getContext('2d'),{
+            type:'bar',
+            data:{ labels: especies.map(g => g.key), datasets:[{ label:'Plantaciones', data: especies.map(g => g.conteo), backgroundColor: palette, borderColor:'#006400', borderWidth:1 }] },
+            options:{ indexAxis:'y', responsive:true, maintainAspectRatio:false, plugins:{ legend:{ display:false } }, scales:{ x:{ beginAtZero:true } } }
+        });
 
-    new Chart(document.getElementById('chartDepartamentos').getContext('2d'),{
-        type:'bar',
-        data:{ labels:['San Martín','Cajamarca','Loreto','Pasco','Huánuco','Cusco','Junín','Amazonas','Ancash','Ucayali'], datasets:[{ label:'Plantaciones', data:[232,132,120,85,82,69,64,41,41,36], backgroundColor:['#C1272D','#006400','#228B22','#32CD32','#90EE90','#3CB371','#2E8B57','#8FBC8F','#20B2AA','#3D9970'], borderColor:'#006400', borderWidth:1 }] },
-        options:{ responsive:true, maintainAspectRatio:false, plugins:{ legend:{ display:false } }, scales:{ y:{ beginAtZero:true } } }
-    });
+        new Chart(document.getElementById('chartDepartamentos').getContext('2d'),{
+            type:'bar',
+            data:{ labels: deptos.map(g => g.key), datasets:[{ label:'Plantaciones', data: deptos.map(g => g.conteo), backgroundColor: ['#C1272D'].concat(palette.slice(0, 9)), borderColor:'#006400', borderWidth:1 }] },
+            options:{ responsive:true, maintainAspectRatio:false, plugins:{ legend:{ display:false } }, scales:{ y:{ beginAtZero:true } } }
+        });
+    }).catch(e => console.warn('No se pudieron cargar los gráficos', e));
 }
 
 function ejecutarAnalisis() {
@@ -209,20 +219,32 @@ function generateGeneralGraph() {
     }
     if (btn) { btn.disabled = true; btn.innerText = 'Generando...'; }
     if (overlay) overlay.style.display = 'flex';
+    const resetBtn = () => { if (btn) { btn.disabled = false; btn.innerText = '🗺️ Generar y ver grafo general'; } };
+    const phaseLabels = { parse: 'leyendo CSV', build: 'construyendo grafos', render: 'generando HTML' };
+    // Generation runs as a background job on the server; poll its status
+    const poll = (statusUrl) => fetch(statusUrl).then(r => r.json()).then(j => {
+        const job = j && j.job;
+        if (!job) throw new Error(j && j.error ? j.error : 'Job desconocido');
+        if (job.state === 'done') return job;
+        if (job.state === 'error') throw new Error(job.error || 'Error desconocido');
+        if (btn && job.phase) btn.innerText = 'Generando (' + (phaseLabels[job.phase] || job.phase) + ')...';
+        return new Promise(resolve => setTimeout(resolve, 500)).then(() => poll(statusUrl));
+    });
     fetch('/api/generate_general_graph', { method: 'POST' })
     .then(r => r.json())
     .then(j => {
-        if (j && j.success && j.path) {
-            if (btn) { btn.dataset.path = j.path; btn.innerText = '🗺️ Abrir grafo general'; btn.disabled = false; }
-            // refresh available links and counts
-            try { loadGraphLinks(); } catch (e) { /* ignore */ }
-            try { updateGraphCounts(); } catch (e) { /* ignore */ }
-            window.open(j.path, '_blank');
-        } else {
-            if (btn) { btn.disabled = false; btn.innerText = '🗺️ Generar y ver grafo general'; }
-            alert('Error generando grafo: ' + (j && j.error ? j.error : 'Desconocido'));
-        }
-    }).catch(e => { if (btn) { btn.disabled = false; btn.innerText = '🗺️ Generar y ver grafo general'; } alert('Error: '+(e && e.message?e.message:String(e))); })
+        if (!j || !j.success || !j.status_url) throw new Error(j && j.error ? j.error : 'Desconocido');
+        return poll(j.status_url);
+    })
+    .then(job => {
+        const path = job.result && job.result.path;
+        if (!path) throw new Error('El job no devolvió una ruta');
+        if (btn) { btn.dataset.path = path; btn.innerText = '🗺️ Abrir grafo general'; btn.disabled = false; }
+        // refresh available links and counts
+        try { loadGraphLinks(); } catch (e) { /* ignore */ }
+        try { updateGraphCounts(); } catch (e) { /* ignore */ }
+        window.open(path, '_blank');
+    }).catch(e => { resetBtn(); alert('Error generando grafo: '+(e && e.message?e.message:String(e))); })
     .finally(() => {
         if (overlay) overlay.style.display = 'none';
     });
@@ -631,13 +653,19 @@ function initCytoscape() {
             return;
         }
         const elements = [];
-        (data.nodes || []).forEach(n => elements.push({data:n.data}));
+        let hasPositions = true;
+        (data.nodes || []).forEach(n => {
+            if (n.position) elements.push({data:n.data, position:n.position});
+            else { hasPositions = false; elements.push({data:n.data}); }
+        });
         (data.edges || []).forEach(e => elements.push({data:e.data}));
 
-        // Choose a layout strategy depending on graph size to improve performance
-        const layoutOptions = (elements && elements.length > 800)
-            ? { name: 'grid' }
-            : { name: 'cose', directed: true, padding: 20, animate: false, idealEdgeLength: 80, nodeRepulsion: 4000, numIter: 250 };
+        // The server precomputes a force-directed layout; only fall back to
+        // laying out in the browser when positions are missing.
+        let layoutOptions;
+        if (hasPositions) layoutOptions = { name: 'preset', padding: 20, fit: true };
+        else if (elements.length > 800) layoutOptions = { name: 'grid' };
+        else layoutOptions = { name: 'cose', directed: true, padding: 20, animate: false, idealEdgeLength: 80, nodeRepulsion: 4000, numIter: 250 };
 
         const cy = cytoscape({ container: document.getElementById('cy'), elements: elements, style: [
             { selector: 'node', style: { 'label': 'data(label)', 'background-color': '#FFD700', 'text-valign': 'center', 'text-halign': 'center' } },
@@ -691,11 +719,8 @@ function initCytoscape() {
 const autocompleteIndex = { ids: [], labels: [], species: [], departamentos: [], nodesById: {}, nodesBySpecies: {}, nodesByDept: {} };
 
 function buildAutocompleteIndices(data) {
-    // Reset
-    autocompleteIndex.ids = [];
-    autocompleteIndex.labels = [];
-    autocompleteIndex.species = [];
-    autocompleteIndex.departamentos = [];
+    // Reset (Sets keep insertion order and dedupe in O(1))
+    const ids = new Set(), labels = new Set(), species = new Set(), departamentos = new Set();
     autocompleteIndex.nodesById = {};
     autocompleteIndex.nodesBySpecies = {};
     autocompleteIndex.nodesByDept = {};
@@ -706,8 +731,8 @@ function buildAutocompleteIndices(data) {
         const id = String(d.id || '');
         const label = String(d.label || d.id || '').trim();
         if (!id) return;
-        autocompleteIndex.ids.push(id);
-        if (label && !autocompleteIndex.labels.includes(label)) autocompleteIndex.labels.push(label);
+        ids.add(id);
+        if (label) labels.add(label);
         // store raw node for details
         autocompleteIndex.nodesById[id] = d;
 
@@ -717,28 +742,31 @@ function buildAutocompleteIndices(data) {
 
         especiesCandidates.forEach(sp => {
             if (!sp) return;
-            if (!autocompleteIndex.species.includes(sp)) autocompleteIndex.species.push(sp);
+            species.add(sp);
             autocompleteIndex.nodesBySpecies[sp] = autocompleteIndex.nodesBySpecies[sp] || [];
             autocompleteIndex.nodesBySpecies[sp].push(id);
         });
         departamentosCandidates.forEach(dep => {
             if (!dep) return;
-            if (!autocompleteIndex.departamentos.includes(dep)) autocompleteIndex.departamentos.push(dep);
+            departamentos.add(dep);
             autocompleteIndex.nodesByDept[dep] = autocompleteIndex.nodesByDept[dep] || [];
             autocompleteIndex.nodesByDept[dep].push(id);
         });
     });
-    // dedupe
-    autocompleteIndex.ids = Array.from(new Set(autocompleteIndex.ids));
-    autocompleteIndex.labels = Array.from(new Set(autocompleteIndex.labels));
-    autocompleteIndex.species = Array.from(new Set(autocompleteIndex.species));
-    autocompleteIndex.departamentos = Array.from(new Set(autocompleteIndex.departamentos));
+    autocompleteIndex.ids = Array.from(ids);
+    autocompleteIndex.labels = Array.from(labels);
+    autocompleteIndex.species = Array.from(species);
+    autocompleteIndex.departamentos = Array.from(departamentos);
 }
 
+// Suggestions come from the server-side index (/api/autocomplete), so this works
+// before (and without) downloading the full graph.
 function setupSearchAutocomplete() {
     const inp = document.getElementById('buscarNodo');
     const suggContainer = document.getElementById('searchSuggestions');
     if (!inp || !suggContainer) return;
+    if (inp.dataset.autocomplete) return;  // listeners already attached
+    inp.dataset.autocomplete = '1';
 
     // create dropdown list element
     let listEl = document.getElementById('searchSuggestList');
@@ -750,50 +778,51 @@ function setupSearchAutocomplete() {
     }
     listEl.innerHTML = '';
 
+    let timer = null;
+    let seq = 0;
     inp.addEventListener('input', (e) => {
         const v = e.target.value || '';
         const tokens = v.split(',');
-        const last = tokens[tokens.length-1].trim().toLowerCase();
+        const last = tokens[tokens.length-1].trim();
+        if (timer) clearTimeout(timer);
         if (!last) { listEl.innerHTML = ''; return; }
+        timer = setTimeout(() => {
+            const mine = ++seq;
+            fetch('/api/autocomplete?limit=20&q=' + encodeURIComponent(last))
+            .then(r => r.json()).then(j => {
+                if (mine !== seq || !j.success) return;  // a newer keystroke already answered
+                renderSuggestions(j.results || [], tokens);
+            }).catch(() => { /* ignore */ });
+        }, 120);
+    });
 
-        const matches = [];
-        // match ids
-        autocompleteIndex.ids.forEach(id => { if (id.toLowerCase().includes(last)) matches.push({type:'id', value:id}); });
-        // match labels
-        autocompleteIndex.labels.forEach(l => { if (l.toLowerCase().includes(last)) matches.push({type:'label', value:l}); });
-        // species
-        autocompleteIndex.species.forEach(s => { if (s.toLowerCase().includes(last)) matches.push({type:'species', value:s}); });
-        // departments
-        autocompleteIndex.departamentos.forEach(d => { if (d.toLowerCase().includes(last)) matches.push({type:'dept', value:d}); });
-
-        // limit and render
-        const max = 50;
+    function renderSuggestions(results, tokens) {
         listEl.innerHTML = '';
-        matches.slice(0,max).forEach(m => {
+        results.forEach(m => {
             const item = document.createElement('div');
             item.style.cssText = 'padding:6px 8px; cursor:pointer; border-bottom:1px solid #fafafa; font-size:13px;';
-            item.innerHTML = `<strong style="margin-right:8px">[${m.type}]</strong> ${m.value}`;
+            item.innerHTML = `<strong style="margin-right:8px">[${m.tipo}]</strong> ${m.label}`;
             item.addEventListener('click', () => {
-                // if id or label -> replace last token and trigger search
-                if (m.type === 'id' || m.type === 'label') {
-                    tokens[tokens.length-1] = m.value;
-                    inp.value = tokens.join(', ');
-                    listEl.innerHTML = '';
-                    buscarNodo();
-                } else if (m.type === 'species') {
+                if (m.tipo === 'especie') {
                     // set species input and trigger BFS search via species search if desired
-                    const spInp = document.getElementById('especie'); if (spInp) spInp.value = m.value;
-                    tokens[tokens.length-1] = m.value; inp.value = tokens.join(', ');
+                    const spInp = document.getElementById('especie'); if (spInp) spInp.value = m.label;
+                    tokens[tokens.length-1] = m.node || m.label; inp.value = tokens.join(', ');
                     listEl.innerHTML = '';
-                } else if (m.type === 'dept') {
-                    const dInp = document.getElementById('departamento'); if (dInp) dInp.value = m.value;
-                    tokens[tokens.length-1] = m.value; inp.value = tokens.join(', ');
+                } else if (m.tipo === 'departamento') {
+                    const dInp = document.getElementById('departamento'); if (dInp) dInp.value = m.label;
+                    tokens[tokens.length-1] = m.label; inp.value = tokens.join(', ');
                     listEl.innerHTML = '';
+                } else {
+                    // node-backed suggestion -> replace last token and trigger search
+                    tokens[tokens.length-1] = m.node || m.label;
+                    inp.value = tokens.join(', ');
+                    listEl.innerHTML = '';
+                    buscarNodo();
                 }
             });
             listEl.appendChild(item);
         });
-    });
+    }
 
     // hide on click outside
     document.addEventListener('click', (ev) => {